@@ -0,0 +1,237 @@
+"""Benchmark how mapping and redistribution scale with the number of polygons, on synthetic tessellations.
+
+Each case runs in a fresh process so its peak RSS is its own. Results are written to
+`benchmarks/results/{commit}.csv` so runs on different commits can be compared, e.g.
+
+```bash
+python packages/electoralyze/benchmarks/benchmark_scaling.py --scales 1000 10000 100000
+python packages/electoralyze/benchmarks/benchmark_scaling.py --compare 5736265
+```
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import polars as pl
+from electoralyze.common.metric import Metric, MetricRegion
+from electoralyze.common.testing.region_fixture import RegionMocked
+from electoralyze.common.testing.tessellation_fixture import create_tessellation_regions
+from electoralyze.region.redistribute import redistribute, redistribute_long
+from electoralyze.region.redistribute.mapping import get_region_mapping_base
+from electoralyze.region.region_abc import RegionABC
+
+BENCHMARK_DIR = os.path.dirname(os.path.realpath(__file__))
+RESULTS_FILE = os.path.join(BENCHMARK_DIR, "results", "{commit}.csv")
+BENCHMARK_SCALES = [1_000, 10_000, 100_000, 1_000_000]
+BENCHMARK_CATEGORIES = 2_000
+BENCHMARK_CATEGORIES_PER_REGION = 20
+
+
+def _case_mapping_nested(tessellation: RegionMocked, _temp_dir: str) -> None:
+    get_region_mapping_base(
+        tessellation.grid_fine,
+        tessellation.grid_coarse,
+        mapping_method="intersection_area",
+        redistribute_with_full=True,
+    )
+
+
+def _case_mapping_grid_voronoi(tessellation: RegionMocked, _temp_dir: str) -> None:
+    get_region_mapping_base(
+        tessellation.grid_fine, tessellation.voronoi, mapping_method="intersection_area", redistribute_with_full=False
+    )
+
+
+def _case_mapping_grid_voronoi_adaptive(tessellation: RegionMocked, _temp_dir: str) -> None:
+    get_region_mapping_base(
+        tessellation.grid_fine,
+        tessellation.voronoi,
+        mapping_method="intersection_area",
+        redistribute_with_full="adaptive",
+    )
+
+
+def _case_mapping_hex_voronoi_strtree(tessellation: RegionMocked, _temp_dir: str) -> None:
+    get_region_mapping_base(
+        tessellation.hex,
+        tessellation.voronoi,
+        mapping_method="intersection_area",
+        redistribute_with_full=False,
+        intersection_engine="strtree",
+    )
+
+
+def _case_mapping_centroid_distance(tessellation: RegionMocked, _temp_dir: str) -> None:
+    get_region_mapping_base(
+        tessellation.hex, tessellation.voronoi, mapping_method="centroid_distance", redistribute_with_full=False
+    )
+
+
+def _case_redistribute(tessellation: RegionMocked, _temp_dir: str) -> None:
+    redistribute(
+        _get_data(tessellation.grid_fine.geometry[tessellation.grid_fine.id], region_id=tessellation.grid_fine.id),
+        region_from=tessellation.grid_fine,
+        region_to=tessellation.voronoi,
+        redistribute_with_full=False,
+    )
+
+
+def _case_redistribute_long(tessellation: RegionMocked, _temp_dir: str) -> None:
+    redistribute_long(
+        _get_long_data(tessellation.grid_fine.geometry[tessellation.grid_fine.id]),
+        region_from=tessellation.grid_fine,
+        region_to=tessellation.voronoi,
+        category_columns=["category"],
+        region_column="region_id",
+        redistribute_with_full=False,
+    )
+
+
+def _case_redistribute_long_pivot(tessellation: RegionMocked, _temp_dir: str) -> None:
+    data_wide = (
+        _get_long_data(tessellation.grid_fine.geometry[tessellation.grid_fine.id])
+        .pivot(on="category", index="region_id", values="value")
+        .rename({"region_id": tessellation.grid_fine.id})
+    )
+    redistribute(
+        data_wide, region_from=tessellation.grid_fine, region_to=tessellation.voronoi, redistribute_with_full=False
+    ).unpivot(index=tessellation.voronoi.id, variable_name="category").drop_nulls("value")
+
+
+def _case_metric_by(tessellation: RegionMocked, temp_dir: str) -> None:
+    metric = Metric(
+        name="benchmark",
+        processed_path=f"{temp_dir}/data/metric/{{region_id}}.parquet",
+        allowed_regions=[MetricRegion(region=tessellation.grid_fine, process_raw=_process_raw_metric)],
+        schema=pl.Schema({"region_id": pl.Int64, "category": pl.Int32, "value": pl.Float32}),
+    )
+    metric.process_raw()
+    metric.by(tessellation.grid_fine)
+
+
+BENCHMARK_CASES: dict[str, Callable[[RegionMocked, str], None]] = {
+    "mapping_nested": _case_mapping_nested,
+    "mapping_grid_voronoi": _case_mapping_grid_voronoi,
+    "mapping_grid_voronoi_adaptive": _case_mapping_grid_voronoi_adaptive,
+    "mapping_hex_voronoi_strtree": _case_mapping_hex_voronoi_strtree,
+    "mapping_centroid_distance": _case_mapping_centroid_distance,
+    "redistribute": _case_redistribute,
+    "redistribute_long": _case_redistribute_long,
+    "redistribute_long_pivot": _case_redistribute_long_pivot,
+    "metric_by": _case_metric_by,
+}
+
+
+def run_benchmarks(scales: list[int], *, cases: list[str]) -> pl.DataFrame:
+    """Run every case at every scale, each in a fresh process.
+
+    Returns
+    -------
+    pl.DataFrame, with columns `case`, `n_polygons`, `seconds` and `peak_rss_mb`.
+    """
+    results = []
+    mp_context = multiprocessing.get_context("spawn")
+    for n_polygons in scales:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            print(f"Creating tessellations of {n_polygons:_} polygons...")
+            create_tessellation_regions(temp_dir, n_polygons=n_polygons)
+
+            for case in cases:
+                with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as executor:
+                    seconds, peak_rss_mb = executor.submit(_run_case, case, temp_dir, n_polygons).result()
+                print(f"{case} @ {n_polygons:_}: {seconds:.2f}s, {peak_rss_mb:.0f}MB")
+                results.append({"case": case, "n_polygons": n_polygons, "seconds": seconds, "peak_rss_mb": peak_rss_mb})
+
+    return pl.DataFrame(results)
+
+
+def _run_case(case: str, temp_dir: str, n_polygons: int) -> tuple[float, float]:
+    """Run one case in this process, returning wall time and the process's peak RSS in MB."""
+    tessellation = create_tessellation_regions(temp_dir, n_polygons=n_polygons)
+    start = time.perf_counter()
+    BENCHMARK_CASES[case](tessellation, temp_dir)
+    seconds = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return seconds, peak_rss_mb
+
+
+def _process_raw_metric(
+    parent_metric: Metric,
+    region: RegionABC,
+    force_new: bool,  # noqa: ARG001
+    download: bool,  # noqa: ARG001
+    **_kwargs: dict,
+) -> pl.DataFrame:
+    """Metric data with one value per region, for `_case_metric_by`."""
+    data = _get_data(region.geometry[region.id], region_id="region_id")
+    return data.select(
+        "region_id",
+        pl.lit(2021, dtype=pl.Int32).alias(parent_metric.category_column),
+        pl.col("value").cast(pl.Float32).alias(parent_metric.value_column),
+    )
+
+
+def _get_data(region_ids: pl.Series, *, region_id: str) -> pl.DataFrame:
+    """Random values for each region."""
+    rng = np.random.default_rng(0)
+    return pl.DataFrame({region_id: region_ids, "value": rng.random(len(region_ids))})
+
+
+def _get_long_data(region_ids: pl.Series) -> pl.DataFrame:
+    """Long format data, each region with values for a few of `BENCHMARK_CATEGORIES` categories, like census tables."""
+    rng = np.random.default_rng(0)
+    n_rows = len(region_ids) * BENCHMARK_CATEGORIES_PER_REGION
+    data = pl.DataFrame(
+        {
+            "region_id": region_ids.gather(np.repeat(np.arange(len(region_ids)), BENCHMARK_CATEGORIES_PER_REGION)),
+            "category": rng.integers(0, BENCHMARK_CATEGORIES, n_rows).astype(str),
+            "value": rng.random(n_rows),
+        }
+    )
+    return data.unique(["region_id", "category"])
+
+
+def _get_commit() -> str:
+    """Short hash of the current commit, with `-dirty` if there are uncommitted changes."""
+    git = shutil.which("git")
+    commit = subprocess.check_output([git, "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR, text=True)  # noqa: S603
+    is_dirty = subprocess.run([git, "diff", "--quiet", "HEAD"], cwd=BENCHMARK_DIR, check=False)  # noqa: S603
+    commit = commit.strip()
+    return f"{commit}-dirty" if is_dirty.returncode != 0 else commit
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark mapping and redistribution on synthetic tessellations.")
+    parser.add_argument("--scales", nargs="+", type=int, default=BENCHMARK_SCALES[:-1])
+    parser.add_argument("--cases", nargs="+", choices=list(BENCHMARK_CASES), default=list(BENCHMARK_CASES))
+    parser.add_argument("--compare", help="Commit to compare against, its results file must exist.")
+    args = parser.parse_args()
+
+    commit = _get_commit()
+    results = run_benchmarks(args.scales, cases=args.cases).with_columns(commit=pl.lit(commit))
+    results_file = RESULTS_FILE.format(commit=commit)
+    os.makedirs(os.path.dirname(results_file), exist_ok=True)
+    results.write_csv(results_file)
+    print(f"Saved results to {results_file!r}")
+
+    if args.compare is not None:
+        results_base = pl.read_csv(RESULTS_FILE.format(commit=args.compare))
+        comparison = results.join(results_base, on=["case", "n_polygons"], how="left", suffix="_base").select(
+            "case",
+            "n_polygons",
+            "seconds",
+            pl.col("seconds").truediv("seconds_base").alias("seconds_ratio"),
+            "peak_rss_mb",
+            pl.col("peak_rss_mb").truediv("peak_rss_mb_base").alias("peak_rss_mb_ratio"),
+        )
+        with pl.Config(tbl_rows=-1):
+            print(comparison)
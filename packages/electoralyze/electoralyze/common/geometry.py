@@ -1,7 +1,9 @@
 """GeoDataFrame specific utility functions."""
 
 import geopandas as gpd
+import numpy as np
 import polars_st as st
+import shapely
 
 from .constants import COORDINATE_REFERENCE_SYSTEM
 
@@ -18,3 +20,9 @@ def to_geopandas(st_gdf: st.GeoDataFrame) -> gpd.GeoDataFrame:
     """Convert a Polars ST dataframe into a GeoPandas dataframe."""
     gpd_gdf = st_gdf.st.to_geopandas().set_crs(COORDINATE_REFERENCE_SYSTEM)
     return gpd_gdf
+
+
+def to_shapely(st_gdf: st.GeoDataFrame, /, column: str = "geometry") -> np.ndarray:
+    """Convert the geometry column of a Polars ST dataframe into an array of shapely geometries."""
+    shapely_geometries = shapely.from_wkb(st_gdf[column].to_numpy())
+    return shapely_geometries
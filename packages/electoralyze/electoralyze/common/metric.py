@@ -5,7 +5,7 @@ from typing import Callable, Literal, get_type_hints
 
 import polars as pl
 from electoralyze.common.files import create_path
-from electoralyze.region.redistribute import redistribute
+from electoralyze.region.redistribute import redistribute, redistribute_long
 from electoralyze.region.region_abc import RegionABC
 from pydantic import BaseModel, ConfigDict, computed_field, model_validator
 from typing_extensions import Self
@@ -456,5 +456,32 @@ class Metric(BaseModel):
         return metric_data
 
     def _get_redistributed_data(self, region: RegionABC) -> pl.DataFrame:
-        """Get data by redistributing from another region."""
-        raise NotImplementedError("Redistributing from another region is not implemented yet.")
+        """Get data by redistributing from another region, in long format, refer to `redistribute_long`.
+
+        Data redistributed outside of any region in `region` is dropped. Integer values, e.g. counts of people, are
+        apportioned to integers with `aggregation="sum_integer"` unless another aggregation is given, instead of
+        truncating the redistributed floats.
+        """
+        region_metric = self.allowed_regions_map[region.id]
+        region_from = region_metric.redistribute_from
+        schema = self._get_schema(region)
+
+        metric_data_from = self.by(region_from).with_columns(
+            pl.col("region_id").cast(region_from.geometry.schema[region_from.id])
+        )
+        is_integer = metric_data_from.schema[self.value_column].is_integer() and schema[self.value_column].is_integer()
+        redistribute_kwargs = {"aggregation": "sum_integer"} if is_integer else {}
+        metric_data = redistribute_long(
+            metric_data_from,
+            region_from=region_from,
+            region_to=region,
+            value_column=self.value_column,
+            category_columns=[self.category_column],
+            region_column="region_id",
+            **(redistribute_kwargs | region_metric.redistribute_kwargs),
+        )
+
+        metric_data = metric_data.filter(pl.col("region_id").is_not_null()).select(
+            pl.col(column).cast(dtype) for column, dtype in schema.items()
+        )
+        return metric_data
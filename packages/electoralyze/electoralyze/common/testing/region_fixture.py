@@ -154,6 +154,13 @@ REGION_JSONS = {
     },
 }
 
+REGION_PARENTS = {
+    FOUR_SQUARE_REGION_ID: {
+        ONE_SQUARE_REGION_ID: pl.lit("main"),
+        LEFT_RIGHT_REGION_ID: pl.col(FOUR_SQUARE_REGION_ID).replace_strict({"M": "L", "N": "R", "O": "L", "P": "R"}),
+    },
+}
+
 REDISTRIBUTE_MAPPINGS = {
     tuple({FOUR_SQUARE_REGION_ID, THREE_TRIANGLES_REGION_ID}): pl.DataFrame(
         [
@@ -339,6 +346,12 @@ def create_fake_regions(temp_dir: str):
                     name_ = region_shape_file[region_id_]
                     return name_
 
+                @classproperty
+                def parent_regions(self) -> dict[str, pl.Expr]:
+                    """Parents for region."""
+                    parents_ = REGION_PARENTS.get(region_id_, {})
+                    return parents_
+
             return NewRegion
 
         region_classes[region_id] = create_new_region(region_id)
@@ -0,0 +1,202 @@
+import math
+import os
+from typing import Literal
+
+import numpy as np
+import polars as pl
+import polars_st as st
+import shapely
+from electoralyze.common.functools import classproperty
+from electoralyze.common.geometry import to_geopandas
+from electoralyze.common.testing.region_fixture import RegionMocked
+from electoralyze.region.region_abc import RegionABC
+
+TESSELLATION_KINDS = Literal["grid", "hex", "voronoi"]
+TESSELLATION_BOUNDS = (140.0, -40.0, 150.0, -30.0)
+TESSELLATION_NESTING_SIDE = 10
+
+GRID_FINE_REGION_ID = "grid_fine"
+GRID_COARSE_REGION_ID = "grid_coarse"
+HEX_REGION_ID = "hex"
+VORONOI_REGION_ID = "voronoi"
+TESSELLATION_REGION_IDS = [GRID_FINE_REGION_ID, GRID_COARSE_REGION_ID, HEX_REGION_ID, VORONOI_REGION_ID]
+
+
+def create_tessellation(
+    kind: TESSELLATION_KINDS,
+    n_polygons: int,
+    *,
+    region_id: str,
+    bounds: tuple[float, float, float, float] = TESSELLATION_BOUNDS,
+    seed: int = 0,
+) -> st.GeoDataFrame:
+    """Create a synthetic tessellation of about `n_polygons` polygons exactly covering `bounds`.
+
+    Parameters
+    ----------
+    kind: Literal["grid", "hex", "voronoi"], shape of the polygons.
+        - "grid": square cells, `n_polygons` is rounded to a square number. Ids are `row * side + column`.
+        - "hex": hexagons, clipped at the edges of `bounds`.
+        - "voronoi": Voronoi cells around jittered grid points.
+    n_polygons: int, approximate number of polygons.
+    region_id: str, name of the id column.
+    bounds: tuple[float, float, float, float], `(minx, miny, maxx, maxy)` to cover, in lon/lat.
+    seed: int = 0, seed for the jitter of "voronoi".
+
+    Returns
+    -------
+    st.GeoDataFrame, with an `Int64` id column `region_id` and `geometry`.
+    """
+    match kind:
+        case "grid":
+            geometries = _create_grid(round(math.sqrt(n_polygons)), bounds=bounds)
+        case "hex":
+            geometries = _create_hexes(n_polygons, bounds=bounds)
+        case "voronoi":
+            geometries = _create_voronoi(n_polygons, bounds=bounds, seed=seed)
+        case _:
+            raise ValueError(f"Unknown tessellation kind `{kind}`")
+
+    tessellation = st.GeoDataFrame(
+        {
+            region_id: pl.int_range(len(geometries), eager=True, dtype=pl.Int64),
+            "geometry": shapely.to_wkb(geometries),
+        }
+    )
+    return tessellation
+
+
+def create_tessellation_regions(temp_dir: str, *, n_polygons: int, process: bool = True) -> RegionMocked:
+    """Create regions from synthetic tessellations, for benchmarking at scale.
+
+    - `grid_fine`: grid of about `n_polygons` cells, nesting exactly inside `grid_coarse`.
+    - `grid_coarse`: grid with `TESSELLATION_NESTING_SIDE ** 2` times fewer cells.
+    - `hex`: about `n_polygons` hexagons, overlapping both grids.
+    - `voronoi`: about `n_polygons` jittered Voronoi cells, overlapping everything.
+
+    Raw files already in `temp_dir` are reused, so separate processes can register the same regions cheaply.
+
+    Example
+    -------
+    ```python
+    >>> tessellation = create_tessellation_regions(temp_dir, n_polygons=10_000)
+    >>> get_region_mapping_base(tessellation.grid_fine, tessellation.voronoi, ...)
+    ```
+    """
+    side_coarse = max(round(math.sqrt(n_polygons) / TESSELLATION_NESTING_SIDE), 1)
+    side_fine = side_coarse * TESSELLATION_NESTING_SIDE
+    tessellations = {
+        GRID_FINE_REGION_ID: ("grid", side_fine**2),
+        GRID_COARSE_REGION_ID: ("grid", side_coarse**2),
+        HEX_REGION_ID: ("hex", n_polygons),
+        VORONOI_REGION_ID: ("voronoi", n_polygons),
+    }
+    region_parents = {
+        GRID_FINE_REGION_ID: {
+            GRID_COARSE_REGION_ID: (
+                pl.col(GRID_FINE_REGION_ID).floordiv(side_fine * TESSELLATION_NESTING_SIDE).mul(side_coarse)
+                + pl.col(GRID_FINE_REGION_ID).mod(side_fine).floordiv(TESSELLATION_NESTING_SIDE)
+            )
+        },
+    }
+
+    class TessellationABC(RegionABC):
+        """Synthetic tessellation region."""
+
+        _root_dir = temp_dir
+
+        @classmethod
+        def _transform_geometry_raw(cls, geometry_raw: st.GeoDataFrame) -> st.GeoDataFrame:
+            """Structure data."""
+            geometry_with_metadata = geometry_raw.select(
+                pl.col(cls.id).cast(pl.Int64),
+                pl.struct(pl.col(cls.id).cast(pl.String).alias(cls.name)).alias("metadata"),
+                pl.col("geometry"),
+            )
+            return geometry_with_metadata
+
+    def create_new_region(region_id_: str) -> RegionABC:
+        class NewRegion(TessellationABC):
+            """Synthetic tessellation region."""
+
+            @classproperty
+            def id(self) -> str:
+                """Id for region."""
+                return region_id_
+
+            @classproperty
+            def raw_geometry_file(self) -> str:
+                """Raw file."""
+                return f"{temp_dir}/raw_geometry/{region_id_}/{region_id_}.fgb"
+
+            @classproperty
+            def parent_regions(self) -> dict[str, pl.Expr]:
+                """Parents for region."""
+                return region_parents.get(region_id_, {})
+
+        return NewRegion
+
+    region_classes = {}
+    for region_id, (kind, n_polygons_) in tessellations.items():
+        region_ = create_new_region(region_id)
+        if not os.path.exists(region_.raw_geometry_file):
+            os.makedirs(os.path.dirname(region_.raw_geometry_file), exist_ok=True)
+            create_tessellation(kind, n_polygons_, region_id=region_id).pipe(to_geopandas).to_file(
+                region_.raw_geometry_file, driver="FlatGeobuf"
+            )
+        if process and not os.path.exists(region_.geometry_file):
+            region_.process_raw(download=False)
+        region_classes[region_id] = region_
+
+    return RegionMocked(_RegionMockedABC=TessellationABC, **region_classes)
+
+
+def _create_grid(side: int, *, bounds: tuple[float, float, float, float]) -> np.ndarray:
+    """Square grid of `side * side` cells, ordered row by row from the bottom left."""
+    minx, miny, maxx, maxy = bounds
+    xs = np.linspace(minx, maxx, side + 1)
+    ys = np.linspace(miny, maxy, side + 1)
+    x0, y0 = np.meshgrid(xs[:-1], ys[:-1])
+    x1, y1 = np.meshgrid(xs[1:], ys[1:])
+    geometries = shapely.box(x0.ravel(), y0.ravel(), x1.ravel(), y1.ravel())
+    return geometries
+
+
+def _create_hexes(n_polygons: int, *, bounds: tuple[float, float, float, float]) -> np.ndarray:
+    """Pointy topped hexagons of equal size covering `bounds`, clipped to it."""
+    minx, miny, maxx, maxy = bounds
+    radius = math.sqrt((maxx - minx) * (maxy - miny) / (n_polygons * 1.5 * math.sqrt(3)))
+    width, height = math.sqrt(3) * radius, 1.5 * radius
+
+    rows = np.arange(math.ceil((maxy - miny) / height) + 1)
+    columns = np.arange(math.ceil((maxx - minx) / width) + 1)
+    row, column = (grid.ravel() for grid in np.meshgrid(rows, columns, indexing="ij"))
+    centre_x = minx + (column + (row % 2) / 2) * width
+    centre_y = miny + row * height
+
+    angles = np.radians(np.arange(6) * 60 + 30)
+    rings = np.stack(
+        [centre_x[:, None] + radius * np.cos(angles), centre_y[:, None] + radius * np.sin(angles)], axis=-1
+    )
+    hexes = shapely.intersection(shapely.polygons(rings), shapely.box(*bounds))
+    geometries = hexes[shapely.area(hexes) > 0]
+    return geometries
+
+
+def _create_voronoi(n_polygons: int, *, bounds: tuple[float, float, float, float], seed: int) -> np.ndarray:
+    """Voronoi cells around grid points jittered by up to half a cell, clipped to `bounds`."""
+    minx, miny, maxx, maxy = bounds
+    side = max(round(math.sqrt(n_polygons)), 1)
+    cell_x, cell_y = (maxx - minx) / side, (maxy - miny) / side
+    column, row = (grid.ravel() for grid in np.meshgrid(np.arange(side), np.arange(side)))
+
+    rng = np.random.default_rng(seed)
+    points_x = minx + (column + 0.5 + rng.uniform(-0.5, 0.5, side**2)) * cell_x
+    points_y = miny + (row + 0.5 + rng.uniform(-0.5, 0.5, side**2)) * cell_y
+
+    box = shapely.box(*bounds)
+    cells = shapely.get_parts(
+        shapely.voronoi_polygons(shapely.multipoints(np.column_stack([points_x, points_y])), extend_to=box)
+    )
+    geometries = shapely.intersection(cells, box)
+    return geometries
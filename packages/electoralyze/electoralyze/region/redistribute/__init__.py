@@ -1,3 +1,10 @@
-from .redistribute import redistribute
+from .compose import compose_region_mapping
+from .redistribute import get_redistribute_diagnostics, redistribute, redistribute_long, redistribute_many
 
-__all__ = ["redistribute"]
+__all__ = [
+    "redistribute",
+    "redistribute_long",
+    "redistribute_many",
+    "compose_region_mapping",
+    "get_redistribute_diagnostics",
+]
@@ -0,0 +1,112 @@
+import os
+import threading
+
+import polars as pl
+from cachetools import LRUCache
+
+from ..region_abc import RegionABC
+from .utils import FULL_GEOMETRY_OPTIONS, WEIGHT_OPTIONS, WeightMetric
+
+MAPPING_CACHE_MAX_BYTES = 512 * 1024**2
+RATIO_CACHE_MAX_BYTES = 512 * 1024**2
+WEIGHT_CACHE_MAX_ITEMS = 16
+
+
+def _get_size(data: pl.DataFrame) -> int:
+    """Size of a cached dataframe in bytes, at least 1 so empty frames still count towards the cache."""
+    return max(data.estimated_size(), 1)
+
+
+MAPPING_CACHE = LRUCache(maxsize=MAPPING_CACHE_MAX_BYTES, getsizeof=_get_size)
+RATIO_CACHE = LRUCache(maxsize=RATIO_CACHE_MAX_BYTES, getsizeof=_get_size)
+WEIGHT_CACHE = LRUCache(maxsize=WEIGHT_CACHE_MAX_ITEMS)
+CACHE_LOCK = threading.RLock()
+
+
+def mapping_cache_key(
+    region_from: RegionABC,
+    region_to: RegionABC,
+    *,
+    mapping_method: str,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
+    verify_nesting: bool = False,
+    **kwargs,  # noqa: ARG001
+) -> tuple:
+    """Key for `MAPPING_CACHE`, the regions are sorted as both directions share one mapping.
+
+    Keyword arguments which don't change the mapping (e.g. `intersection_engine`) are ignored. `verify_nesting` is
+    kept, so a mapping cached without the check isn't returned when the check is asked for.
+    """
+    regions = tuple(sorted((region_from, region_to), key=lambda region_: region_.id))
+    return (*regions, mapping_method, redistribute_with_full, verify_nesting)
+
+
+def ratio_cache_key(
+    *,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    mapping_method: str,
+    mapping_weights: WEIGHT_OPTIONS | WeightMetric | None,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
+    region_via: RegionABC | list[RegionABC] | None = None,
+) -> tuple:
+    """Key for `RATIO_CACHE`, ratios are normalised over `region_from` so the key keeps the direction.
+
+    A chain of `region_via` regions is flattened into the key, so clearing the caches of any region in it works.
+    """
+    weights_key = weight_cache_key(mapping_weights) if mapping_weights is not None else None
+    regions_via = region_via if isinstance(region_via, list) else [region_via]
+    return (region_from, *regions_via, region_to, mapping_method, weights_key, redistribute_with_full)
+
+
+def weight_cache_key(mapping_weights: WEIGHT_OPTIONS | WeightMetric) -> str | tuple:
+    """Key for `WEIGHT_CACHE`, metrics aren't hashable so are keyed by their name and where their data is stored.
+
+    The modification time and size of each primary region's processed file are part of the key, so reprocessing a
+    metric gives new weights, and new ratios weighted by it.
+    """
+    if isinstance(mapping_weights, str):
+        return mapping_weights
+    processed_path = mapping_weights.get_processed_path()
+    processed_file_versions = tuple(
+        _get_file_version(processed_path.format(region_id=metric_region.region.id))
+        for metric_region in mapping_weights.allowed_regions
+        if metric_region.is_primary
+    )
+    return (mapping_weights.full_name, processed_path, processed_file_versions)
+
+
+def _get_file_version(file: str) -> tuple[int, int] | None:
+    """Modification time and size of a file, `None` if it doesn't exist."""
+    if not os.path.exists(file):
+        return None
+    file_stat = os.stat(file)
+    return file_stat.st_mtime_ns, file_stat.st_size
+
+
+def clear_region_pair_caches(region_a: RegionABC, region_b: RegionABC) -> None:
+    """Remove cached mappings and ratios involving both regions, e.g. after their mapping file is rewritten."""
+    with CACHE_LOCK:
+        for cache in (MAPPING_CACHE, RATIO_CACHE):
+            for key in [key for key in cache if (region_a in key) and (region_b in key)]:
+                cache.pop(key, None)
+
+
+def clear_region_caches(*regions: RegionABC) -> None:
+    """Remove cached mappings and ratios involving any of the given regions, or everything if none are given.
+
+    Registered with `RegionABC.register_cache_clear_hook` so `RegionABC.cache_clear` also clears these caches.
+    Weights aren't keyed by region, so are only cleared with everything else.
+    """
+    with CACHE_LOCK:
+        if not regions:
+            WEIGHT_CACHE.clear()
+        for cache in (MAPPING_CACHE, RATIO_CACHE):
+            if not regions:
+                cache.clear()
+                continue
+            for key in [key for key in cache if any(region_ in key for region_ in regions)]:
+                cache.pop(key, None)
+
+
+RegionABC.register_cache_clear_hook(clear_region_caches)
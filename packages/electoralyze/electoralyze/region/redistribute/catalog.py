@@ -0,0 +1,239 @@
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import warnings
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import UTC, datetime
+
+import polars as pl
+
+from electoralyze.common.constants import REGION_SIMPLIFY_TOLERANCE
+from electoralyze.common.files import create_path
+
+from ..region_abc import RegionABC
+
+
+def get_catalog_entry(mapping_file: str, /, *, region: RegionABC) -> dict | None:
+    """Get the catalog entry for a stored mapping file, `None` if it isn't in the catalog.
+
+    The catalog is a single json file next to the mapping files, keyed by the mapping file path relative to it,
+    so looking up a mapping doesn't need to touch the mapping files themselves.
+
+    Parameters
+    ----------
+    mapping_file: str, path to the mapping file.
+    region: RegionABC, any region, used to find the catalog file.
+
+    Returns
+    -------
+    dict | None, e.g.
+    ```python
+    >>> get_catalog_entry(".../redistribute/intersection_area/quadrant/triangle.parquet", region=region.quadrant)
+    {
+        "mapping": "intersection_area",
+        "geometry_hashes": {"quadrant": "4f1c...", "triangle": "a9e0..."},
+        "redistribute_with_full": True,
+        "simplify_tolerance": 0.0001,
+        "rows": 10,
+        "build_seconds": 0.012,
+        "built_at": "2024-11-20T01:02:03+00:00",
+    }
+    ```
+    """
+    catalog = _read_catalog(region.redistribute_catalog_file)
+    catalog_entry = catalog.get(_get_catalog_key(mapping_file, region=region))
+    return catalog_entry
+
+
+def record_catalog_entry(
+    mapping_file: str,
+    /,
+    *,
+    mapping: str,
+    regions: list[RegionABC],
+    redistribute_with_full: bool,
+    region_mapping: pl.DataFrame,
+    build_seconds: float,
+) -> None:
+    """Record how a stored mapping file was built in the catalog.
+
+    The catalog is read, updated and written while holding a lock on it, so mappings built at once in separate
+    processes (e.g. by `precompute_mappings`) don't lose each other's entries.
+
+    Parameters
+    ----------
+    mapping_file: str, path to the saved mapping file.
+    mapping: str, name of the mapping, e.g. `"intersection_area"` or `"intersection_area_via_quadrant"`.
+    regions: list[RegionABC], every region whose geometry the mapping was built from.
+    redistribute_with_full: bool, whether full or simplified geometries were used.
+    region_mapping: pl.DataFrame, the saved mapping.
+    build_seconds: float, time taken to build the mapping.
+    """
+    catalog_file = regions[0].redistribute_catalog_file
+    catalog_entry = {
+        "mapping": mapping,
+        "geometry_hashes": {region_.id: region_.geometry_hash for region_ in regions},
+        "redistribute_with_full": redistribute_with_full,
+        "simplify_tolerance": REGION_SIMPLIFY_TOLERANCE,
+        "rows": len(region_mapping),
+        "build_seconds": round(build_seconds, 3),
+        "built_at": datetime.now(UTC).isoformat(timespec="seconds"),
+    }
+    with _lock_catalog(catalog_file):
+        catalog = _read_catalog(catalog_file)
+        catalog[_get_catalog_key(mapping_file, region=regions[0])] = catalog_entry
+        _write_catalog(catalog_file, catalog)
+
+    for region_ in regions:
+        geometry_hashes_file = _get_geometry_hashes_file(region_, region_.geometry_hash)
+        if not os.path.exists(geometry_hashes_file):
+            create_path(geometry_hashes_file)
+            region_.geometry_hashes.write_parquet(geometry_hashes_file)
+
+
+def get_stale_reasons(mapping_file: str, /, *, regions: list[RegionABC]) -> list[str]:
+    """Find why a stored mapping file no longer matches the current geometry of its regions.
+
+    Mapping files missing from the catalog, or regions without processed geometry, can't be checked and are
+    assumed to be up to date.
+
+    Returns
+    -------
+    list[str], reasons the mapping is stale, empty if it is up to date. E.g.
+    ```python
+    ["`quadrant` geometry has changed since the mapping was built."]
+    ```
+    """
+    catalog_entry = get_catalog_entry(mapping_file, region=regions[0])
+    if catalog_entry is None:
+        logging.warning(f"Mapping file {mapping_file!r} is not in the catalog, cannot check if it is stale.")
+        return []
+
+    stale_reasons = []
+    if catalog_entry["simplify_tolerance"] != REGION_SIMPLIFY_TOLERANCE:
+        stale_reasons.append(
+            f"Built with simplify tolerance {catalog_entry['simplify_tolerance']}, now {REGION_SIMPLIFY_TOLERANCE}."
+        )
+    for region_ in regions:
+        if not os.path.exists(region_.geometry_file):
+            logging.warning(f"No geometry for `{region_.id}`, cannot check if the mapping is stale.")
+            continue
+        if catalog_entry["geometry_hashes"].get(region_.id) != region_.geometry_hash:
+            stale_reasons.append(f"`{region_.id}` geometry has changed since the mapping was built.")
+
+    return stale_reasons
+
+
+def get_changed_ids(mapping_file: str, /, *, regions: list[RegionABC]) -> dict[str, pl.Series] | None:
+    """Find which features of each region changed since the stored mapping was built.
+
+    Compares `region.geometry_hashes` against the snapshot saved with the catalog entry. Features which were added
+    or removed also count as changed.
+
+    Returns
+    -------
+    dict[str, pl.Series] | None, changed ids for each region id, `None` if the mapping or a snapshot isn't in the
+    catalog. E.g.
+    ```python
+    {"far_right": pl.Series("far_right", ["F5"]), "quadrant": pl.Series("quadrant", [], dtype=pl.String)}
+    ```
+    """
+    catalog_entry = get_catalog_entry(mapping_file, region=regions[0])
+    if catalog_entry is None:
+        return None
+
+    changed_ids = {}
+    for region_ in regions:
+        geometry_hashes_file = _get_geometry_hashes_file(region_, catalog_entry["geometry_hashes"].get(region_.id))
+        if not os.path.exists(geometry_hashes_file):
+            logging.warning(f"No geometry hash snapshot for `{region_.id}`, cannot find changed features.")
+            return None
+
+        geometry_hashes_old = pl.read_parquet(geometry_hashes_file)
+        geometry_hashes_new = region_.geometry_hashes
+        changed_ids[region_.id] = pl.concat(
+            [
+                geometry_hashes_new.join(geometry_hashes_old, on=[region_.id, "geometry_hash"], how="anti"),
+                geometry_hashes_old.join(geometry_hashes_new, on=region_.id, how="anti"),
+            ]
+        )[region_.id].unique()
+
+    return changed_ids
+
+
+def is_rebuild_needed(mapping_file: str, /, *, regions: list[RegionABC], redistribute_with_full: bool | None) -> bool:
+    """Check whether an existing mapping file is stale and should be rebuilt.
+
+    Stale mappings are rebuilt if new mappings can be created, i.e. `redistribute_with_full` is not None, otherwise
+    a warning is raised and the stale mapping should be used.
+    """
+    stale_reasons = get_stale_reasons(mapping_file, regions=regions)
+    if not stale_reasons:
+        return False
+
+    if redistribute_with_full is None:
+        warnings.warn(
+            f"Using stale mapping file {mapping_file!r}: {' '.join(stale_reasons)} "
+            "Pass `redistribute_with_full=True/False` to rebuild it.",
+            stacklevel=3,
+        )
+        return False
+
+    logging.info(f"Rebuilding stale mapping: {' '.join(stale_reasons)}")
+    return True
+
+
+def _get_catalog_key(mapping_file: str, /, *, region: RegionABC) -> str:
+    """Key for a mapping file in the catalog, e.g. `"intersection_area/quadrant/triangle"`."""
+    catalog_dir = os.path.dirname(region.redistribute_catalog_file)
+    catalog_key = os.path.splitext(os.path.relpath(mapping_file, catalog_dir))[0]
+    return catalog_key
+
+
+def _get_geometry_hashes_file(region: RegionABC, geometry_hash: str | None) -> str:
+    """Snapshot of `region.geometry_hashes` saved with the catalog, e.g. `".../geometry_hashes/quadrant/4f.parquet"`."""
+    catalog_dir = os.path.dirname(region.redistribute_catalog_file)
+    geometry_hashes_file = os.path.join(catalog_dir, "geometry_hashes", region.id, f"{geometry_hash}.parquet")
+    return geometry_hashes_file
+
+
+def _read_catalog(catalog_file: str, /) -> dict[str, dict]:
+    """Read the catalog, empty if it doesn't exist yet."""
+    if not os.path.exists(catalog_file):
+        return {}
+    with open(catalog_file) as file:
+        catalog = json.load(file)
+    return catalog
+
+
+def _write_catalog(catalog_file: str, catalog: dict[str, dict], /) -> None:
+    """Write the catalog, replacing the file in one step so readers never see a partial file.
+
+    Each write goes through its own temporary file, so concurrent writers never move each other's file.
+    """
+    create_path(catalog_file)
+    file_descriptor, temp_file = tempfile.mkstemp(
+        dir=os.path.dirname(catalog_file), prefix=f"{os.path.basename(catalog_file)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "w") as file:
+            json.dump(dict(sorted(catalog.items())), file, indent=2)
+        os.replace(temp_file, catalog_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+@contextmanager
+def _lock_catalog(catalog_file: str, /) -> Iterator[None]:
+    """Hold an exclusive lock on the catalog across processes, using a lock file next to it."""
+    create_path(catalog_file)
+    with open(f"{catalog_file}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,185 @@
+import itertools
+import logging
+import os
+import time
+
+import polars as pl
+
+from ..region_abc import RegionABC
+from .cache import clear_region_pair_caches
+from .catalog import is_rebuild_needed, record_catalog_entry
+from .mapping import _scan_region_mapping_file, _write_region_mapping, get_region_mapping_base
+from .utils import FULL_GEOMETRY_OPTIONS, MAPPING_OPTIONS
+
+
+def compose_region_mapping(
+    region_from: RegionABC,
+    region_via: RegionABC | list[RegionABC],
+    region_to: RegionABC,
+    *,
+    mapping_method: MAPPING_OPTIONS,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
+    save_data: bool = False,
+    force_new: bool = False,
+) -> pl.DataFrame:
+    """Derive a mapping `region_from -> region_to` from the mappings `region_from -> region_via -> region_to`.
+
+    No geometry is touched, the `region_via -> region_to` mapping is turned into ratios and each
+    `region_from -> region_via` row is spread over `region_to` with them. The result has the same
+    `(region_from, region_to, mapping)` schema as `get_region_mapping_base` so it can be passed straight to
+    `redistribute(mapping=...)`.
+
+    `region_via` can be a chain of regions, each hop is composed in turn. Only mapping rows are ever joined, so
+    redistributing data through the composed mapping costs the same however many hops there are.
+
+    Unlike base mappings, composed mappings are directional so are stored under
+    `.../redistribute/{mapping}_via_{region_via}/{region_from}/{region_to}.parquet`, with the ids of a chain joined
+    by `_`.
+
+    Parameters
+    ----------
+    region_from: RegionABC, From region, `region_from.id` will be a column in the mapping.
+    region_via: RegionABC | list[RegionABC], Region, or chain of regions in order, to go through.
+    region_to: RegionABC, To region, `region_to.id` will be a column in the mapping.
+    mapping_method: Literal["intersection_area", "centroid_distance"], mapping method, refer to `redistribute`.
+    redistribute_with_full: bool | None = None, refer to `get_region_mapping_base`, used for every hop.
+    save_data: bool = False, save the composed mapping locally if True.
+    force_new: bool = False, force a new composed mapping, even if one already exists.
+        Stale composed mappings are handled like in `get_region_mapping_base`.
+
+    Returns
+    -------
+    pl.DataFrame, mapping from region_from to region_to.
+    E.g.
+    ```
+    >>> compose_region_mapping(region.square, region.quadrant, region.l_and_r, mapping_method="intersection_area")
+    shape: (2, 3)
+    ┌────────┬─────────┬─────────┐
+    │ square ┆ l_and_r ┆ mapping │
+    │ ---    ┆ ---     ┆ ---     │
+    │ str    ┆ str     ┆ f64     │
+    ╞════════╪═════════╪═════════╡
+    │ main   ┆ L       ┆ 32.0    │
+    │ main   ┆ R       ┆ 32.0    │
+    └────────┴─────────┴─────────┘
+    ```
+    """
+    regions_via = region_via if isinstance(region_via, list) else [region_via]
+    regions = [region_from, *regions_via, region_to]
+    region_ids = [region_.id for region_ in regions]
+    if (not regions_via) or (len(set(region_ids)) != len(region_ids)):
+        raise ValueError(f"`from`, `via` and `to` regions must all be different. Got {region_ids!r}")
+    if (save_data is True) and (redistribute_with_full is False):
+        raise ValueError("Cannot save data composed from simplified regions.")
+
+    composed_file = _get_composed_mapping_file(region_from, regions_via, region_to, mapping=mapping_method)
+
+    is_stale = (
+        (not force_new)
+        and os.path.exists(composed_file)
+        and is_rebuild_needed(composed_file, regions=regions, redistribute_with_full=redistribute_with_full)
+    )
+    if (not force_new) and (not is_stale) and os.path.exists(composed_file):
+        logging.info("Reading composed region mapping.")
+        return _scan_region_mapping_file(composed_file).collect()
+
+    logging.info("Composing region mapping.")
+    build_start = time.perf_counter()
+    mapping_kwargs = dict(mapping_method=mapping_method, redistribute_with_full=redistribute_with_full)
+    region_mapping = get_region_mapping_base(region_from, regions_via[0], **mapping_kwargs).select(
+        region_from.id, regions_via[0].id, "mapping"
+    )
+    for region_via_, region_next in itertools.pairwise(regions[1:]):
+        mapping_via_next = get_region_mapping_base(region_via_, region_next, **mapping_kwargs)
+        ratio_via_next = mapping_via_next.select(
+            region_via_.id,
+            region_next.id,
+            pl.col("mapping").truediv(pl.col("mapping").sum()).over(region_via_.id).alias("ratio"),
+        )
+        region_mapping = _compose(
+            region_mapping,
+            ratio_via_next,
+            region_from_id=region_from.id,
+            region_via_id=region_via_.id,
+            region_to_id=region_next.id,
+            value_column="mapping",
+        )
+
+    if save_data:
+        _write_region_mapping(region_mapping, composed_file, sort_by=[region_from.id, region_to.id])
+        record_catalog_entry(
+            composed_file,
+            mapping=_get_composed_mapping(regions_via, mapping=mapping_method),
+            regions=regions,
+            # Stored base mappings are always built from full geometry.
+            redistribute_with_full=redistribute_with_full is not False,
+            region_mapping=region_mapping,
+            build_seconds=time.perf_counter() - build_start,
+        )
+        clear_region_pair_caches(region_from, region_to)
+
+    return region_mapping
+
+
+def _compose(
+    values_from_via: pl.DataFrame,
+    ratio_via_to: pl.DataFrame,
+    *,
+    region_from_id: str,
+    region_via_id: str,
+    region_to_id: str,
+    value_column: str,
+) -> pl.DataFrame:
+    """Sparse join, multiply and aggregate `region_from -> region_via` values through `region_via -> region_to` ratios.
+
+    Rows without a `region_via` (unassigned area) stay unassigned, so totals per `region_from` are kept.
+
+    Parameters
+    ----------
+    values_from_via: pl.DataFrame, with columns `region_from_id`, `region_via_id` and `value_column`.
+    ratio_via_to: pl.DataFrame, with columns `region_via_id`, `region_to_id` and `ratio`, summing to 1 per via region.
+
+    Returns
+    -------
+    pl.DataFrame, with columns `region_from_id`, `region_to_id` and `value_column`.
+    """
+    composed = (
+        values_from_via.filter(pl.col(region_from_id).is_not_null())
+        .join(ratio_via_to.select(region_via_id, region_to_id, "ratio"), on=region_via_id, how="left")
+        .group_by(region_from_id, region_to_id)
+        .agg(pl.col(value_column).mul(pl.col("ratio").fill_null(1.0)).sum())
+    )
+    return composed
+
+
+def _get_composed_mapping_file(
+    region_from: RegionABC,
+    region_via: RegionABC | list[RegionABC],
+    region_to: RegionABC,
+    *,
+    mapping: MAPPING_OPTIONS,
+) -> str:
+    """Returns the path to the composed mapping file for the given regions.
+
+    Returns
+    -------
+    str, path to the mapping file, e.g.
+    ```python
+    ".../data/regions/redistribute/intersection_area_via_quadrant/square/l_and_r.parquet"
+    ```
+    """
+    composed_file = region_from.redistribute_file.format(
+        mapping=_get_composed_mapping(region_via, mapping=mapping),
+        region_a=region_from.id,
+        region_b=region_to.id,
+    )
+    return composed_file
+
+
+def _get_composed_mapping(region_via: RegionABC | list[RegionABC], *, mapping: MAPPING_OPTIONS) -> str:
+    """Name of a composed mapping, e.g. `intersection_area_via_quadrant` or `intersection_area_via_l_and_r__quadrant`.
+
+    Hops are separated by `__` as region ids already contain `_`, so different chains can't share a name.
+    """
+    regions_via = region_via if isinstance(region_via, list) else [region_via]
+    return f"{mapping}_via_" + "__".join(region_.id for region_ in regions_via)
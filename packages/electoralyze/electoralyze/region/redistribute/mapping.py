@@ -1,14 +1,37 @@
 import logging
+import math
+import multiprocessing
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import get_args
 
+import numpy as np
 import polars as pl
 import polars_st as st
+import pyogrio
+import shapely
+from cachetools import cached
+from scipy.spatial import cKDTree
 
+from electoralyze.common.constants import REGION_SIMPLIFY_TOLERANCE
 from electoralyze.common.files import create_path
-from electoralyze.common.geometry import to_geopandas
+from electoralyze.common.geometry import to_geopandas, to_shapely
 
 from ..region_abc import RegionABC
-from .utils import MAPPING_OPTIONS
+from .cache import CACHE_LOCK, MAPPING_CACHE, clear_region_pair_caches, mapping_cache_key
+from .catalog import get_changed_ids, is_rebuild_needed, record_catalog_entry
+from .utils import FULL_GEOMETRY_OPTIONS, INTERSECTION_ENGINE_OPTIONS, MAPPING_OPTIONS
+
+STRTREE_BATCH_SIZE = 100_000
+SHARDS_PER_WORKER = 4
+STREAMING_MEMORY_FACTOR = 4
+CENTROID_DISTANCE_NEIGHBOURS = 8
+EARTH_RADIUS_KM = 6371.0
+MIN_CENTROID_DISTANCE_KM = 1e-6
+MAPPING_ROW_GROUP_SIZE = 100_000
 
 
 def get_region_mapping_base(
@@ -16,9 +39,14 @@ def get_region_mapping_base(
     region_to: RegionABC,
     *,
     mapping_method: MAPPING_OPTIONS,
-    redistribute_with_full: bool | None = None,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
     save_data: bool = False,
     force_new: bool = False,
+    intersection_engine: INTERSECTION_ENGINE_OPTIONS = "overlay",
+    workers: int | None = None,
+    verify_nesting: bool = False,
+    incremental: bool = False,
+    memory_budget: int | None = None,
 ) -> pl.DataFrame:
     """Get region mapping base.
 
@@ -27,12 +55,29 @@ def get_region_mapping_base(
     region_from: RegionABC, From region to redistribute, should be a column in the dataframe.
     region_to: RegionABC, To region to redistribute, Will output data with this column.
     mapping_method: Literal["intersection_area", "centroid_distance"], mapping method, refer to `redistribute`.
-    redistribute_with_full: bool | None = None,
+    redistribute_with_full: bool | Literal["adaptive"] | None = None,
         - None = only use existing static redistribution map files.
         - False = Will create redistribution maps using simplified geometries for each region.
         - True = Will create redistribution maps using full geometries for each region (EXPENSIVE!).
+        - "adaptive" = Will create redistribution maps using simplified geometries, only intersecting full geometries
+            of regions near a boundary of the other region, refer to `_create_intersection_area_mapping_adaptive`.
     save_data: bool = False, save data locally if True.
     force_new: bool = False, force new mapping file, even if one already exists.
+        Stored mapping files are also rebuilt if the catalog shows they are stale, refer to `catalog.py`. If
+        `redistribute_with_full = None` a stale mapping is used with a warning instead.
+        Mappings which are not saved or forced are cached in memory, both directions sharing one entry, refer to
+        `cache.py`. Use `RegionABC.cache_clear` to clear them.
+    intersection_engine: Literal["overlay", "strtree"] = "overlay", engine used to find intersection areas,
+        refer to `_create_intersection_area_mapping`.
+    workers: int | None = None, number of processes used to find intersection areas, None or 1 runs serially.
+    verify_nesting: bool = False, if one region declares the other in `parent_regions` the mapping is created with
+        a join, refer to `_create_nested_intersection_area_mapping`. If True, check each child lies in its parent.
+    incremental: bool = False, if True, a stored `intersection_area` mapping being rebuilt (stale or `force_new`) is
+        updated by only recomputing regions whose geometry hash changed since it was saved, refer to
+        `_update_intersection_area_mapping`. Falls back to a full rebuild if the catalog can't tell what changed.
+    memory_budget: int | None = None, if given with `redistribute_with_full = True`, `intersection_area` mappings are
+        built by streaming the raw geometry in chunks to keep memory around this many bytes, refer to
+        `_create_intersection_area_mapping_streaming`.
 
     Returns
     -------
@@ -59,6 +104,52 @@ def get_region_mapping_base(
     └──────────┴──────────┴──────────┘
     ```
     """
+    if intersection_engine not in get_args(INTERSECTION_ENGINE_OPTIONS):
+        raise ValueError(f"Unknown intersection engine `{intersection_engine}`")
+
+    mapping_kwargs = dict(
+        mapping_method=mapping_method,
+        redistribute_with_full=redistribute_with_full,
+        save_data=save_data,
+        force_new=force_new,
+        intersection_engine=intersection_engine,
+        workers=workers,
+        verify_nesting=verify_nesting,
+        incremental=incremental,
+        memory_budget=memory_budget,
+    )
+    if force_new or save_data:
+        region_mapping = _get_region_mapping_base(region_from, region_to, **mapping_kwargs)
+        if save_data:
+            clear_region_pair_caches(region_from, region_to)
+        return region_mapping
+
+    region_mapping = _get_region_mapping_base_cached(region_from, region_to, **mapping_kwargs)
+    return region_mapping
+
+
+@cached(MAPPING_CACHE, key=mapping_cache_key, lock=CACHE_LOCK)
+def _get_region_mapping_base_cached(region_from: RegionABC, region_to: RegionABC, **mapping_kwargs) -> pl.DataFrame:
+    """Cached `_get_region_mapping_base`, only used when nothing is saved or forced."""
+    region_mapping = _get_region_mapping_base(region_from, region_to, **mapping_kwargs)
+    return region_mapping
+
+
+def _get_region_mapping_base(
+    region_from: RegionABC,
+    region_to: RegionABC,
+    *,
+    mapping_method: MAPPING_OPTIONS,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS,
+    save_data: bool,
+    force_new: bool,
+    intersection_engine: INTERSECTION_ENGINE_OPTIONS,
+    workers: int | None,
+    verify_nesting: bool,
+    incremental: bool,
+    memory_budget: int | None,
+) -> pl.DataFrame:
+    """Read or create the region mapping, refer to `get_region_mapping_base`."""
     mapping_file = _get_region_mapping_file(region_from, region_to, mapping=mapping_method)
 
     if (redistribute_with_full is None) and (not os.path.exists(mapping_file)):
@@ -71,40 +162,456 @@ def get_region_mapping_base(
     if (save_data is True) and redistribute_with_full is not True:
         raise ValueError("Cannot save data with simplified regions. set `redistribute_with_full = True` to save")
 
-    if force_new or (not os.path.exists(mapping_file)):
-        logging.info("Generating region mapping.")
+    is_stale = (
+        (not force_new)
+        and os.path.exists(mapping_file)
+        and is_rebuild_needed(
+            mapping_file, regions=[region_from, region_to], redistribute_with_full=redistribute_with_full
+        )
+    )
 
-        if redistribute_with_full:
-            geometry_from: st.GeoDataFrame = region_from.get_raw_geometry()
-            geometry_to: st.GeoDataFrame = region_to.get_raw_geometry()
-        else:
-            geometry_from: st.GeoDataFrame = region_from.geometry
-            geometry_to: st.GeoDataFrame = region_to.geometry
+    if force_new or is_stale or (not os.path.exists(mapping_file)):
+        logging.info("Generating region mapping.")
+        build_start = time.perf_counter()
 
-        match mapping_method:
-            case "intersection_area":
-                region_mapping = _create_intersection_area_mapping(geometry_from, geometry_to)
-            case "centroid_distance":
-                region_mapping = _create_centroid_distance_mapping(geometry_from, geometry_to)
-            case _:
-                raise ValueError(f"Unknown mapping method `{mapping_method}`")
+        region_mapping = _create_region_mapping(
+            region_from,
+            region_to,
+            mapping_file=mapping_file,
+            mapping_method=mapping_method,
+            redistribute_with_full=redistribute_with_full,
+            intersection_engine=intersection_engine,
+            workers=workers,
+            verify_nesting=verify_nesting,
+            incremental=incremental,
+            memory_budget=memory_budget,
+        )
 
         if save_data:
-            create_path(mapping_file)
-            region_mapping.write_parquet(mapping_file)
+            _write_region_mapping(region_mapping, mapping_file, sort_by=sorted([region_from.id, region_to.id]))
+            record_catalog_entry(
+                mapping_file,
+                mapping=mapping_method,
+                regions=[region_from, region_to],
+                redistribute_with_full=redistribute_with_full,
+                region_mapping=region_mapping,
+                build_seconds=time.perf_counter() - build_start,
+            )
     else:
         logging.info("Reading region mapping.")
-        region_mapping = pl.read_parquet(mapping_file)
+        region_mapping = _scan_region_mapping_file(mapping_file).collect()
+
+    return region_mapping
+
+
+def _create_region_mapping(
+    region_from: RegionABC,
+    region_to: RegionABC,
+    *,
+    mapping_file: str,
+    mapping_method: MAPPING_OPTIONS,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS,
+    intersection_engine: INTERSECTION_ENGINE_OPTIONS,
+    workers: int | None,
+    verify_nesting: bool,
+    incremental: bool,
+    memory_budget: int | None,
+) -> pl.DataFrame:
+    """Create a new region mapping from geometry, refer to `get_region_mapping_base`."""
+    nesting = _get_nesting(region_from, region_to)
+    is_intersection_area_overlay = (mapping_method == "intersection_area") and (nesting is None)
+
+    changed_ids = None
+    if incremental and is_intersection_area_overlay and os.path.exists(mapping_file):
+        changed_ids = get_changed_ids(mapping_file, regions=[region_from, region_to])
+
+    if (redistribute_with_full == "adaptive") and is_intersection_area_overlay and (changed_ids is None):
+        region_mapping = _create_intersection_area_mapping_adaptive(
+            region_from, region_to, intersection_engine=intersection_engine, workers=workers
+        )
+        return region_mapping
+
+    if (
+        (memory_budget is not None)
+        and (redistribute_with_full is True)
+        and is_intersection_area_overlay
+        and (changed_ids is None)
+    ):
+        region_mapping = _create_intersection_area_mapping_streaming(
+            region_from, region_to, memory_budget=memory_budget
+        )
+        return region_mapping
+
+    if redistribute_with_full:
+        geometry_from: st.GeoDataFrame = region_from.get_raw_geometry()
+        geometry_to: st.GeoDataFrame = region_to.get_raw_geometry()
+    else:
+        geometry_from: st.GeoDataFrame = region_from.geometry
+        geometry_to: st.GeoDataFrame = region_to.geometry
+
+    match mapping_method:
+        case "intersection_area" if nesting is not None:
+            region_child, region_parent = nesting
+            region_mapping = _create_nested_intersection_area_mapping(
+                region_child,
+                region_parent,
+                geometry_child=geometry_from if region_child is region_from else geometry_to,
+                geometry_parent=geometry_to if region_parent is region_to else geometry_from,
+                verify_nesting=verify_nesting,
+            )
+        case "intersection_area" if changed_ids is not None:
+            region_mapping = _update_intersection_area_mapping(
+                _scan_region_mapping_file(mapping_file).collect(),
+                geometry_from,
+                geometry_to,
+                changed_ids_from=changed_ids[region_from.id],
+                changed_ids_to=changed_ids[region_to.id],
+            )
+        case "intersection_area":
+            region_mapping = _create_intersection_area_mapping(
+                geometry_from,
+                geometry_to,
+                intersection_engine=intersection_engine,
+                workers=workers,
+                total_area_from=region_from.get_area(full=bool(redistribute_with_full)),
+                total_area_to=region_to.get_area(full=bool(redistribute_with_full)),
+            )
+        case "centroid_distance":
+            region_mapping = _create_centroid_distance_mapping(geometry_from, geometry_to)
+        case _:
+            raise ValueError(f"Unknown mapping method `{mapping_method}`")
+
+    return region_mapping
+
+
+def _get_nesting(region_from: RegionABC, region_to: RegionABC) -> tuple[RegionABC, RegionABC] | None:
+    """Returns `(region_child, region_parent)` if either region declares the other in `parent_regions`."""
+    if region_to.id in region_from.parent_regions:
+        return region_from, region_to
+    if region_from.id in region_to.parent_regions:
+        return region_to, region_from
+    return None
+
+
+def _create_nested_intersection_area_mapping(
+    region_child: RegionABC,
+    region_parent: RegionABC,
+    *,
+    geometry_child: st.GeoDataFrame,
+    geometry_parent: st.GeoDataFrame,
+    verify_nesting: bool = False,
+) -> pl.DataFrame:
+    """Create an intersection area mapping for a child region which nests exactly inside a parent region.
+
+    Each child is assigned its whole area in the parent given by `region_child.parent_regions`, so no polygons are
+    intersected. Children with no known parent and parents with no children are left unassigned.
+
+    Parameters
+    ----------
+    region_child: RegionABC, region declaring `region_parent` in its `parent_regions`.
+    region_parent: RegionABC, parent region.
+    geometry_child: st.GeoDataFrame, geometry used for the child areas.
+    geometry_parent: st.GeoDataFrame, geometry used for the areas of parents without children.
+    verify_nesting: bool = False, if True, raise a `ValueError` if any child does not lie in its parent.
+
+    Returns
+    -------
+    pl.DataFrame, same schema as `_create_intersection_area_mapping`, e.g.
+    ```
+    shape: (4, 3)
+    ┌──────────┬─────────┬─────────┐
+    │ quadrant ┆ l_and_r ┆ mapping │
+    │ ---      ┆ ---     ┆ ---     │
+    │ str      ┆ str     ┆ f64     │
+    ╞══════════╪═════════╪═════════╡
+    │ M        ┆ L       ┆ 16.0    │
+    │ N        ┆ R       ┆ 16.0    │
+    │ O        ┆ L       ┆ 16.0    │
+    │ P        ┆ R       ┆ 16.0    │
+    └──────────┴─────────┴─────────┘
+    ```
+    """
+    parent_dtype = geometry_parent[region_parent.id].dtype
+    parent_ids = geometry_parent[region_parent.id]
+
+    child_to_parent = region_child.metadata.select(
+        pl.col(region_child.id),
+        region_child.parent_regions[region_parent.id].cast(parent_dtype).alias(region_parent.id),
+    ).with_columns(
+        pl.when(pl.col(region_parent.id).is_in(parent_ids)).then(pl.col(region_parent.id)).alias(region_parent.id)
+    )
+
+    intersection_area = geometry_child.select(
+        region_child.id,
+        st.geom("geometry").st.area().alias("intersection_area"),
+    ).join(child_to_parent, on=region_child.id, how="left")
+
+    if verify_nesting:
+        _verify_nesting(
+            region_child.id,
+            region_parent.id,
+            geometry_child=geometry_child,
+            geometry_parent=geometry_parent,
+            intersection_area=intersection_area,
+        )
+
+    remaining_area = geometry_parent.join(
+        intersection_area.select(region_parent.id).unique(), on=region_parent.id, how="anti"
+    ).select(
+        pl.lit(None).cast(geometry_child[region_child.id].dtype).alias(region_child.id),
+        region_parent.id,
+        st.geom("geometry").st.area().alias("intersection_area"),
+    )
+
+    region_mapping = (
+        pl.concat([intersection_area.select(region_child.id, region_parent.id, "intersection_area"), remaining_area])
+        .filter(pl.col("intersection_area") != 0)
+        .rename({"intersection_area": "mapping"})
+    )
+    return region_mapping
+
+
+def _verify_nesting(
+    region_child_id: str,
+    region_parent_id: str,
+    *,
+    geometry_child: st.GeoDataFrame,
+    geometry_parent: st.GeoDataFrame,
+    intersection_area: pl.DataFrame,
+) -> None:
+    """Check a point inside each child lies within its parent.
 
+    Both geometries may be simplified so points are allowed to be up to `2 * REGION_SIMPLIFY_TOLERANCE` outside.
+    """
+    assigned = intersection_area.filter(pl.col(region_parent_id).is_not_null()).select(
+        region_child_id, region_parent_id
+    )
+    child_shapes = assigned.join(geometry_child.select(region_child_id, "geometry"), on=region_child_id, how="left")
+    parent_shapes = assigned.join(geometry_parent.select(region_parent_id, "geometry"), on=region_parent_id, how="left")
+
+    points = shapely.point_on_surface(to_shapely(child_shapes))
+    is_nested = shapely.dwithin(to_shapely(parent_shapes), points, 2 * REGION_SIMPLIFY_TOLERANCE)
+
+    if not is_nested.all():
+        not_nested = assigned.filter(~pl.Series(is_nested))
+        raise ValueError(
+            f"{len(not_nested)} `{region_child_id}` regions do not lie in their `{region_parent_id}` parent, "
+            f"e.g. {not_nested.head(5).rows()}. Check `parent_regions`."
+        )
+
+
+def _create_intersection_area_mapping_adaptive(
+    region_from: RegionABC,
+    region_to: RegionABC,
+    *,
+    intersection_engine: INTERSECTION_ENGINE_OPTIONS = "overlay",
+    workers: int | None = None,
+) -> pl.DataFrame:
+    """Create an `intersection_area` mapping from simplified geometry, only intersecting full geometry near boundaries.
+
+    Simplifying moves each boundary by at most `REGION_SIMPLIFY_TOLERANCE`, so a region whose simplified geometry is
+    further than twice that from every simplified boundary of the other region lies entirely inside one region (or
+    none) in full geometry as well. Those regions map their full area to the region containing them, found from the
+    simplified geometry. Only the regions near a boundary of the other region have their full geometries read and
+    intersected, the rest take their full areas from `get_area(full=True)`. Areas are always those of the full
+    geometry, so the result matches `_create_intersection_area_mapping` on full geometry, up to floating point error.
+
+    Parameters
+    ----------
+    intersection_engine: Literal["overlay", "strtree"] = "overlay", refer to `_create_intersection_area_mapping`.
+    workers: int | None = None, refer to `_create_intersection_area_mapping`.
+    """
+    geometry_from_simple, geometry_to_simple = region_from.geometry, region_to.geometry
+    total_area_from, total_area_to = region_from.get_area(full=True), region_to.get_area(full=True)
+
+    boundary_distance = 2 * REGION_SIMPLIFY_TOLERANCE
+    is_boundary_from = _is_near_boundary(geometry_from_simple, geometry_to_simple, distance=boundary_distance)
+    is_boundary_to = _is_near_boundary(geometry_to_simple, geometry_from_simple, distance=boundary_distance)
+    boundary_ids_from = geometry_from_simple.filter(is_boundary_from)[region_from.id]
+    boundary_ids_to = geometry_to_simple.filter(is_boundary_to)[region_to.id]
+    logging.info(
+        f"Intersecting full geometry of {len(boundary_ids_from)}/{len(geometry_from_simple)} `{region_from.id}` and "
+        f"{len(boundary_ids_to)}/{len(geometry_to_simple)} `{region_to.id}` regions near boundaries."
+    )
+
+    intersection_area_interior = pl.concat(
+        [
+            _get_containing_region(geometry_from_simple.filter(~is_boundary_from), geometry_to_simple)
+            .join(total_area_from, on=region_from.id)
+            .rename({"total_area": "intersection_area"}),
+            _get_containing_region(geometry_to_simple.filter(~is_boundary_to), geometry_from_simple)
+            .join(total_area_to, on=region_to.id)
+            .rename({"total_area": "intersection_area"}),
+        ],
+        how="diagonal",
+    ).select(region_from.id, region_to.id, "intersection_area")
+
+    if boundary_ids_from.is_empty() or boundary_ids_to.is_empty():
+        intersection_area_boundary = intersection_area_interior.clear()
+    else:
+        geometry_from_boundary = _get_raw_geometry_boundary(region_from, geometry_from_simple.filter(is_boundary_from))
+        geometry_to_boundary = _get_raw_geometry_boundary(region_to, geometry_to_simple.filter(is_boundary_to))
+        if (workers is not None) and (workers > 1):
+            intersection_area_boundary = _get_intersection_area_sharded(
+                geometry_from_boundary, geometry_to_boundary, workers=workers, intersection_engine=intersection_engine
+            )
+        else:
+            intersection_area_boundary = _get_intersection_area_with_engine(
+                geometry_from_boundary, geometry_to_boundary, intersection_engine=intersection_engine
+            )
+
+    intersection_area = pl.concat(
+        [intersection_area_interior, intersection_area_boundary.select(intersection_area_interior.columns)],
+        how="vertical_relaxed",
+    ).unique([region_from.id, region_to.id], keep="first")
+    region_mapping = _complete_intersection_area(total_area_from, total_area_to, intersection_area)
     return region_mapping
 
 
+def _get_raw_geometry_boundary(region: RegionABC, geometry_simple: st.GeoDataFrame) -> st.GeoDataFrame:
+    """Full raw geometry of the regions in `geometry_simple`, reading only the raw features near them.
+
+    Simplifying moves each boundary by at most `REGION_SIMPLIFY_TOLERANCE`, so every raw feature of a region lies
+    within its simplified bounding box grown by that much. Reading with the union of those boxes as a mask therefore
+    reads every feature of each region, even if `_transform_geometry_raw` unions several features into one id.
+    """
+    bounds = shapely.bounds(to_shapely(geometry_simple))
+    bounds[:, :2] -= REGION_SIMPLIFY_TOLERANCE
+    bounds[:, 2:] += REGION_SIMPLIFY_TOLERANCE
+    mask = shapely.union_all(shapely.box(*bounds.T))
+    geometry = region.get_raw_geometry_chunk(mask=mask).filter(pl.col(region.id).is_in(geometry_simple[region.id]))
+    return geometry
+
+
+def _is_near_boundary(geometry: st.GeoDataFrame, geometry_other: st.GeoDataFrame, *, distance: float) -> pl.Series:
+    """Whether each geometry is within `distance` of any boundary of `geometry_other`."""
+    tree = shapely.STRtree(shapely.boundary(to_shapely(geometry_other)))
+    index, _ = tree.query(to_shapely(geometry), predicate="dwithin", distance=distance)
+    is_near_boundary = np.zeros(len(geometry), dtype=bool)
+    is_near_boundary[index] = True
+    return pl.Series(is_near_boundary)
+
+
+def _get_containing_region(geometry: st.GeoDataFrame, geometry_other: st.GeoDataFrame) -> pl.DataFrame:
+    """The region of `geometry_other` containing each region of `geometry`, which must not cross its boundaries.
+
+    Regions outside every region of `geometry_other` are left out, they only have remaining area.
+    """
+    region_id = list(set(geometry.columns) - {"geometry"})[0]
+    region_id_other = list(set(geometry_other.columns) - {"geometry"})[0]
+    tree = shapely.STRtree(to_shapely(geometry_other))
+    index, index_other = tree.query(shapely.point_on_surface(to_shapely(geometry)), predicate="within")
+    containing_region = pl.DataFrame(
+        [geometry[region_id].gather(index), geometry_other[region_id_other].gather(index_other)]
+    )
+    return containing_region
+
+
+def _create_intersection_area_mapping_streaming(
+    region_from: RegionABC,
+    region_to: RegionABC,
+    *,
+    memory_budget: int,
+    batch_size: int = STRTREE_BATCH_SIZE,
+) -> pl.DataFrame:
+    """Create mapping from one region to another based on intersection area of the full geometry, in bounded memory.
+
+    The region with the larger raw file is read in chunks of rows sized to fit `memory_budget`. For each chunk only
+    the features of the other region within the chunk's bounding box are read, using pyogrio's bbox filter, and the
+    two are intersected with the `strtree` engine. Each chunk's intersection and total areas are flushed to parquet
+    in a temporary directory, so only ids and areas are held once every chunk is done.
+
+    Chunks follow the order of the raw file, ABS and AEC files are ordered by code which keeps chunks spatially
+    close. Poorly ordered files still work but read more of the other region per chunk.
+
+    Regions whose `_transform_geometry_raw` unions several raw rows into one (e.g. `SA2_2021` from SA1 rows) get
+    partial geometries of an id in each chunk or bounding box read. The parts don't overlap, so the intersection and
+    total areas are summed for each pair and each id across all chunks before the remaining areas are found.
+
+    Returns
+    -------
+    pl.DataFrame, same as `_create_intersection_area_mapping` using `get_raw_geometry`.
+    """
+    region_stream, region_other = sorted(
+        (region_from, region_to), key=lambda region_: os.path.getsize(region_.raw_geometry_file), reverse=True
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in ("intersection_area", region_stream.id, region_other.id):
+            os.makedirs(os.path.join(temp_dir, name))
+
+        logging.info(f"Streaming `{region_stream.id}` against `{region_other.id}`.")
+        for chunk, geometry_stream in enumerate(_iter_raw_geometry_chunks(region_stream, memory_budget=memory_budget)):
+            bbox = tuple(shapely.total_bounds(to_shapely(geometry_stream)))
+            geometry_other = region_other.get_raw_geometry_chunk(bbox=bbox)
+
+            intersection_area = _get_intersection_area_strtree(geometry_stream, geometry_other, batch_size=batch_size)
+            intersection_area.write_parquet(os.path.join(temp_dir, "intersection_area", f"{chunk}.parquet"))
+            _get_total_area(geometry_stream).write_parquet(os.path.join(temp_dir, region_stream.id, f"{chunk}.parquet"))
+
+        for chunk, geometry_other in enumerate(_iter_raw_geometry_chunks(region_other, memory_budget=memory_budget)):
+            _get_total_area(geometry_other).write_parquet(os.path.join(temp_dir, region_other.id, f"{chunk}.parquet"))
+
+        intersection_area = (
+            pl.scan_parquet(os.path.join(temp_dir, "intersection_area", "*.parquet"))
+            .group_by(region_from.id, region_to.id)
+            .agg(pl.col("intersection_area").sum())
+            .collect()
+        )
+        total_area_from, total_area_to = (
+            pl.scan_parquet(os.path.join(temp_dir, region_.id, "*.parquet"))
+            .group_by(region_.id)
+            .agg(pl.col("total_area").sum())
+            .collect()
+            for region_ in (region_from, region_to)
+        )
+
+    intersection_area_complete = _complete_intersection_area(
+        total_area_from,
+        total_area_to,
+        intersection_area.select(region_from.id, region_to.id, "intersection_area"),
+    )
+    return intersection_area_complete
+
+
+def _iter_raw_geometry_chunks(region: RegionABC, *, memory_budget: int):
+    """Yield the full raw geometry of a region in chunks of rows.
+
+    Half of `memory_budget` is given to each chunk, leaving the rest for the other region. The memory used per
+    feature is estimated from the raw file size, scaled by `STREAMING_MEMORY_FACTOR` for the decoded geometries.
+    """
+    features = pyogrio.read_info(region.raw_geometry_file)["features"]
+    bytes_per_feature = STREAMING_MEMORY_FACTOR * os.path.getsize(region.raw_geometry_file) / max(features, 1)
+    chunk_features = max(1, int(memory_budget / 2 / bytes_per_feature))
+
+    for skip_features in range(0, features, chunk_features):
+        geometry_chunk = region.get_raw_geometry_chunk(skip_features=skip_features, max_features=chunk_features)
+        if not geometry_chunk.is_empty():
+            yield geometry_chunk
+
+
 def _create_intersection_area_mapping(
     geometry_from: st.GeoDataFrame,
     geometry_to: st.GeoDataFrame,
+    *,
+    intersection_engine: INTERSECTION_ENGINE_OPTIONS = "overlay",
+    workers: int | None = None,
+    total_area_from: pl.DataFrame | None = None,
+    total_area_to: pl.DataFrame | None = None,
 ) -> pl.DataFrame:
     """Create mapping from one region to another based on intersection area.
 
+    Parameters
+    ----------
+    intersection_engine: Literal["overlay", "strtree"] = "overlay",
+        - "overlay": Will build every intersection polygon using `GeoDataFrame.overlay`.
+        - "strtree": Will query candidate pairs from a spatial index and only compute their intersection areas.
+    workers: int | None = None, if more than 1, `geometry_from` is split into spatial shards which are intersected
+        in a process pool, refer to `_get_intersection_area_sharded`.
+    total_area_from: pl.DataFrame | None = None, area of each `from` region, e.g. cached from `RegionABC.get_area`.
+        Found from `geometry_from` if None.
+    total_area_to: pl.DataFrame | None = None, same as `total_area_from` for the `to` regions.
+
     Returns
     -------
     pl.DataFrame:
@@ -130,29 +637,275 @@ def _create_intersection_area_mapping(
     ```
     """
     logging.info("Joining geometries and finding intersection area.")
-    intersection_area = _get_intersection_area(geometry_from, geometry_to)
+    if (workers is not None) and (workers > 1):
+        intersection_area = _get_intersection_area_sharded(
+            geometry_from, geometry_to, workers=workers, intersection_engine=intersection_engine
+        )
+    else:
+        intersection_area = _get_intersection_area_with_engine(
+            geometry_from, geometry_to, intersection_engine=intersection_engine
+        )
 
-    logging.info("Finding remaining areas.")
-    remaining_area_for_from = _get_remaining_area(
-        region_id=list(set(geometry_from.columns) - {"geometry"})[0],
-        geometry=geometry_from,
-        intersection_area=intersection_area,
-    )
-    remaining_area_for_to = _get_remaining_area(
-        region_id=list(set(geometry_to.columns) - {"geometry"})[0],
-        geometry=geometry_to,
-        intersection_area=intersection_area,
+    intersection_area_complete = _complete_intersection_area(
+        _get_total_area(geometry_from) if total_area_from is None else total_area_from,
+        _get_total_area(geometry_to) if total_area_to is None else total_area_to,
+        intersection_area,
     )
+    return intersection_area_complete
+
+
+def _complete_intersection_area(
+    total_area_from: pl.DataFrame,
+    total_area_to: pl.DataFrame,
+    intersection_area: pl.DataFrame,
+) -> pl.DataFrame:
+    """Add the remaining unassigned area of each region to the intersection areas, giving the final mapping.
+
+    Both remaining areas are found in one lazy query: the intersection areas are summed for each `from` and `to`
+    region and subtracted from their total areas with left joins, then concatenated with the intersection areas.
+
+    Parameters
+    ----------
+    total_area_from: pl.DataFrame, area of each `from` region, refer to `RegionABC.get_area`.
+    total_area_to: pl.DataFrame, area of each `to` region, refer to `RegionABC.get_area`.
+    intersection_area: pl.DataFrame, intersection area of each pair of regions, refer to `_get_intersection_area`.
+
+    Returns
+    -------
+    pl.DataFrame, intersection areas with the remaining area of each region in rows with a null for the other region.
+    E.g.
+    ```python
+    shape: (14, 3)
+    ┌──────────┬──────────┬─────────┐
+    │ quadrant ┆ triangle ┆ mapping │
+    │ ---      ┆ ---      ┆ ---     │
+    │ str      ┆ str      ┆ f64     │
+    ╞══════════╪══════════╪═════════╡
+    │ M        ┆ A        ┆ 4.0     │
+    │ …        ┆ …        ┆ …       │
+    │ null     ┆ A        ┆ 2.0     │
+    │ M        ┆ null     ┆ 1.0     │
+    └──────────┴──────────┴─────────┘
+    ```
+    """
+    logging.info("Finding remaining areas.")
+    region_id_from = list(set(total_area_from.columns) - {"total_area"})[0]
+    region_id_to = list(set(total_area_to.columns) - {"total_area"})[0]
+    intersection_area_lazy = intersection_area.lazy()
+
+    remaining_areas = []
+    for region_id, region_id_other, total_area in (
+        (region_id_from, region_id_to, total_area_from),
+        (region_id_to, region_id_from, total_area_to),
+    ):
+        intersected_area = intersection_area_lazy.group_by(region_id).agg(
+            pl.col("intersection_area").sum().alias("intersected_area")
+        )
+        remaining_area = (
+            total_area.lazy()
+            .join(intersected_area, on=region_id, how="left")
+            .select(
+                pl.col(region_id),
+                pl.lit(None, dtype=intersection_area.schema[region_id_other]).alias(region_id_other),
+                pl.col("total_area")
+                .sub(pl.col("intersected_area").fill_null(0))
+                .clip(lower_bound=0)
+                .alias("intersection_area"),
+            )
+            .select(intersection_area.columns)
+        )
+        remaining_areas.append(remaining_area)
 
     intersection_area_complete = (
-        pl.concat([intersection_area, remaining_area_for_from, remaining_area_for_to])
+        pl.concat([intersection_area_lazy, *remaining_areas])
         .filter(pl.col("intersection_area") != 0)
         .rename({"intersection_area": "mapping"})
+        .collect()
     )
+    return intersection_area_complete
+
+
+def _get_total_area(geometry: st.GeoDataFrame) -> pl.DataFrame:
+    """Area of each region, with columns for the region id and `total_area`."""
+    region_id = list(set(geometry.columns) - {"geometry"})[0]
+    total_area = geometry.select(region_id, st.geom("geometry").st.area().alias("total_area"))
+    return total_area
+
+
+def _update_intersection_area_mapping(
+    region_mapping: pl.DataFrame,
+    geometry_from: st.GeoDataFrame,
+    geometry_to: st.GeoDataFrame,
+    *,
+    changed_ids_from: pl.Series,
+    changed_ids_to: pl.Series,
+    batch_size: int = STRTREE_BATCH_SIZE,
+) -> pl.DataFrame:
+    """Update an existing intersection area mapping where only some regions have changed.
+
+    Intersections of changed regions are dropped and recomputed against every region of the other side using a
+    spatial index, so their new neighbours are found too. All other intersections are kept, then the remaining
+    area of every region is recomputed which only needs each region's area.
+
+    Parameters
+    ----------
+    region_mapping: pl.DataFrame, existing mapping, refer to `_create_intersection_area_mapping`.
+    changed_ids_from: pl.Series, ids in `geometry_from` which were changed, added or removed.
+    changed_ids_to: pl.Series, ids in `geometry_to` which were changed, added or removed.
+
+    Returns
+    -------
+    pl.DataFrame, same as `_create_intersection_area_mapping` with the new geometries.
+    """
+    region_id_from = list(set(geometry_from.columns) - {"geometry"})[0]
+    region_id_to = list(set(geometry_to.columns) - {"geometry"})[0]
+    logging.info(
+        f"Updating mapping for {len(changed_ids_from)} changed `{region_id_from}` and "
+        f"{len(changed_ids_to)} changed `{region_id_to}` regions."
+    )
+
+    kept_intersection_area = region_mapping.filter(
+        pl.col(region_id_from).is_not_null(),
+        pl.col(region_id_to).is_not_null(),
+        ~pl.col(region_id_from).is_in(changed_ids_from),
+        ~pl.col(region_id_to).is_in(changed_ids_to),
+    ).select(region_id_from, region_id_to, pl.col("mapping").alias("intersection_area"))
 
+    new_intersection_area = pl.concat(
+        [
+            _get_intersection_area_strtree(
+                geometry_from.filter(pl.col(region_id_from).is_in(changed_ids_from)), geometry_to, batch_size=batch_size
+            ),
+            _get_intersection_area_strtree(
+                geometry_from, geometry_to.filter(pl.col(region_id_to).is_in(changed_ids_to)), batch_size=batch_size
+            ),
+        ]
+    ).unique([region_id_from, region_id_to])
+
+    intersection_area = pl.concat([kept_intersection_area, new_intersection_area], how="vertical_relaxed")
+    intersection_area_complete = _complete_intersection_area(
+        _get_total_area(geometry_from), _get_total_area(geometry_to), intersection_area
+    )
     return intersection_area_complete
 
 
+def _get_intersection_area_with_engine(
+    geometry_from: st.GeoDataFrame,
+    geometry_to: st.GeoDataFrame,
+    *,
+    intersection_engine: INTERSECTION_ENGINE_OPTIONS,
+) -> pl.DataFrame:
+    """Find intersection area between two geometries using the given engine."""
+    match intersection_engine:
+        case "overlay":
+            intersection_area = _get_intersection_area(geometry_from, geometry_to)
+        case "strtree":
+            intersection_area = _get_intersection_area_strtree(geometry_from, geometry_to)
+        case _:
+            raise ValueError(f"Unknown intersection engine `{intersection_engine}`")
+    return intersection_area
+
+
+def _get_intersection_area_sharded(
+    geometry_from: st.GeoDataFrame,
+    geometry_to: st.GeoDataFrame,
+    *,
+    workers: int,
+    intersection_engine: INTERSECTION_ENGINE_OPTIONS,
+) -> pl.DataFrame:
+    """Find intersection area between two geometries in a process pool.
+
+    `geometry_from` is split into `workers * SHARDS_PER_WORKER` spatially coherent shards, each shard is paired with
+    the part of `geometry_to` whose bounding boxes overlap the shard. As every feature of `geometry_from` lands in
+    exactly one shard, concatenating the partial frames gives the same rows as `_get_intersection_area_with_engine`.
+
+    Returns
+    -------
+    pl.DataFrame, same as `_get_intersection_area`.
+    """
+    if intersection_engine not in ("overlay", "strtree"):
+        raise ValueError(f"Unknown intersection engine `{intersection_engine}`")
+
+    shards = _get_spatial_shards(geometry_from, geometry_to, n_shards=workers * SHARDS_PER_WORKER)
+    if not shards:
+        return _get_intersection_area_with_engine(geometry_from, geometry_to, intersection_engine=intersection_engine)
+
+    logging.info(f"Finding intersection area over {len(shards)} shards with {workers} workers.")
+    # Polars is multithreaded, forking it can deadlock so always spawn.
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+        intersection_areas = list(
+            executor.map(_get_intersection_area_shard, shards, repeat(intersection_engine, len(shards)))
+        )
+
+    intersection_area = pl.concat(intersection_areas, how="vertical_relaxed")
+    return intersection_area
+
+
+def _get_intersection_area_shard(
+    shard: tuple[st.GeoDataFrame, st.GeoDataFrame],
+    intersection_engine: INTERSECTION_ENGINE_OPTIONS,
+) -> pl.DataFrame:
+    """Find intersection area for a single shard, run inside the process pool."""
+    geometry_from, geometry_to = shard
+    intersection_area = _get_intersection_area_with_engine(
+        geometry_from, geometry_to, intersection_engine=intersection_engine
+    )
+    return intersection_area
+
+
+def _get_spatial_shards(
+    geometry_from: st.GeoDataFrame,
+    geometry_to: st.GeoDataFrame,
+    *,
+    n_shards: int,
+) -> list[tuple[st.GeoDataFrame, st.GeoDataFrame]]:
+    """Split `geometry_from` into bounding box tiles, each paired with the index filtered part of `geometry_to`.
+
+    Features are ordered by the grid tile their bounding box center falls in, then split into `n_shards` contiguous
+    ranges so shards are roughly equal in size while staying spatially compact. Shards without any candidate in
+    `geometry_to` are dropped as they cannot intersect.
+    """
+    if geometry_from.height == 0 or geometry_to.height == 0:
+        return []
+
+    shapes_from = to_shapely(geometry_from)
+    shapes_to = to_shapely(geometry_to)
+
+    bounds = shapely.bounds(shapes_from)
+    centers_x = (bounds[:, 0] + bounds[:, 2]) / 2
+    centers_y = (bounds[:, 1] + bounds[:, 3]) / 2
+    tiles_per_side = math.ceil(math.sqrt(n_shards))
+    tile_x = _get_tile_index(centers_x, tiles_per_side)
+    tile_y = _get_tile_index(centers_y, tiles_per_side)
+    # Snake through rows so consecutive tiles are neighbours.
+    tile_x = np.where(tile_y % 2 == 0, tile_x, tiles_per_side - 1 - tile_x)
+    order = np.lexsort((centers_x, tile_x, tile_y))
+
+    tree_to = shapely.STRtree(shapes_to)
+    shards = []
+    for shard_index in np.array_split(order, n_shards):
+        if len(shard_index) == 0:
+            continue
+        shard_bounds = shapely.box(*shapely.total_bounds(shapes_from[shard_index]))
+        shard_index_to = np.sort(tree_to.query(shard_bounds))
+        if len(shard_index_to) == 0:
+            continue
+        shards.append((geometry_from[shard_index], geometry_to[shard_index_to]))
+
+    return shards
+
+
+def _get_tile_index(values: np.ndarray, tiles_per_side: int) -> np.ndarray:
+    """Bucket values into `tiles_per_side` equal width tiles."""
+    value_min, value_max = values.min(), values.max()
+    if value_max == value_min:
+        return np.zeros(len(values), dtype=np.int64)
+    tile_index = np.floor((values - value_min) / (value_max - value_min) * tiles_per_side).astype(np.int64)
+    tile_index = np.clip(tile_index, 0, tiles_per_side - 1)
+    return tile_index
+
+
 def _get_intersection_area(
     geometry_from: st.GeoDataFrame,
     geometry_to: st.GeoDataFrame,
@@ -217,65 +970,160 @@ def _get_intersection_area(
     return intersection_area
 
 
-def _get_remaining_area(
-    region_id: str,
-    geometry: st.GeoDataFrame,
-    intersection_area: pl.DataFrame,
+def _get_intersection_area_strtree(
+    geometry_from: st.GeoDataFrame,
+    geometry_to: st.GeoDataFrame,
+    *,
+    batch_size: int = STRTREE_BATCH_SIZE,
 ) -> pl.DataFrame:
-    """Find remaining area which hasn't been assigned to another region.
+    """Find intersection area between two geometries using a spatial index.
+
+    Candidate pairs are bulk queried from an `STRtree` built on `geometry_to`, then only those pairs are intersected
+    in vectorized batches of `batch_size`. Only the area is kept, the intersection polygons are discarded per batch.
 
     Returns
     -------
-    pl.DataFrame, e.g.
+    pl.DataFrame, same as `_get_intersection_area`.
     ```python
-    shape: (4, 3)
+    shape: (8, 3)
     ┌──────────┬──────────┬───────────────────┐
     │ quadrant ┆ triangle ┆ intersection_area │
     │ ---      ┆ ---      ┆ ---               │
     │ str      ┆ str      ┆ f64               │
     ╞══════════╪══════════╪═══════════════════╡
-    │ null     ┆ A        ┆ 2.0               │
-    │ O        ┆ null     ┆ 1.0               │
-    │ N        ┆ null     ┆ 1.0               │
-    │ P        ┆ null     ┆ 1.0               │
-    │ M        ┆ null     ┆ 1.0               │
+    │ M        ┆ A        ┆ 4.0               │
+    │ M        ┆ B        ┆ 12.0              │
+    │ …        ┆ …        ┆ …                 │
+    │ P        ┆ C        ┆ 4.0               │
     └──────────┴──────────┴───────────────────┘
     ```
     """
-    alt_region_id = list(set(intersection_area.columns) - {region_id, "intersection_area"})[0]
+    region_id_from = list(set(geometry_from.columns) - {"geometry"})[0]
+    region_id_to = list(set(geometry_to.columns) - {"geometry"})[0]
 
-    intersected_area = intersection_area.group_by(region_id).agg(
-        pl.col("intersection_area").sum().alias("intersected_area")
-    )
-    total_area = geometry.select(
-        region_id,
-        st.geom("geometry").st.area().alias("total_area"),
-        pl.lit(None).cast(intersection_area[alt_region_id].dtype).alias(alt_region_id),
-    )
-    remaining_area = (
-        total_area.join(
-            intersected_area,
-            on=region_id,
-            how="full",
-            coalesce=True,
-        )
-        .with_columns(
-            pl.col("total_area")
-            .sub(pl.col("intersected_area").fill_null(0))
-            .clip(lower_bound=0)
-            .alias("intersection_area"),
+    shapes_from = to_shapely(geometry_from)
+    shapes_to = to_shapely(geometry_to)
+
+    index_from, index_to = shapely.STRtree(shapes_to).query(shapes_from, predicate="intersects")
+    areas = _get_pairwise_intersection_area(shapes_from, shapes_to, index_from, index_to, batch_size=batch_size)
+
+    intersection_area = (
+        pl.DataFrame(
+            {
+                region_id_from: geometry_from[region_id_from].gather(index_from),
+                region_id_to: geometry_to[region_id_to].gather(index_to),
+                "intersection_area": areas,
+            }
         )
-        .select(intersection_area.columns)
+        # Touching geometries are candidates but have no area, `overlay` drops these too.
+        .filter(pl.col("intersection_area") > 0)
     )
-    return remaining_area
+
+    return intersection_area
+
+
+def _get_pairwise_intersection_area(
+    shapes_from: np.ndarray,
+    shapes_to: np.ndarray,
+    index_from: np.ndarray,
+    index_to: np.ndarray,
+    *,
+    batch_size: int = STRTREE_BATCH_SIZE,
+) -> np.ndarray:
+    """Find the intersection area of `shapes_from[index_from]` and `shapes_to[index_to]` in batches."""
+    areas = np.empty(len(index_from), dtype=np.float64)
+    for start in range(0, len(index_from), batch_size):
+        end = start + batch_size
+        # FIXME: use non geographic CRS, issue #55
+        areas[start:end] = shapely.area(
+            shapely.intersection(shapes_from[index_from[start:end]], shapes_to[index_to[start:end]])
+        )
+    return areas
 
 
 def _create_centroid_distance_mapping(
     geometry_from: st.GeoDataFrame,
     geometry_to: st.GeoDataFrame,
+    *,
+    neighbours: int = CENTROID_DISTANCE_NEIGHBOURS,
 ) -> pl.DataFrame:
-    """Create mapping from one region to another based on centroid distance."""
-    raise NotImplementedError("This method is not implemented yet.")
+    """Create mapping from one region to another based on centroid distance.
+
+    Each region is paired with its `neighbours` nearest regions on the other side, found with a KD-tree on the
+    centroids. Pairs are found in both directions so every region has at least one pair whichever way the mapping is
+    used. The mapping is the inverse distance between centroids in km, so closer regions get more of the data.
+
+    Returns
+    -------
+    pl.DataFrame, same schema as `_create_intersection_area_mapping`, without unassigned rows. E.g.
+    ```
+    >>> _create_centroid_distance_mapping(region.square.geometry, region.l_and_r.geometry)
+    shape: (2, 3)
+    ┌────────┬─────────┬──────────┐
+    │ square ┆ l_and_r ┆ mapping  │
+    │ ---    ┆ ---     ┆ ---      │
+    │ str    ┆ str     ┆ f64      │
+    ╞════════╪═════════╪══════════╡
+    │ main   ┆ L       ┆ 0.004497 │
+    │ main   ┆ R       ┆ 0.004497 │
+    └────────┴─────────┴──────────┘
+    ```
+    """
+    region_id_from = list(set(geometry_from.columns) - {"geometry"})[0]
+    region_id_to = list(set(geometry_to.columns) - {"geometry"})[0]
+
+    logging.info("Finding nearest centroids.")
+    points_from = _get_centroid_points(geometry_from)
+    points_to = _get_centroid_points(geometry_to)
+
+    index_from_forward, index_to_forward, distance_forward = _get_nearest(points_from, points_to, k=neighbours)
+    index_to_backward, index_from_backward, distance_backward = _get_nearest(points_to, points_from, k=neighbours)
+
+    nearest = pl.DataFrame(
+        {
+            "index_from": np.concatenate([index_from_forward, index_from_backward]),
+            "index_to": np.concatenate([index_to_forward, index_to_backward]),
+            "distance": np.concatenate([distance_forward, distance_backward]),
+        }
+    ).unique(["index_from", "index_to"], keep="first", maintain_order=True)
+
+    centroid_distance_mapping = pl.DataFrame(
+        {
+            region_id_from: geometry_from[region_id_from].gather(nearest["index_from"]),
+            region_id_to: geometry_to[region_id_to].gather(nearest["index_to"]),
+            "mapping": 1 / np.maximum(nearest["distance"].to_numpy(), MIN_CENTROID_DISTANCE_KM),
+        }
+    )
+    return centroid_distance_mapping
+
+
+def _get_centroid_points(geometry: st.GeoDataFrame) -> np.ndarray:
+    """Centroids of each geometry as 3d points in km on a sphere, so straight line distances work nationally.
+
+    Geometries are in `COORDINATE_REFERENCE_SYSTEM` longitude and latitude.
+    """
+    centroids = shapely.centroid(to_shapely(geometry))
+    longitude = np.radians(shapely.get_x(centroids))
+    latitude = np.radians(shapely.get_y(centroids))
+
+    points = EARTH_RADIUS_KM * np.column_stack(
+        [np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude), np.sin(latitude)]
+    )
+    return points
+
+
+def _get_nearest(points_query: np.ndarray, points_tree: np.ndarray, *, k: int) -> tuple[np.ndarray, ...]:
+    """Find the `k` nearest `points_tree` to each of `points_query`.
+
+    Returns
+    -------
+    tuple[np.ndarray, ...], flat arrays of query index, tree index and distance for each pair.
+    """
+    k = min(k, len(points_tree))
+    distance, index_tree = cKDTree(points_tree).query(points_query, k=k)
+
+    index_query = np.repeat(np.arange(len(points_query)), k)
+    return index_query, np.reshape(index_tree, -1), np.reshape(distance, -1)
 
 
 def _get_region_mapping_file(
@@ -304,3 +1152,51 @@ def _get_region_mapping_file(
         region_b=regions[1],
     )
     return mapping_file
+
+
+def scan_region_mapping(
+    region_from: RegionABC,
+    region_to: RegionABC,
+    *,
+    mapping_method: MAPPING_OPTIONS,
+) -> pl.LazyFrame:
+    """Lazily scan a stored mapping file, so filters on region ids only read the row groups they need.
+
+    Refer to `_write_region_mapping` for the file layout, e.g. to get the mapping of a few `SA1_2021` regions:
+    ```python
+    >>> scan_region_mapping(SA1_2021, Federal2022, mapping_method="intersection_area").filter(
+    ...     pl.col(SA1_2021.id).is_in(sa1_ids)
+    ... ).collect()
+    ```
+
+    Returns
+    -------
+    pl.LazyFrame, same columns as `get_region_mapping_base`.
+    """
+    mapping_file = _get_region_mapping_file(region_from, region_to, mapping=mapping_method)
+    if not os.path.exists(mapping_file):
+        raise FileNotFoundError(
+            f"Mapping file not found for `{region_from.id}` -> `{region_to.id}` under mapping `{mapping_method}`."
+        )
+    return _scan_region_mapping_file(mapping_file)
+
+
+def _write_region_mapping(region_mapping: pl.DataFrame, mapping_file: str, /, *, sort_by: list[str]) -> None:
+    """Write a mapping file in the compact stored layout.
+
+    - Rows are sorted by the region ids in `sort_by`, with residual (null) rows last, and written in row groups of
+        `MAPPING_ROW_GROUP_SIZE` with min/max statistics so filters on the first region skip most row groups.
+    - Region ids keep their type, parquet dictionary encodes repeated ids. Casting them to `pl.Categorical` is
+        avoided as the statistics would no longer follow the sort order.
+    - Mapping weights are stored as float32. Each weight has a relative rounding error of at most 2^-24 (~6e-8),
+        so ratios found from them are within ~1.2e-7 relative of the float64 ratios.
+    """
+    create_path(mapping_file)
+    region_mapping.sort(sort_by, nulls_last=True).with_columns(pl.col("mapping").cast(pl.Float32)).write_parquet(
+        mapping_file, row_group_size=MAPPING_ROW_GROUP_SIZE, statistics=True
+    )
+
+
+def _scan_region_mapping_file(mapping_file: str, /) -> pl.LazyFrame:
+    """Scan a mapping file, casting the weights back to float64 for redistribution."""
+    return pl.scan_parquet(mapping_file).with_columns(pl.col("mapping").cast(pl.Float64))
@@ -0,0 +1,278 @@
+import argparse
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+import polars as pl
+
+from .. import SA1_2021, SA2_2021, Federal2022
+from ..region_abc import RegionABC
+from .cache import clear_region_pair_caches
+from .catalog import get_stale_reasons, record_catalog_entry
+from .mapping import _get_nesting, _get_region_mapping_file, _write_region_mapping, get_region_mapping_base
+from .utils import MAPPING_OPTIONS
+
+PRECOMPUTE_REGIONS: list[RegionABC] = [SA1_2021, SA2_2021, Federal2022]
+
+
+def precompute_mappings(
+    regions: list[RegionABC] | None = None,
+    *,
+    mapping_method: MAPPING_OPTIONS = "intersection_area",
+    workers: int | None = None,
+    force_new: bool = False,
+    derive: bool = True,
+) -> pl.DataFrame:
+    """Build and save the full geometry mapping of every pair of regions.
+
+    Pairs are built as a DAG, refer to `_plan_mappings`. With `derive = True`, an `intersection_area` mapping between
+    a parent region and another region is summed up from the stored mapping of its child region instead of another
+    overlay, refer to `_create_derived_intersection_area_mapping`.
+
+    The mapping catalog is the checkpoint: pairs whose stored mapping is up to date are skipped, so rerunning after
+    a crash only builds the remaining pairs.
+
+    Parameters
+    ----------
+    regions: list[RegionABC] | None = None, regions to map between, every pair is built. Defaults to
+        `PRECOMPUTE_REGIONS`.
+    mapping_method: Literal["intersection_area", "centroid_distance"], mapping method, refer to `redistribute`.
+    workers: int | None = None, number of processes building pairs at once, None or 1 runs serially.
+    force_new: bool = False, rebuild every pair, even if its stored mapping is up to date.
+    derive: bool = True, derive mappings from child regions where possible.
+
+    Returns
+    -------
+    pl.DataFrame, how each pair was built and how long it took.
+    E.g.
+    ```
+    >>> precompute_mappings([region.square, region.quadrant, region.triangle])
+    shape: (3, 4)
+    ┌──────────┬──────────┬───────────────────┬─────────┐
+    │ region_a ┆ region_b ┆ path              ┆ seconds │
+    │ ---      ┆ ---      ┆ ---               ┆ ---     │
+    │ str      ┆ str      ┆ str               ┆ f64     │
+    ╞══════════╪══════════╪═══════════════════╪═════════╡
+    │ quadrant ┆ square   ┆ nested            ┆ 0.012   │
+    │ quadrant ┆ triangle ┆ overlay           ┆ 0.051   │
+    │ square   ┆ triangle ┆ derived_quadrant  ┆ 0.004   │
+    └──────────┴──────────┴───────────────────┴─────────┘
+    ```
+    """
+    regions = PRECOMPUTE_REGIONS if regions is None else regions
+    plan = _plan_mappings(regions, mapping_method=mapping_method, derive=derive)
+
+    timings = []
+    pairs_done = set()
+    for pair in plan:
+        if (not force_new) and _is_mapping_up_to_date(*pair, mapping_method=mapping_method):
+            logging.info(f"Skipping `{pair[0].id}` <-> `{pair[1].id}`, mapping is up to date.")
+            timings.append(_get_timing(*pair, path="existing", seconds=0.0))
+            pairs_done.add(pair)
+
+    pairs_todo = {pair: region_via for pair, region_via in plan.items() if pair not in pairs_done}
+    if (workers is None) or (workers <= 1):
+        for pair, region_via in pairs_todo.items():
+            path, seconds = _precompute_pair(*pair, region_via=region_via, mapping_method=mapping_method)
+            timings.append(_get_timing(*pair, path=path, seconds=seconds))
+    else:
+        timings.extend(_precompute_pairs_parallel(pairs_todo, mapping_method=mapping_method, workers=workers))
+
+    timings = pl.DataFrame(
+        timings, schema={"region_a": pl.String, "region_b": pl.String, "path": pl.String, "seconds": pl.Float64}
+    )
+    return timings.sort("region_a", "region_b")
+
+
+def _plan_mappings(
+    regions: list[RegionABC],
+    *,
+    mapping_method: MAPPING_OPTIONS,
+    derive: bool,
+) -> dict[tuple[RegionABC, RegionABC], RegionABC | None]:
+    """Plan how to build the mapping of each pair of regions.
+
+    Returns
+    -------
+    dict[tuple[RegionABC, RegionABC], RegionABC | None], `region_via` for each pair, ordered so every pair comes
+    after the pair it is derived from. A pair `(parent, other)` is derived through a child of `parent` in `regions`,
+    i.e. from the pair `(child, other)`. Pairs which aren't derived have `region_via = None`.
+    """
+    pairs = [tuple(sorted(pair, key=lambda region_: region_.id)) for pair in itertools.combinations(regions, 2)]
+    region_vias = dict.fromkeys(pairs)
+    if derive and (mapping_method == "intersection_area"):
+        for pair in pairs:
+            region_vias[pair] = _get_region_via(*pair, regions=regions)
+
+    plan = {}
+
+    def add_pair(pair: tuple[RegionABC, RegionABC]) -> None:
+        if pair in plan:
+            return
+        region_via = region_vias[pair]
+        if region_via is not None:
+            add_pair(_get_derived_from(*pair, region_via=region_via))
+        plan[pair] = region_via
+
+    for pair in pairs:
+        add_pair(pair)
+    return plan
+
+
+def _get_region_via(region_a: RegionABC, region_b: RegionABC, *, regions: list[RegionABC]) -> RegionABC | None:
+    """Child region of `region_a` or `region_b` to derive their mapping through, None if there isn't one."""
+    if _get_nesting(region_a, region_b) is not None:
+        return None
+    for region_parent, region_other in ((region_a, region_b), (region_b, region_a)):
+        for region_ in regions:
+            if (region_ is not region_other) and (_get_nesting(region_, region_parent) == (region_, region_parent)):
+                return region_
+    return None
+
+
+def _get_derived_from(region_a: RegionABC, region_b: RegionABC, *, region_via: RegionABC) -> tuple[RegionABC, ...]:
+    """Pair the mapping of `region_a` and `region_b` is derived from, `region_via` replacing its parent."""
+    region_other = region_b if _get_nesting(region_via, region_a) is not None else region_a
+    return tuple(sorted((region_via, region_other), key=lambda region_: region_.id))
+
+
+def _precompute_pairs_parallel(
+    pairs_todo: dict[tuple[RegionABC, RegionABC], RegionABC | None],
+    *,
+    mapping_method: MAPPING_OPTIONS,
+    workers: int,
+) -> list[dict]:
+    """Build pairs in a process pool, each pair starting once the pair it is derived from is saved."""
+    timings = []
+    pairs_waiting = dict(pairs_todo)
+    futures: dict[Future, tuple[RegionABC, RegionABC]] = {}
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+        while pairs_waiting or futures:
+            pairs_running = set(futures.values())
+            for pair, region_via in list(pairs_waiting.items()):
+                if region_via is not None:
+                    derived_from = _get_derived_from(*pair, region_via=region_via)
+                    if (derived_from in pairs_waiting) or (derived_from in pairs_running):
+                        continue
+                future = executor.submit(_precompute_pair, *pair, region_via=region_via, mapping_method=mapping_method)
+                futures[future] = pair
+                del pairs_waiting[pair]
+
+            futures_done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in futures_done:
+                pair = futures.pop(future)
+                path, seconds = future.result()
+                timings.append(_get_timing(*pair, path=path, seconds=seconds))
+
+    return timings
+
+
+def _precompute_pair(
+    region_a: RegionABC,
+    region_b: RegionABC,
+    *,
+    region_via: RegionABC | None,
+    mapping_method: MAPPING_OPTIONS,
+) -> tuple[str, float]:
+    """Build and save the mapping of one pair of regions.
+
+    Returns
+    -------
+    tuple[str, float], how the mapping was built and how long it took in seconds.
+    """
+    logging.info(f"Building `{region_a.id}` <-> `{region_b.id}`.")
+    build_start = time.perf_counter()
+
+    if region_via is None:
+        get_region_mapping_base(
+            region_a,
+            region_b,
+            mapping_method=mapping_method,
+            redistribute_with_full=True,
+            save_data=True,
+            force_new=True,
+        )
+        path = "nested" if (mapping_method == "intersection_area") and _get_nesting(region_a, region_b) else "overlay"
+    else:
+        region_mapping = _create_derived_intersection_area_mapping(region_a, region_b, region_via=region_via)
+        mapping_file = _get_region_mapping_file(region_a, region_b, mapping=mapping_method)
+        _write_region_mapping(region_mapping, mapping_file, sort_by=[region_a.id, region_b.id])
+        record_catalog_entry(
+            mapping_file,
+            mapping=mapping_method,
+            regions=[region_a, region_b],
+            redistribute_with_full=True,
+            region_mapping=region_mapping,
+            build_seconds=time.perf_counter() - build_start,
+        )
+        clear_region_pair_caches(region_a, region_b)
+        path = f"derived_{region_via.id}"
+
+    seconds = time.perf_counter() - build_start
+    logging.info(f"Built `{region_a.id}` <-> `{region_b.id}` ({path}) in {seconds:.1f}s.")
+    return path, seconds
+
+
+def _create_derived_intersection_area_mapping(
+    region_a: RegionABC,
+    region_b: RegionABC,
+    *,
+    region_via: RegionABC,
+) -> pl.DataFrame:
+    """Sum the stored `intersection_area` mapping of `region_via` up to its parent, one of `region_a` or `region_b`.
+
+    As the child regions tile their parent, the intersection area of a parent and another region is the sum of the
+    intersection areas of its children, so no geometry is touched.
+    """
+    region_parent, region_other = (
+        (region_a, region_b) if _get_nesting(region_via, region_a) is not None else (region_b, region_a)
+    )
+    mapping_via_other = get_region_mapping_base(region_via, region_other, mapping_method="intersection_area")
+
+    region_mapping = (
+        mapping_via_other.with_columns(
+            pl.when(pl.col(region_via.id).is_not_null())
+            .then(region_via.parent_regions[region_parent.id])
+            .alias(region_parent.id)
+        )
+        .group_by(region_parent.id, region_other.id)
+        .agg(pl.col("mapping").sum())
+    )
+    return region_mapping
+
+
+def _is_mapping_up_to_date(region_a: RegionABC, region_b: RegionABC, *, mapping_method: MAPPING_OPTIONS) -> bool:
+    """Whether the pair has a stored mapping which isn't stale."""
+    mapping_file = _get_region_mapping_file(region_a, region_b, mapping=mapping_method)
+    return os.path.exists(mapping_file) and not get_stale_reasons(mapping_file, regions=[region_a, region_b])
+
+
+def _get_timing(region_a: RegionABC, region_b: RegionABC, *, path: str, seconds: float) -> dict:
+    """Row of the timings returned by `precompute_mappings`."""
+    return {"region_a": region_a.id, "region_b": region_b.id, "path": path, "seconds": round(seconds, 3)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and save the mapping of every pair of regions.")
+    parser.add_argument("--regions", nargs="+", help="Region ids to map between, defaults to every region.")
+    parser.add_argument("--mapping-method", default="intersection_area")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force-new", action="store_true")
+    parser.add_argument("--no-derive", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    regions_by_id = {region_.id: region_ for region_ in PRECOMPUTE_REGIONS}
+    timings = precompute_mappings(
+        None if args.regions is None else [regions_by_id[region_id] for region_id in args.regions],
+        mapping_method=args.mapping_method,
+        workers=args.workers,
+        force_new=args.force_new,
+        derive=not args.no_derive,
+    )
+    with pl.Config(tbl_rows=-1):
+        print(timings)
@@ -1,60 +1,113 @@
-from logging import warning
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from logging import info, warning
 from typing import Literal
 
 import polars as pl
+from cachetools import cached
 from polars.exceptions import ColumnNotFoundError
+from scipy import sparse
 
 from ..region_abc import RegionABC
+from .cache import CACHE_LOCK, RATIO_CACHE, ratio_cache_key
+from .compose import compose_region_mapping
 from .mapping import get_region_mapping_base
-from .utils import AGGREGATION_OPTIONS, MAPPING_OPTIONS, WEIGHT_OPTIONS
+from .utils import (
+    AGGREGATION_OPTIONS,
+    BACKEND_OPTIONS,
+    FULL_GEOMETRY_OPTIONS,
+    MAPPING_OPTIONS,
+    PRECISION_OPTIONS,
+    VALIDATE_OPTIONS,
+    WEIGHT_OPTIONS,
+    WeightMetric,
+)
+from .weights import get_weights
 
 DEFAULT_RATIO_TOLERANCE = 0.0001
+VALIDATE_SAMPLE_COLUMNS = 16
+PRECISION_DTYPES: dict[str, pl.DataType] = {"float64": pl.Float64, "float32": pl.Float32}
 
 
 def redistribute(
-    data_by_from: pl.DataFrame,
+    data_by_from: pl.DataFrame | pl.LazyFrame,
     *,
     region_from: RegionABC,
     region_to: RegionABC,
     index_columns: list[str] | None = None,
-    region_via: RegionABC | None = None,
-    weights: WEIGHT_OPTIONS | None = None,
+    region_via: RegionABC | list[RegionABC] | None = None,
+    weights: WEIGHT_OPTIONS | WeightMetric | None = None,
     mapping: MAPPING_OPTIONS | pl.DataFrame = "intersection_area",
     aggregation: AGGREGATION_OPTIONS = "sum",
-    redistribute_with_full: bool | None = None,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
     errors: Literal["raise", "warning"] = "raise",
-) -> pl.DataFrame:
+    validate: VALIDATE_OPTIONS = "full",
+    backend: BACKEND_OPTIONS = "polars",
+    precision: PRECISION_OPTIONS = "float64",
+) -> pl.DataFrame | pl.LazyFrame:
     """Redistribute data from one region to another.
 
+    The mapping join through to the aggregation, and the validation of the totals, are a single lazy plan.
+    - pl.DataFrame input: the plan is collected along with the totals of `data_by_from` and a DataFrame returned.
+    - pl.LazyFrame input: nothing is run, the plan is returned as a LazyFrame for the caller to collect. The totals
+        of `data_by_from` are summed as it streams into the join and checked once the output is collected, so the
+        input is only read once, refer to `_with_validation`. Failed checks are raised on collect, wrapped by polars
+        in a `ComputeError`.
+    Region ids are encoded to their integer `RegionABC.index` so the join and aggregation are on integers, and only
+    decoded in the output. Custom `mapping` DataFrames may have ids outside of the regions, so are joined on the ids.
+
     Parameters
     ----------
-    data_by_from: pl.DataFrame,
+    data_by_from: pl.DataFrame | pl.LazyFrame,
     index_columns: list[str] | None, Index columns in the input dataframe to keep.
     region_from: RegionABC, From region to redistribute, should be a column in the dataframe.
     region_to: RegionABC, To region to redistribute, Will output data with this column.
-    region_via: RegionABC | None, If given, will convert region_from -> region_via -> region_to. Useful to
-    weights: Literal["population"] | None, weighting to use to redistribute data.
+    region_via: RegionABC | list[RegionABC] | None, If given, will convert region_from -> region_via -> region_to,
+        or through each region of a chain in order. The mappings are composed first (refer to
+        `compose_region_mapping`) so the data is only joined and aggregated once, however many hops there are.
+    weights: Literal["population"] | WeightMetric | None, weighting to use to redistribute data.
         - None: redistribute by pure `mapping` as the weight.
         - "population", Will use population as a weight.
+        - WeightMetric: Will use the values of a `Metric` as a weight.
+        Refer to `_get_weighted_ratios`.
     mapping: Literal["intersection_area", "centroid_distance"] | pl.DataFrame, mapping to
         geometrically redistribute data.
         - "intersection_area": Will use the intersection area of each regions.
-        - "centroid_distance": Will use the centroid distance of each regions.
+        - "centroid_distance": Will use the inverse centroid distance to the nearest regions.
         - pl.DataFrame: Will use the custom mapping, with columns `region_from`, `region_to`, and `mapping`.
-    aggregation: Literal["sum", "mean", "count", "max", "min"], mapping to aggregate the redistributed data.
+    aggregation: Literal["sum", "sum_integer", "mean", "count", "max", "min"], mapping to aggregate the
+        redistributed data.
         - "sum": Will take the proportional sum the sub regions.
+        - "sum_integer": Will take the proportional sum, with each count first apportioned to whole numbers by
+            largest remainder, so integer counts stay integers and each row of `data_by_from` is conserved exactly.
+            Needs integer data columns, refer to `_combine_integer`.
         - "mean": Will take the proportional mean of sub regions.
         - "count": Will take the proportional count of sub regions.
         - "max": Will take the absolute max of sub regions.
         - "min": Will take the absolute min of sub regions.
-    redistribute_with_full: bool | None = None,
+    redistribute_with_full: bool | Literal["adaptive"] | None = None,
         - None = only use existing static redistribution map files.
         - False = Will create redistribution maps using simplified geometries for each region.
         - True = Will create redistribution maps using full geometries for each region (EXPENSIVE!).
+        - "adaptive" = Will create redistribution maps using simplified geometries, only intersecting full geometries
+            of regions near a boundary of the other region, refer to `_create_intersection_area_mapping_adaptive`.
     errors: Literal["raise", "warning"] = "raise",
         - "raise": Will raise an error if the redistribution fails.
         - "warning": Will print a warning if the redistribution fails.
-
+    validate: Literal["full", "sample", "off"] = "full", how much to check the data totals are conserved.
+        - "full": Will check every data column.
+        - "sample": Will check up to `VALIDATE_SAMPLE_COLUMNS` data columns spread across them, as bad ratios
+            affect every column, for wide data on hot paths.
+        - "off": Won't check, the returned LazyFrame can then also be sunk, e.g. with `sink_parquet`.
+    backend: Literal["polars", "sparse"] = "polars",
+        - "polars": Will join the ratios onto every data row, multiply each data column then group by.
+        - "sparse": Will do a single sparse matrix multiply, better for many data columns. Only supports `sum`.
+    precision: Literal["float64", "float32"] = "float64", float type the ratios and data are multiplied and
+        aggregated in.
+        - "float64": Will upcast everything to Float64, as will the output data columns be.
+        - "float32": Will keep ratios and data in Float32, halving the memory and bandwidth of wide data. Float data
+            columns keep their input dtype on output, integer columns become Float32. Totals are validated in
+            Float64 so the accumulated error is caught, refer to `get_redistribute_diagnostics`.
 
     Examples
     --------
@@ -127,67 +180,388 @@ def redistribute(
     aggregation_method = aggregation
     index_columns = index_columns or []
 
-    if region_from.id not in data_by_from.columns:
-        raise ValueError(f"From region column `{region_from.id}` not found in data_by_from.")
+    is_lazy = isinstance(data_by_from, pl.LazyFrame)
+    data_by_from = data_by_from.lazy()
+    columns = data_by_from.collect_schema().names()
 
-    if region_from.id == region_to.id:
-        raise ValueError(f"`from` and `to` region cannot be the same. Both were {region_from.id!r}")
+    data_columns = _get_data_columns(columns, region_from=region_from, region_to=region_to, index_columns=index_columns)
 
-    data_columns = list(set(data_by_from.columns) - set(index_columns) - {region_from.id, region_to.id})
-
-    if not data_columns:
-        raise ValueError("No data columns found in data_by_from.")
-
-    if region_via:
-        data_by_through = redistribute(
-            data_by_from,
-            index_columns=index_columns,
-            region_from=region_from,
-            region_to=region_via,
-            weights=weights,
-            mapping=mapping,
-            aggregation=aggregation,
-            redistribute_with_full=redistribute_with_full,
-        )
-        data_by_from = data_by_through
-        region_from = region_via
+    if (region_via is not None) and isinstance(mapping, pl.DataFrame):
+        raise ValueError("A custom `mapping` cannot be used with `region_via`.")
 
     region_ratios = _get_region_to_region_ratio(
         region_from=region_from,
         region_to=region_to,
+        region_via=region_via,
         mapping_method=mapping_method,
         mapping_weights=mapping_weights,
         redistribute_with_full=redistribute_with_full,
     )
 
-    data_distributed = _combine(
-        data_by_from=data_by_from,
+    use_index = not isinstance(mapping, pl.DataFrame)
+    if use_index:
+        region_ratios = _encode_ratios(region_ratios, region_from=region_from, region_to=region_to)
+        data_by_from = data_by_from.with_columns(region_from.encode_ids())
+
+    validate_columns = _get_validate_columns(data_columns, validate=validate)
+    if is_lazy and validate_columns:
+        data_by_from, validate_totals = _with_validation(data_by_from, validate_columns, errors=errors)
+
+    data_by_to = _redistribute_with_ratios(
+        data_by_from,
         region_from=region_from,
-        region_ratios=region_ratios,
-        data_columns=data_columns,
-    )
-    data_by_to = _aggregate(
-        data_distributed=data_distributed,
         region_to=region_to,
+        region_ratios=region_ratios,
         aggregation_method=aggregation_method,
         index_columns=index_columns,
         data_columns=data_columns,
+        backend=backend,
+        precision=precision,
     )
-    _validate(data_by_from, data_by_to, data_columns, errors=errors)
+    if use_index:
+        data_by_to = data_by_to.with_columns(region_to.decode_ids())
+
+    if is_lazy:
+        if validate_columns:
+            data_by_to = data_by_to.map_batches(
+                validate_totals,
+                schema=data_by_to.collect_schema(),
+                predicate_pushdown=False,
+                projection_pushdown=False,
+                slice_pushdown=False,
+            )
+    elif validate_columns:
+        data_by_to, totals_by_from = pl.collect_all(
+            [data_by_to, _get_totals(data_by_from, data_columns=validate_columns)], streaming=True
+        )
+        _validate(totals_by_from, data_by_to, validate_columns, errors=errors)
+    else:
+        data_by_to = data_by_to.collect(streaming=True)
+
+    return data_by_to
+
+
+def redistribute_long(
+    data_by_from: pl.DataFrame | pl.LazyFrame,
+    *,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    value_column: str = "value",
+    category_columns: list[str] | None = None,
+    region_column: str | None = None,
+    **redistribute_kwargs: dict,
+) -> pl.DataFrame | pl.LazyFrame:
+    """Redistribute long format data, e.g. `Metric` data, with a single value column and any number of categories.
+
+    Categories are kept as index columns, so the ratios are joined on and the value multiplied and aggregated once,
+    however many categories there are, instead of pivoting each category into its own data column and back.
+    The output is sorted by region then category.
+
+    Parameters
+    ----------
+    data_by_from: pl.DataFrame | pl.LazyFrame, long format data with columns `region_column`, `category_columns` and
+        `value_column` only.
+    value_column: str = "value", the column to redistribute.
+    category_columns: list[str] | None = None, columns of categories, e.g. `["year", "age"]`.
+    region_column: str | None = None, column of region ids in both the input and output, e.g. `"region_id"`.
+        Defaults to `region_from.id` in the input and `region_to.id` in the output.
+    Refer to `redistribute` for the other parameters.
+
+    Returns
+    -------
+    pl.DataFrame | pl.LazyFrame, redistributed data in long format.
+    E.g.
+    ```python
+    >>> redistribute_long(
+    ...     metric_data, region_from=region.square, region_to=region.l_and_r, region_column="region_id",
+    ...     category_columns=["year"],
+    ... )
+    shape: (4, 3)
+    ┌───────────┬──────┬───────┐
+    │ region_id ┆ year ┆ value │
+    │ ---       ┆ ---  ┆ ---   │
+    │ str       ┆ i32  ┆ f64   │
+    ╞═══════════╪══════╪═══════╡
+    │ L         ┆ 2020 ┆ 5.0   │
+    │ L         ┆ 2021 ┆ 10.0  │
+    │ R         ┆ 2020 ┆ 5.0   │
+    │ R         ┆ 2021 ┆ 10.0  │
+    └───────────┴──────┴───────┘
+    ```
+    """
+    category_columns = category_columns or []
+    region_column_from = region_column or region_from.id
+    region_column_to = region_column or region_to.id
+
+    columns = data_by_from.collect_schema().names()
+    expected_columns = {region_column_from, value_column, *category_columns}
+    if set(columns) != expected_columns:
+        raise ValueError(f"Long format data should only have columns {sorted(expected_columns)}, got {columns}.")
+
+    data_by_to = redistribute(
+        data_by_from.rename({region_column_from: region_from.id}),
+        region_from=region_from,
+        region_to=region_to,
+        index_columns=category_columns,
+        **redistribute_kwargs,
+    )
+    data_by_to = data_by_to.select(pl.col(region_to.id).alias(region_column_to), *category_columns, value_column).sort(
+        region_column_to, *category_columns, nulls_last=True
+    )
+    return data_by_to
+
+
+def redistribute_many(
+    data_by_from: pl.DataFrame | pl.LazyFrame | dict[str, pl.DataFrame | pl.LazyFrame],
+    *,
+    region_from: RegionABC,
+    regions_to: list[RegionABC],
+    index_columns: list[str] | None = None,
+    weights: WEIGHT_OPTIONS | WeightMetric | None = None,
+    mapping: MAPPING_OPTIONS = "intersection_area",
+    aggregation: AGGREGATION_OPTIONS = "sum",
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
+    errors: Literal["raise", "warning"] = "raise",
+    validate: VALIDATE_OPTIONS = "full",
+    backend: BACKEND_OPTIONS = "polars",
+    precision: PRECISION_OPTIONS = "float64",
+    workers: int | None = None,
+) -> dict[str, pl.DataFrame] | dict[str, dict[str, pl.DataFrame]]:
+    """Redistribute one or many dataframes from one region to many regions, sharing work between them.
+
+    Gives the same results as calling `redistribute` for every dataframe and region in `regions_to`, but:
+    - Ratios for each region in `regions_to` are resolved once, before any data is touched, so each mapping is only
+        loaded once, even when shared by several targets.
+    - Each dataframe is collected and its totals (for validation) found once, not once per target.
+    - The `region_from` ids of each dataframe are encoded to their integer index once, refer to `redistribute`.
+    - The redistributions are independent, so are run concurrently on a thread pool, polars releases the GIL.
+
+    Parameters
+    ----------
+    data_by_from: pl.DataFrame | pl.LazyFrame | dict[str, pl.DataFrame | pl.LazyFrame], data to redistribute, or
+        named dataframes to redistribute, each with a `region_from` column.
+    regions_to: list[RegionABC], regions to redistribute to.
+    workers: int | None = None, number of threads running redistributions at once, None uses the executor default.
+    Refer to `redistribute` for the other parameters.
+
+    Returns
+    -------
+    dict[str, pl.DataFrame], redistributed data for each region id in `regions_to`. If `data_by_from` is a dict,
+    each value is a dict of the redistributed dataframes, with the same keys as `data_by_from`.
+    E.g.
+    ```python
+    >>> redistribute_many(data_by_sa1, region_from=SA1_2021, regions_to=[SA2_2021, Federal2022])
+    {"SA2_2021": shape: (2_454, 2) ..., "federal_2022": shape: (152, 2) ...}
+    >>> redistribute_many({"votes": votes, "census": census}, region_from=SA1_2021, regions_to=[SA2_2021])
+    {"SA2_2021": {"votes": shape: (2_454, 3) ..., "census": shape: (2_454, 8) ...}}
+    ```
+    """
+    index_columns = index_columns or []
+    data_by_name = data_by_from if isinstance(data_by_from, dict) else {None: data_by_from}
+
+    region_ids_to = [region_to.id for region_to in regions_to]
+    if len(set(region_ids_to)) != len(region_ids_to):
+        raise ValueError(f"`regions_to` should not repeat regions, got {region_ids_to}.")
+
+    data_columns_by_name = {}
+    for name, data in data_by_name.items():
+        columns = data.collect_schema().names()
+        for region_to in regions_to:
+            data_columns_by_name[name, region_to.id] = _get_data_columns(
+                columns, region_from=region_from, region_to=region_to, index_columns=index_columns
+            )
+
+    region_ratios_by_id = {
+        region_to.id: _get_region_to_region_ratio(
+            region_from=region_from,
+            region_to=region_to,
+            mapping_method=mapping,
+            mapping_weights=weights,
+            redistribute_with_full=redistribute_with_full,
+        ).pipe(_encode_ratios, region_from=region_from, region_to=region_to)
+        for region_to in regions_to
+    }
+
+    data_by_name = dict(zip(data_by_name, pl.collect_all([data.lazy() for data in data_by_name.values()]), strict=True))
+    validate_columns_by_name = {
+        key: _get_validate_columns(data_columns, validate=validate)
+        for key, data_columns in data_columns_by_name.items()
+    }
+    totals_by_name = {
+        name: _get_totals(
+            data,
+            data_columns=sorted(
+                set().union(*(validate_columns_by_name[name, region_id] for region_id in region_ids_to))
+            ),
+        )
+        for name, data in data_by_name.items()
+    }
+    totals_by_name = dict(zip(totals_by_name, pl.collect_all(list(totals_by_name.values())), strict=True))
+    data_by_index = {name: data.with_columns(region_from.encode_ids()) for name, data in data_by_name.items()}
+
+    def redistribute_one(name: str | None, region_to: RegionABC) -> pl.DataFrame:
+        data_columns = data_columns_by_name[name, region_to.id]
+        data_by_to = _redistribute_with_ratios(
+            data_by_index[name].lazy(),
+            region_from=region_from,
+            region_to=region_to,
+            region_ratios=region_ratios_by_id[region_to.id],
+            aggregation_method=aggregation,
+            index_columns=index_columns,
+            data_columns=data_columns,
+            backend=backend,
+            precision=precision,
+        ).with_columns(region_to.decode_ids())
+        data_by_to = data_by_to.collect()
+        validate_columns = validate_columns_by_name[name, region_to.id]
+        if validate_columns:
+            _validate(totals_by_name[name], data_by_to, validate_columns, errors=errors)
+        return data_by_to
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            (region_to.id, name): executor.submit(redistribute_one, name, region_to)
+            for region_to in regions_to
+            for name in data_by_name
+        }
+        results = {}
+        for (region_id_to, name), future in futures.items():
+            if isinstance(data_by_from, dict):
+                results.setdefault(region_id_to, {})[name] = future.result()
+            else:
+                results[region_id_to] = future.result()
+
+    return results
+
+
+def _get_data_columns(
+    columns: list[str],
+    *,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    index_columns: list[str],
+) -> list[str]:
+    """Check the regions and columns of the data to redistribute, returning its data columns."""
+    if region_from.id not in columns:
+        raise ValueError(f"From region column `{region_from.id}` not found in data_by_from.")
+
+    if region_from.id == region_to.id:
+        raise ValueError(f"`from` and `to` region cannot be the same. Both were {region_from.id!r}")
+
+    data_columns = list(set(columns) - set(index_columns) - {region_from.id, region_to.id})
+
+    if not data_columns:
+        raise ValueError("No data columns found in data_by_from.")
+
+    return data_columns
+
+
+def _redistribute_with_ratios(
+    data_by_from: pl.LazyFrame,
+    *,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    region_ratios: pl.DataFrame,
+    aggregation_method: AGGREGATION_OPTIONS,
+    index_columns: list[str],
+    data_columns: list[str],
+    backend: BACKEND_OPTIONS,
+    precision: PRECISION_OPTIONS = "float64",
+) -> pl.LazyFrame:
+    """Lazy plan redistributing the data with the given ratios, using `backend` in `precision`."""
+    if precision not in PRECISION_DTYPES:
+        raise ValueError(f"Unknown precision `{precision}`.")
+    dtype = PRECISION_DTYPES[precision]
+    region_ratios = region_ratios.with_columns(pl.col("ratio").cast(dtype))
+
+    match backend:
+        case "polars":
+            if aggregation_method == "sum_integer":
+                data_distributed = _combine_integer(
+                    data_by_from=data_by_from,
+                    region_from=region_from,
+                    region_to=region_to,
+                    region_ratios=region_ratios,
+                    data_columns=data_columns,
+                )
+            else:
+                data_distributed = _combine(
+                    data_by_from=data_by_from,
+                    region_from=region_from,
+                    region_ratios=region_ratios,
+                    data_columns=data_columns,
+                    dtype=dtype,
+                )
+            data_by_to = _aggregate(
+                data_distributed=data_distributed,
+                region_to=region_to,
+                aggregation_method=aggregation_method,
+                index_columns=index_columns,
+                data_columns=data_columns,
+            )
+        case "sparse":
+            if aggregation_method != "sum":
+                raise NotImplementedError(
+                    f"The sparse backend only supports `sum` aggregation, got `{aggregation_method}`."
+                )
+            schema_from = data_by_from.collect_schema()
+            data_by_to = data_by_from.map_batches(
+                lambda data: _combine_and_aggregate_sparse(
+                    data_by_from=data,
+                    region_from=region_from,
+                    region_to=region_to,
+                    region_ratios=region_ratios,
+                    index_columns=index_columns,
+                    data_columns=data_columns,
+                    dtype=dtype,
+                ),
+                schema=pl.Schema(
+                    {
+                        region_to.id: region_ratios.schema[region_to.id],
+                        **{index_column: schema_from[index_column] for index_column in index_columns},
+                        **dict.fromkeys(data_columns, dtype),
+                    }
+                ),
+                predicate_pushdown=False,
+                projection_pushdown=False,
+                slice_pushdown=False,
+            )
+        case _:
+            raise ValueError(f"Unknown backend `{backend}`.")
+
+    if precision == "float32":
+        schema = data_by_from.collect_schema()
+        data_by_to = data_by_to.with_columns(
+            pl.col(data_column).cast(schema[data_column])
+            for data_column in data_columns
+            if schema[data_column].is_float()
+        )
 
     return data_by_to
 
 
+def _encode_ratios(region_ratios: pl.DataFrame, *, region_from: RegionABC, region_to: RegionABC) -> pl.DataFrame:
+    """Replace the region ids of ratios with their integer index, refer to `RegionABC.encode_ids`."""
+    return region_ratios.with_columns(region_from.encode_ids(), region_to.encode_ids())
+
+
 def _get_region_to_region_ratio(
     *,
     region_from: RegionABC,
     region_to: RegionABC,
     mapping_method: MAPPING_OPTIONS | pl.DataFrame,
-    mapping_weights: WEIGHT_OPTIONS | None,  # noqa: ARG001
-    redistribute_with_full: bool | None = None,
+    mapping_weights: WEIGHT_OPTIONS | WeightMetric | None,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
+    region_via: RegionABC | list[RegionABC] | None = None,
 ) -> pl.DataFrame:
     """Get the ratio of how much to distribute on region to another.
 
+    If `region_via` is given, the `region_from -> region_via -> region_to` mappings (or each hop of a chain of
+    `region_via` regions) are composed into a single `region_from -> region_to` mapping, using a stored composed
+    mapping if one exists.
+
+    Ratios from stored or generated mappings are cached in memory, refer to `cache.py`.
+
     Returns
     -------
     pl.DataFrame, with columns `region_from.id`, `region_to.id` and `ratio`
@@ -209,10 +583,46 @@ def _get_region_to_region_ratio(
     └────────┴──────────┴─────────┘
     ```
     """
-    region_mapping_all: pl.DataFrame
-
     if isinstance(mapping_method, pl.DataFrame):
-        region_mapping_all = mapping_method
+        region_ratios = _get_ratios_from_mapping(
+            mapping_method,
+            region_from=region_from,
+            region_to=region_to,
+            mapping_weights=mapping_weights,
+            redistribute_with_full=redistribute_with_full,
+        )
+    else:
+        region_ratios = _get_region_to_region_ratio_cached(
+            region_from=region_from,
+            region_to=region_to,
+            mapping_method=mapping_method,
+            mapping_weights=mapping_weights,
+            redistribute_with_full=redistribute_with_full,
+            region_via=region_via,
+        )
+
+    return region_ratios
+
+
+@cached(RATIO_CACHE, key=ratio_cache_key, lock=CACHE_LOCK)
+def _get_region_to_region_ratio_cached(
+    *,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    mapping_method: MAPPING_OPTIONS,
+    mapping_weights: WEIGHT_OPTIONS | WeightMetric | None,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
+    region_via: RegionABC | list[RegionABC] | None = None,
+) -> pl.DataFrame:
+    """Cached ratios from a stored or generated mapping, refer to `_get_region_to_region_ratio`."""
+    if region_via is not None:
+        region_mapping_all = compose_region_mapping(
+            region_from=region_from,
+            region_via=region_via,
+            region_to=region_to,
+            mapping_method=mapping_method,
+            redistribute_with_full=redistribute_with_full,
+        )
     else:
         region_mapping_all = get_region_mapping_base(
             region_from=region_from,
@@ -221,29 +631,48 @@ def _get_region_to_region_ratio(
             redistribute_with_full=redistribute_with_full,
         )
 
+    region_ratios = _get_ratios_from_mapping(
+        region_mapping_all,
+        region_from=region_from,
+        region_to=region_to,
+        mapping_weights=mapping_weights,
+        mapping_method=mapping_method,
+        redistribute_with_full=redistribute_with_full,
+    )
+    return region_ratios
+
+
+def _get_ratios_from_mapping(
+    region_mapping_all: pl.DataFrame,
+    *,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    mapping_weights: WEIGHT_OPTIONS | WeightMetric | None,
+    mapping_method: MAPPING_OPTIONS = "intersection_area",
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS = None,
+) -> pl.DataFrame:
+    """Turn a mapping into ratios, optionally weighted.
+
+    `mapping_method` and `redistribute_with_full` are only used to map the weights, refer to `_get_weighted_ratios`.
+    """
     try:
         region_mapping = region_mapping_all.select(region_from.id, region_to.id, "mapping")
     except ColumnNotFoundError:
         raise ColumnNotFoundError(
             f"Mapping should have at least columns `{region_from.id}`, `{region_to.id}`, and "
-            f"`{"mapping"}`, It has {region_mapping_all.columns}"
+            f"`{'mapping'}`, It has {region_mapping_all.columns}"
         ) from None
 
     if mapping_weights is None:
         region_ratios = _distribute(region_mapping, region_id=region_from.id, mapping_column="mapping")
     else:
-        weights_per_region = _get_weights(region_from=region_from, mapping_weights=mapping_weights)
-
-        mapping_with_weights = region_mapping.join(weights_per_region, on=region_from.id)
-
-        mapping_with_distributed_weights = mapping_with_weights.pipe(
-            _distribute, region_id=region_from.id, mapping_column="mapping"
-        ).select(
-            region_from.id, region_to.id, pl.col(mapping_weights).mul(pl.col("ratio")).alias("distributed_weights")
-        )
-
-        region_ratios = _distribute(
-            mapping_with_distributed_weights, region_id=region_to.id, mapping_column="distributed_weights"
+        region_ratios = _get_weighted_ratios(
+            region_mapping,
+            region_from=region_from,
+            region_to=region_to,
+            mapping_weights=mapping_weights,
+            mapping_method=mapping_method,
+            redistribute_with_full=redistribute_with_full,
         )
 
     return region_ratios
@@ -259,41 +688,130 @@ def _distribute(region_ratios: pl.DataFrame, *, region_id: str, mapping_column:
     return region_ratios
 
 
-def _get_weights(*, region_from: RegionABC, mapping_weights: WEIGHT_OPTIONS) -> pl.DataFrame:  # noqa: ARG001
-    """Get data to use as weights for the given region."""
-    match mapping_weights:
-        case "population":
-            raise NotImplementedError("Not implemented yet.")
-        case _:
-            raise ValueError(f"Unknown weight `{mapping_weights}`.")
+def _get_weighted_ratios(
+    region_mapping: pl.DataFrame,
+    *,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    mapping_weights: WEIGHT_OPTIONS | WeightMetric,
+    mapping_method: MAPPING_OPTIONS,
+    redistribute_with_full: FULL_GEOMETRY_OPTIONS,
+) -> pl.DataFrame:
+    """Distribute a mapping by the weight (e.g. population) in each intersection, instead of its area.
+
+    Weights are given for a weight region (e.g. population by SA1, refer to `get_weights`), and are assumed spread
+    evenly within each weight region. So the weight of the intersection of `region_from` and `region_to` is
+    `sum(weight * ratio(weight region -> region_from) * ratio(weight region -> region_to))` over the weight regions,
+    which is exact where the weight region nests in both. `region_from` regions without any weight, e.g. unpopulated
+    ones, fall back to the unweighted mapping so their data isn't lost.
+
+    Returns
+    -------
+    pl.DataFrame, with columns `region_from.id`, `region_to.id` and `ratio`, summing to 1 for each `region_from`.
+    """
+    weight_region, weights = get_weights(mapping_weights)
+
+    intersection_weights = weights.lazy()
+    for region_ in (region_from, region_to):
+        if region_.id == weight_region.id:
+            continue
+        weight_region_ratios = (
+            get_region_mapping_base(
+                weight_region, region_, mapping_method=mapping_method, redistribute_with_full=redistribute_with_full
+            )
+            .filter(pl.col(weight_region.id).is_not_null())
+            .select(weight_region.id, region_.id, "mapping")
+            .pipe(_distribute, region_id=weight_region.id, mapping_column="mapping")
+        )
+        intersection_weights = intersection_weights.join(weight_region_ratios.lazy(), on=weight_region.id).select(
+            pl.exclude("weight", "ratio"), pl.col("weight").mul(pl.col("ratio"))
+        )
+    intersection_weights = intersection_weights.group_by(region_from.id, region_to.id).agg(pl.col("weight").sum())
+
+    weight = pl.col("weight").fill_null(0)
+    region_ratios = (
+        region_mapping.lazy()
+        .join(intersection_weights, on=[region_from.id, region_to.id], how="left", join_nulls=True)
+        .select(
+            region_from.id,
+            region_to.id,
+            pl.when(weight.sum().over(region_from.id) > 0)
+            .then(weight.truediv(weight.sum().over(region_from.id)))
+            .otherwise(pl.col("mapping").truediv(pl.col("mapping").sum().over(region_from.id)))
+            .alias("ratio"),
+        )
+        .collect()
+    )
+    return region_ratios
 
 
 def _combine(
     *,
-    data_by_from: pl.DataFrame,
+    data_by_from: pl.LazyFrame,
     region_from: RegionABC,
     region_ratios: pl.DataFrame,
     data_columns: list[str],
-):
-    """Combines mapping and distributed data."""
-    data_distributed = data_by_from.join(region_ratios, on=region_from.id).select(
+    dtype: pl.DataType = pl.Float64,
+) -> pl.LazyFrame:
+    """Combines mapping and distributed data, multiplying in `dtype`."""
+    data_distributed = data_by_from.join(region_ratios.lazy(), on=region_from.id).select(
         pl.exclude(data_columns),
-        *[pl.col(data_column).mul(pl.col("ratio")) for data_column in data_columns],
+        *[pl.col(data_column).cast(dtype).mul(pl.col("ratio")) for data_column in data_columns],
+    )
+
+    return data_distributed
+
+
+def _combine_integer(
+    *,
+    data_by_from: pl.LazyFrame,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    region_ratios: pl.DataFrame,
+    data_columns: list[str],
+) -> pl.LazyFrame:
+    """Combines mapping and distributed data, apportioning the counts of each row to integers by largest remainder.
+
+    Each row of `data_by_from` is split over its `region_to` rows as `floor(count * ratio)`, then the units left over
+    go one each to the rows with the largest remainders, ties going to the first `region_to`. The ranking is a window
+    over the row, so it is vectorised in the same lazy plan and every row's count is conserved exactly, as long as
+    its ratios sum to 1.
+    E.g. 7 split over ratios `[0.5, 0.3, 0.2]` is `[3.5, 2.1, 1.4]`, floored to `[3, 2, 1]` with 1 unit left over,
+    which goes to the largest remainder giving `[4, 2, 1]`.
+    """
+    schema = data_by_from.collect_schema()
+    non_integer_columns = [data_column for data_column in data_columns if not schema[data_column].is_integer()]
+    if non_integer_columns:
+        raise ValueError(f"Aggregation `sum_integer` needs integer data columns, got {sorted(non_integer_columns)}.")
+
+    def apportion(data_column: str) -> pl.Expr:
+        distributed = pl.col(data_column).mul(pl.col("ratio"))
+        distributed_floor = distributed.floor()
+        units_left = pl.col(data_column).sub(distributed_floor.sum().over("_from_row"))
+        remainder_rank = (
+            pl.struct(distributed.sub(distributed_floor).neg(), region_to.id).rank("ordinal").over("_from_row")
+        )
+        return distributed_floor.add(remainder_rank.le(units_left)).cast(schema[data_column]).alias(data_column)
+
+    data_distributed = (
+        data_by_from.with_row_index("_from_row")
+        .join(region_ratios.lazy(), on=region_from.id)
+        .select(pl.exclude(data_columns), *[apportion(data_column) for data_column in data_columns])
     )
 
     return data_distributed
 
 
 def _aggregate(
-    data_distributed: pl.DataFrame,
+    data_distributed: pl.LazyFrame,
     region_to: RegionABC,
     aggregation_method: AGGREGATION_OPTIONS,
     index_columns: list[str] | None,
     data_columns: list[str],
-) -> pl.DataFrame:
+) -> pl.LazyFrame:
     """Aggregates the fully distributed data to the final region."""
     match aggregation_method:
-        case "sum":
+        case "sum" | "sum_integer":
             aggregation_expressions = [pl.col(data_column).sum() for data_column in data_columns]
         case "mean":
             aggregation_expressions = [pl.col(data_column).mean() for data_column in data_columns]
@@ -310,37 +828,138 @@ def _aggregate(
         case _:
             raise ValueError(f"Unknown aggregation method `{aggregation_method}`.")
 
-    if index_columns:
-        data_by_to = data_distributed.group_by(region_to.id, index_columns).agg(*aggregation_expressions)
-    else:
-        data_by_to = data_distributed.group_by(region_to.id).agg(*aggregation_expressions)
+    data_by_to = data_distributed.group_by(region_to.id, *(index_columns or [])).agg(*aggregation_expressions)
 
     return data_by_to
 
 
-def _validate(
+def _combine_and_aggregate_sparse(
+    *,
     data_by_from: pl.DataFrame,
-    data_by_to: pl.DataFrame,
+    region_from: RegionABC,
+    region_to: RegionABC,
+    region_ratios: pl.DataFrame,
+    index_columns: list[str],
+    data_columns: list[str],
+    dtype: pl.DataType = pl.Float64,
+) -> pl.DataFrame:
+    """Combines and aggregates data with a single sparse-dense matrix multiply.
+
+    Each `(region_from, *index_columns)` group gets a dense row index in the data block and each
+    `(region_to, *index_columns)` group a dense row index in the output. The ratios are only joined onto these keys,
+    never onto the data columns, giving a CSR matrix of shape `(n_output, n_groups)`. The output is then
+    `ratio_matrix @ data_block` for all data columns at once.
+
+    Gives the same result as `_combine` followed by `_aggregate` with `sum`, the matrices are both `dtype`.
+    """
+    data_grouped = (
+        data_by_from.group_by(region_from.id, *index_columns)
+        .agg(pl.col(data_columns).sum())
+        .with_row_index("_from_index")
+    )
+    edges = data_grouped.select("_from_index", region_from.id, *index_columns).join(
+        region_ratios.select(region_from.id, region_to.id, "ratio"), on=region_from.id
+    )
+    output_keys = edges.select(region_to.id, *index_columns).unique(maintain_order=True).with_row_index("_to_index")
+    edges = edges.join(output_keys, on=[region_to.id, *index_columns], join_nulls=True)
+
+    ratio_matrix = sparse.csr_array(
+        (edges["ratio"].to_numpy(), (edges["_to_index"].to_numpy(), edges["_from_index"].to_numpy())),
+        shape=(output_keys.height, data_grouped.height),
+    )
+    data_block = data_grouped.select(pl.col(data_columns).cast(dtype).fill_null(0)).to_numpy()
+
+    data_by_to = output_keys.drop("_to_index").hstack(
+        pl.from_numpy(ratio_matrix @ data_block, schema=data_columns, orient="row")
+    )
+    return data_by_to
+
+
+def get_redistribute_diagnostics(
+    data_by_from: pl.DataFrame | pl.LazyFrame,
+    data_by_to: pl.DataFrame | pl.LazyFrame,
+    *,
+    data_columns: list[str],
+    ratio_tolerance: float = DEFAULT_RATIO_TOLERANCE,
+) -> pl.DataFrame:
+    """Compare the total of each data column before and after redistributing.
+
+    All columns are summed, compared and checked in one lazy query, collected with the streaming engine so
+    LazyFrames are never held in memory whole.
+
+    Returns
+    -------
+    pl.DataFrame, one row per data column with its totals, `ratio` of `to_total` to `from_total`, the
+    `relative_error` of `to_total` and whether it is within `ratio_tolerance`. If `from_total` is zero, `ratio` is
+    `to_total + 1`, i.e. the absolute difference. Totals are summed in Float64, whatever the data dtypes, so the
+    error accumulated by a Float32 redistribution shows up here.
+    E.g.
+    ```python
+    >>> get_redistribute_diagnostics(data_by_from, data_by_to, data_columns=["value", "other"])
+    shape: (2, 6)
+    ┌────────┬────────────┬──────────┬───────┬────────────────┬──────────┐
+    │ column ┆ from_total ┆ to_total ┆ ratio ┆ relative_error ┆ is_valid │
+    │ ---    ┆ ---        ┆ ---      ┆ ---   ┆ ---            ┆ ---      │
+    │ str    ┆ f64        ┆ f64      ┆ f64   ┆ f64            ┆ bool     │
+    ╞════════╪════════════╪══════════╪═══════╪════════════════╪══════════╡
+    │ value  ┆ 600.0      ┆ 600.0    ┆ 1.0   ┆ 0.0            ┆ true     │
+    │ other  ┆ 600.0      ┆ 624.0    ┆ 1.04  ┆ 0.04           ┆ false    │
+    └────────┴────────────┴──────────┴───────┴────────────────┴──────────┘
+    ```
+    """
+    totals_by_from, totals_by_to = (
+        _get_totals(data, data_columns=data_columns).unpivot(variable_name="column", value_name=value_name)
+        for data, value_name in ((data_by_from, "from_total"), (data_by_to, "to_total"))
+    )
+    diagnostics = (
+        pl.concat([totals_by_from, totals_by_to.select("to_total")], how="horizontal")
+        .with_columns(
+            pl.when(pl.col("from_total") != 0)
+            .then(pl.col("to_total").truediv(pl.col("from_total")))
+            .when(pl.col("to_total") != 0)
+            .then(pl.col("to_total").add(1))
+            .otherwise(1.0)
+            .alias("ratio")
+        )
+        .with_columns(pl.col("ratio").sub(1).abs().alias("relative_error"))
+        .with_columns(pl.col("relative_error").le(ratio_tolerance).alias("is_valid"))
+        .collect(streaming=True)
+    )
+    return diagnostics
+
+
+def _validate(
+    data_by_from: pl.DataFrame | pl.LazyFrame,
+    data_by_to: pl.DataFrame | pl.LazyFrame,
     data_columns: list[str],
     errors: Literal["raise", "warning"],
     ratio_tolerance: float = DEFAULT_RATIO_TOLERANCE,
-):
-    """Validate that data_by_from and data_by_to have the same amount of data."""
-    bad_data_transformations = []
-    for data_column in data_columns:
-        from_total = data_by_from[data_column].sum()
-        to_total = data_by_to[data_column].sum()
-        if from_total != 0:
-            ratio = to_total / from_total
-        elif to_total != 0:
-            ratio = to_total + 1  # Attempt to use absolute diff instead of ratio diff.
-            warning(f"Found zero in data for column: {data_column!r}. From: {from_total!r} -> To: {to_total!r}")
-        else:
-            ratio = 1
-        if (ratio > 1 + ratio_tolerance) or (ratio < 1 - ratio_tolerance):
-            bad_data_transformations.append(
-                f"Miss match in data for column: {data_column!r}. From: {from_total!r} -> To: {to_total!r}"
-            )
+) -> pl.DataFrame:
+    """Validate that data_by_from and data_by_to have the same amount of data, refer to `get_redistribute_diagnostics`.
+
+    The largest relative error is logged, to judge whether a reduced `precision` is accurate enough for the data.
+
+    Returns
+    -------
+    pl.DataFrame, diagnostics for each data column.
+    """
+    diagnostics = get_redistribute_diagnostics(
+        data_by_from, data_by_to, data_columns=data_columns, ratio_tolerance=ratio_tolerance
+    )
+
+    worst_column = diagnostics.sort("relative_error", descending=True, nulls_last=True).row(0, named=True)
+    info(f"Max relative error redistributing: {worst_column['relative_error']:.2e} in {worst_column['column']!r}.")
+
+    zero_columns = diagnostics.filter((pl.col("from_total") == 0) & (pl.col("to_total") != 0))
+    if not zero_columns.is_empty():
+        warning(f"Found zero in data for columns: {zero_columns['column'].to_list()!r}.")
+
+    bad_data_transformations = [
+        f"Miss match in data for column: {column!r}. From: {from_total!r} -> To: {to_total!r}"
+        for column, from_total, to_total in diagnostics.filter(~pl.col("is_valid"))
+        .select("column", "from_total", "to_total")
+        .iter_rows()
+    ]
 
     if bad_data_transformations:
         error_message = "Found differences in input and output data while redistributing.\n" + "\n".join(
@@ -351,3 +970,64 @@ def _validate(
             raise ValueError(error_message)
         if errors == "warning":
             warning(error_message)
+
+    return diagnostics
+
+
+def _with_validation(
+    data_by_from: pl.LazyFrame,
+    data_columns: list[str],
+    *,
+    errors: Literal["raise", "warning"],
+) -> tuple[pl.LazyFrame, Callable[[pl.DataFrame], pl.DataFrame]]:
+    """Validate a redistribution inside its own lazy plan, so the input is only read once when it is collected.
+
+    Returns
+    -------
+    tuple[pl.LazyFrame, Callable[[pl.DataFrame], pl.DataFrame]], `data_by_from` passing through a step summing the
+    totals of each batch as it streams into the join, and a function to `map_batches` on the collected output,
+    checking it against those totals with `_validate`. Pushdowns are off for both steps, so filters on the output
+    can't change the totals.
+    """
+    totals_by_batch = [_get_totals(data_by_from.clear(), data_columns=data_columns).collect()]
+
+    def add_totals(data: pl.DataFrame) -> pl.DataFrame:
+        totals_by_batch.append(_get_totals(data, data_columns=data_columns).collect())
+        return data
+
+    def validate_totals(data_by_to: pl.DataFrame) -> pl.DataFrame:
+        totals_by_from = pl.concat(totals_by_batch).sum()
+        del totals_by_batch[1:]
+        _validate(totals_by_from, data_by_to, data_columns, errors=errors)
+        return data_by_to
+
+    data_by_from = data_by_from.map_batches(
+        add_totals,
+        schema=data_by_from.collect_schema(),
+        predicate_pushdown=False,
+        projection_pushdown=False,
+        slice_pushdown=False,
+        streamable=True,
+    )
+    return data_by_from, validate_totals
+
+
+def _get_validate_columns(data_columns: list[str], *, validate: VALIDATE_OPTIONS) -> list[str]:
+    """Data columns to validate for the `validate` policy, a sample is spread evenly over the sorted columns."""
+    match validate:
+        case "full":
+            validate_columns = data_columns
+        case "sample":
+            step = -(-len(data_columns) // VALIDATE_SAMPLE_COLUMNS)
+            validate_columns = sorted(data_columns)[::step]
+        case "off":
+            validate_columns = []
+        case _:
+            raise ValueError(f"Unknown validate `{validate}`.")
+
+    return validate_columns
+
+
+def _get_totals(data: pl.DataFrame | pl.LazyFrame, *, data_columns: list[str]) -> pl.LazyFrame:
+    """Lazy single row of the Float64 total of each data column."""
+    return data.lazy().select(pl.col(data_columns).cast(pl.Float64).sum())
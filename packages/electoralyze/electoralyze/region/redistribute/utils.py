@@ -1,5 +1,31 @@
-from typing import Literal
+from typing import Literal, Protocol
+
+import polars as pl
+
+from ..region_abc import RegionABC
 
 WEIGHT_OPTIONS = Literal["population"]
 MAPPING_OPTIONS = Literal["intersection_area", "centroid_distance"]
-AGGREGATION_OPTIONS = Literal["sum", "mean", "count", "max", "min"]
+AGGREGATION_OPTIONS = Literal["sum", "sum_integer", "mean", "count", "max", "min"]
+INTERSECTION_ENGINE_OPTIONS = Literal["overlay", "strtree"]
+BACKEND_OPTIONS = Literal["polars", "sparse"]
+FULL_GEOMETRY_OPTIONS = bool | Literal["adaptive"] | None
+VALIDATE_OPTIONS = Literal["full", "sample", "off"]
+PRECISION_OPTIONS = Literal["float64", "float32"]
+
+
+class WeightMetric(Protocol):
+    """A `Metric` to use as weights, refer to `weights.py`.
+
+    A protocol as `Metric` imports `redistribute`, so `redistribute` can't import `Metric`.
+    """
+
+    full_name: str
+    allowed_regions: list
+    value_column: str
+
+    def by(self, region: RegionABC) -> pl.DataFrame:
+        """Data for the given region."""
+
+    def get_processed_path(self) -> str:
+        """Path to the processed data."""
@@ -0,0 +1,114 @@
+import logging
+import os
+
+import polars as pl
+from cachetools import cached
+
+from electoralyze.common.constants import ROOT_DIR
+from electoralyze.common.files import create_path
+
+from .. import SA1_2021
+from ..region_abc import RegionABC
+from .cache import CACHE_LOCK, WEIGHT_CACHE, weight_cache_key
+from .utils import WEIGHT_OPTIONS, WeightMetric
+
+WEIGHTS_FILE = "{root_dir}/data/regions/weights/{weights}/{region}.parquet"
+POPULATION_CENSUS_DIR = os.path.join(ROOT_DIR, "data/raw/census/2021/2021 Census GCP All Geographies for AUS/SA1/AUS/")
+POPULATION_CENSUS_FILE = os.path.join(POPULATION_CENSUS_DIR, "2021Census_G01_AUST_SA1.csv")
+POPULATION_REGION = SA1_2021
+
+
+@cached(WEIGHT_CACHE, key=weight_cache_key, lock=CACHE_LOCK)
+def get_weights(mapping_weights: WEIGHT_OPTIONS | WeightMetric, /) -> tuple[RegionABC, pl.DataFrame]:
+    """Get weights to redistribute by, and the region they are given for.
+
+    Weights are small compact tables, one row per region, so are cached in memory by `WEIGHT_CACHE`.
+
+    Parameters
+    ----------
+    mapping_weights: Literal["population"] | WeightMetric, weights to get.
+        - "population": 2021 census population by SA1, refer to `process_population_weights`.
+        - WeightMetric: any `Metric`, its values in its first primary region summed over its categories.
+
+    Returns
+    -------
+    tuple[RegionABC, pl.DataFrame], region the weights are for, and the weights with columns `region.id` and
+    `weight`.
+    E.g.
+    ```python
+    >>> get_weights("population")
+    (SA1_2021, shape: (61_845, 2)
+    ┌─────────────┬────────┐
+    │ SA1_2021    ┆ weight │
+    │ ---         ┆ ---    │
+    │ i64         ┆ f32    │
+    ╞═════════════╪════════╡
+    │ 10102100701 ┆ 319.0  │
+    │ 10102100702 ┆ 238.0  │
+    │ …           ┆ …      │
+    └─────────────┴────────┘)
+    ```
+    """
+    match mapping_weights:
+        case "population":
+            weights_file = _get_weights_file("population", region=POPULATION_REGION)
+            if not os.path.exists(weights_file):
+                process_population_weights()
+            weight_region, weights = POPULATION_REGION, pl.read_parquet(weights_file)
+        case str():
+            raise ValueError(f"Unknown weight `{mapping_weights}`.")
+        case _:
+            weight_region, weights = _get_metric_weights(mapping_weights)
+
+    return weight_region, weights
+
+
+def process_population_weights() -> None:
+    """Process the 2021 census population by SA1 into a compact weight table.
+
+    Reads `Tot_P_P` (total persons) from the census general community profile table G01, unpacked into
+    `POPULATION_CENSUS_DIR`.
+    """
+    if not os.path.exists(POPULATION_CENSUS_FILE):
+        raise FileNotFoundError(
+            f"Census population file not found: {POPULATION_CENSUS_FILE!r}. Unpack the 2021 census GCP datapack for "
+            f"SA1s into {POPULATION_CENSUS_DIR!r}, refer to `SA1_2021_census_raw_data.txt` there."
+        )
+
+    logging.info("Processing population weights from the 2021 census.")
+    weights = (
+        pl.scan_csv(POPULATION_CENSUS_FILE)
+        .select(
+            pl.col("SA1_CODE_2021").cast(pl.Int64).alias(POPULATION_REGION.id),
+            pl.col("Tot_P_P").cast(pl.Float32).alias("weight"),
+        )
+        .sort(POPULATION_REGION.id)
+        .collect()
+    )
+
+    weights_file = _get_weights_file("population", region=POPULATION_REGION)
+    create_path(weights_file)
+    weights.write_parquet(weights_file)
+
+
+def _get_metric_weights(metric: WeightMetric) -> tuple[RegionABC, pl.DataFrame]:
+    """Weights from a metric's first primary region, summed over its categories."""
+    weight_region = next(
+        (metric_region.region for metric_region in metric.allowed_regions if metric_region.is_primary), None
+    )
+    if weight_region is None:
+        raise ValueError(f"Metric `{metric.full_name}` has no primary region to take weights from.")
+
+    weights = (
+        metric.by(weight_region)
+        .group_by("region_id")
+        .agg(pl.col(metric.value_column).sum().cast(pl.Float32).alias("weight"))
+        .rename({"region_id": weight_region.id})
+        .sort(weight_region.id)
+    )
+    return weight_region, weights
+
+
+def _get_weights_file(weights: str, *, region: RegionABC) -> str:
+    """File storing processed weights."""
+    return WEIGHTS_FILE.format(root_dir=region._root_dir, weights=weights, region=region.id)
@@ -1,24 +1,34 @@
+import hashlib
+import logging
 import os
 from abc import ABC, abstractmethod
+from collections.abc import Callable
+from typing import ClassVar
 
 import geopandas as gpd
 import polars as pl
 import polars_st as st
+import pyarrow.parquet as pq
 import pyogrio
+import shapely
 from cachetools import LRUCache, TTLCache, cached
 
 from electoralyze.common.constants import REGION_SIMPLIFY_TOLERANCE, ROOT_DIR
 from electoralyze.common.files import create_path, download_file
 from electoralyze.common.functools import classproperty
-from electoralyze.common.geometry import to_geopandas, to_geopolars
+from electoralyze.common.geometry import to_geopandas, to_geopolars, to_shapely
 
 GEOMETRY_FILE = "{root_dir}/data/regions/{region}/geometry.parquet"
 METADATA_FILE = "{root_dir}/data/regions/{region}/metadata.parquet"
+INDEX_FILE = "{root_dir}/data/regions/{region}/index.parquet"
 _REDISTRIBUTE_FILE = "{root_dir}/data/regions/redistribute/{{mapping}}/{{region_a}}/{{region_b}}.parquet"
+REDISTRIBUTE_CATALOG_FILE = "{root_dir}/data/regions/redistribute/catalog.json"
 
 
 FULL_GEOMETRY_TTL_S = 900
+GEOMETRY_ROW_GROUP_SIZE = 1_000
 BASE_DOWNLOAD_TIMEOUT = 60
+REGION_INDEX_COLUMN = "index"
 
 
 class RegionABC(ABC):
@@ -32,6 +42,7 @@ class RegionABC(ABC):
       - `id`: Give the region an 'id' which will be used as the column name for the ids.
       - `raw_geometry_file`: Returns the path to the raw geometries.
       - `_transform_geometry_raw`: Takes raw geometry and processes it.
+    - Optionally overwrite `parent_regions` if the region nests exactly inside other regions.
     - Refer to the newly created region child class in the `electoralyze/region/__init__.py` file.
 
     Example
@@ -109,6 +120,7 @@ class RegionABC(ABC):
     _root_dir: str = ROOT_DIR
     raw_geometry_url: str
     timeout: int = BASE_DOWNLOAD_TIMEOUT
+    _cache_clear_hooks: ClassVar[list[Callable]] = []
 
     @classproperty
     @abstractmethod
@@ -132,6 +144,23 @@ class RegionABC(ABC):
         name_column = f"{cls.id}_name"
         return name_column
 
+    @classproperty
+    def parent_regions(cls) -> dict[str, pl.Expr]:
+        """Regions this region nests exactly inside, mapping each parent region id to an expression for its id.
+
+        The expressions are evaluated on `cls.metadata`, either deriving the parent id from the id or reading a
+        metadata column. Used to create mappings with a join instead of intersecting geometries.
+
+        Example
+        -------
+        ```python
+        >>> region.SA1_2021.parent_regions
+        {"SA2_2021": pl.col("SA1_2021").floordiv(100)}
+        ```
+        """
+        parent_regions = {}
+        return parent_regions
+
     #### READING #############
     @classproperty
     def geometry(cls) -> st.GeoDataFrame:
@@ -172,8 +201,31 @@ class RegionABC(ABC):
     def _geometry_cached(cls) -> st.GeoDataFrame:
         """Actually reads and caches the data."""
         # geometry_read = pyogrio.read_dataframe(cls.geometry_file)
-        geometry_read = gpd.read_parquet(cls.geometry_file)
-        geometry = geometry_read.pipe(to_geopolars)
+        geometry_read = gpd.read_parquet(cls.geometry_file, columns=[cls.id, "geometry"])
+        geometry = geometry_read.pipe(to_geopolars).sort(cls.id)
+        return geometry
+
+    @classmethod
+    def geometry_in_bbox(cls, bbox: tuple[float, float, float, float], /) -> st.GeoDataFrame:
+        """Read the simplified geometry of regions whose bounding box intersects `(minx, miny, maxx, maxy)`.
+
+        Only the row groups of `cls.geometry_file` which could match are read, using the `bbox` covering column
+        written by `process_raw`. Geometry processed before the covering column existed is filtered in memory.
+
+        Returns
+        -------
+        st.GeoDataFrame, same as `cls.geometry` but only for matching regions.
+        """
+        if "bbox" not in pq.read_schema(cls.geometry_file).names:
+            logging.warning(f"No bbox column in geometry for `{cls.id}`, consider running `process_raw` again.")
+            geometry = cls.geometry
+            is_in_bbox = shapely.intersects(shapely.envelope(to_shapely(geometry)), shapely.box(*bbox))
+            return geometry.filter(pl.Series(is_in_bbox))
+
+        geometry_read = gpd.read_parquet(cls.geometry_file, columns=[cls.id, "geometry"], bbox=bbox)
+        if geometry_read.empty:
+            return cls.geometry.head(0)
+        geometry = geometry_read.pipe(to_geopolars).sort(cls.id)
         return geometry
 
     @classproperty
@@ -217,6 +269,149 @@ class RegionABC(ABC):
         metadata = pl.read_parquet(cls.metadata_file)
         return metadata
 
+    @classproperty
+    def index(cls) -> pl.DataFrame:
+        """Dense integer index of this region, numbering the region ids `0..N-1` in sorted id order.
+
+        Written by `process_raw` to `cls.index_file`, so it is stable for as long as the region ids are. Redistribution
+        works on the index, refer to `encode_ids` and `decode_ids`, so its joins and group bys are on `UInt32` whatever
+        the dtype of the ids.
+
+        Returns
+        -------
+        e.g.
+        ```python
+        >>> region.SA2_2021.index
+        shape: (2_472, 2)
+        ┌───────────┬───────┐
+        │ SA2_2021  ┆ index │
+        │ ---       ┆ ---   │
+        │ i64       ┆ u32   │
+        ╞═══════════╪═══════╡
+        │ 101021007 ┆ 0     │
+        │ 101021008 ┆ 1     │
+        │ 101021009 ┆ 2     │
+        │ …         ┆ …     │
+        │ 901041004 ┆ 2471  │
+        └───────────┴───────┘
+        ```
+        """
+        index = cls._index_cached()
+        return index
+
+    @classmethod
+    @cached(LRUCache(maxsize=32))
+    def _index_cached(cls) -> pl.DataFrame:
+        """Actually reads and caches the index, creating it from the geometry if it was processed without one."""
+        if not os.path.exists(cls.index_file):
+            logging.warning(f"No index file for `{cls.id}`, consider running `process_raw` again.")
+            return cls._create_index(cls.geometry[cls.id])
+        index = pl.read_parquet(cls.index_file)
+        return index
+
+    @classmethod
+    def _create_index(cls, ids: pl.Series, /) -> pl.DataFrame:
+        """Number the unique `ids` in sorted order."""
+        index = (
+            ids.unique().sort().to_frame(cls.id).with_row_index(REGION_INDEX_COLUMN).select(cls.id, REGION_INDEX_COLUMN)
+        )
+        return index
+
+    @classproperty
+    def geometry_hashes(cls) -> pl.DataFrame:
+        """Content hash of each geometry in `cls.geometry`, used to detect changed regions.
+
+        Returns
+        -------
+        e.g.
+        ```python
+        >>> region.SA2_2021.geometry_hashes
+        shape: (2_472, 2)
+        ┌───────────┬─────────────────────────────────┐
+        │ SA2_2021  ┆ geometry_hash                   │
+        │ ---       ┆ ---                             │
+        │ i64       ┆ str                             │
+        ╞═══════════╪═════════════════════════════════╡
+        │ 101021007 ┆ 3b0e2c1d6c4f0d8e1f5a2b7c9d0e4f… │
+        │ …         ┆ …                               │
+        └───────────┴─────────────────────────────────┘
+        ```
+        """
+        geometry_hashes = cls._geometry_hashes_cached(cls._get_geometry_file_version())
+        return geometry_hashes
+
+    @classproperty
+    def geometry_hash(cls) -> str:
+        """Content hash of the whole of `cls.geometry`, combining `cls.geometry_hashes`.
+
+        Cached until `cls.geometry_file` is modified, so checking stored mappings against it is cheap.
+        """
+        geometry_hash = cls._geometry_hash_cached(cls._get_geometry_file_version())
+        return geometry_hash
+
+    @classmethod
+    def get_area(cls, *, full: bool = False) -> pl.DataFrame:
+        """Area of each region, cached so every mapping built from this region reuses it.
+
+        Parameters
+        ----------
+        full: bool = False, use the full raw geometry instead of the simplified `cls.geometry`.
+
+        Returns
+        -------
+        pl.DataFrame, with columns `cls.id` and `total_area`.
+        """
+        area = cls._area_cached(full=full)
+        return area
+
+    @classmethod
+    @cached(LRUCache(maxsize=64))
+    def _area_cached(cls, *, full: bool) -> pl.DataFrame:
+        """Actually finds and caches the areas.
+
+        Full areas are read from the `total_area` column written to `cls.geometry_file` by `process_raw`. Geometry
+        processed before that column existed falls back to the full raw geometry.
+        """
+        if full and ("total_area" in pq.read_schema(cls.geometry_file).names):
+            area = pl.from_arrow(pq.read_table(cls.geometry_file, columns=[cls.id, "total_area"])).sort(cls.id)
+            return area
+
+        if full:
+            logging.warning(f"No total_area column in geometry for `{cls.id}`, consider running `process_raw` again.")
+        geometry = cls.get_raw_geometry() if full else cls.geometry
+        area = geometry.select(cls.id, st.geom("geometry").st.area().alias("total_area"))
+        return area
+
+    @classmethod
+    def _get_geometry_file_version(cls) -> tuple[int, int]:
+        """Modification time and size of `cls.geometry_file`, keying the geometry hash caches."""
+        geometry_file_stat = os.stat(cls.geometry_file)
+        return geometry_file_stat.st_mtime_ns, geometry_file_stat.st_size
+
+    @classmethod
+    @cached(LRUCache(maxsize=32))
+    def _geometry_hash_cached(cls, geometry_file_version: tuple[int, int]) -> str:
+        """Actually combines and caches the hash."""
+        region_hash = hashlib.sha256()
+        for region_id, geometry_hash in cls._geometry_hashes_cached(geometry_file_version).sort(cls.id).iter_rows():
+            region_hash.update(f"{region_id}:{geometry_hash}\n".encode())
+        return region_hash.hexdigest()
+
+    @classmethod
+    @cached(LRUCache(maxsize=32))
+    def _geometry_hashes_cached(cls, geometry_file_version: tuple[int, int]) -> pl.DataFrame:  # noqa: ARG003
+        """Actually hashes and caches the data."""
+        geometry = cls.geometry
+        geometry_hashes = geometry.select(
+            pl.col(cls.id),
+            pl.Series(
+                "geometry_hash",
+                [hashlib.sha256(geometry_wkb).hexdigest() for geometry_wkb in geometry["geometry"]],
+                dtype=pl.String,
+            ),
+        )
+        return geometry_hashes
+
     #### FILES ################
     @classproperty
     @abstractmethod
@@ -236,6 +431,12 @@ class RegionABC(ABC):
         geometry_file = GEOMETRY_FILE.format(root_dir=cls._root_dir, region=cls.id)
         return geometry_file
 
+    @classproperty
+    def index_file(cls) -> str:
+        """Get the path to the index file, refer to `cls.index`."""
+        index_file = INDEX_FILE.format(root_dir=cls._root_dir, region=cls.id)
+        return index_file
+
     @classproperty
     def redistribute_file(cls) -> str:
         """Redistribute file, still needs to be formatted with other variables.
@@ -253,6 +454,12 @@ class RegionABC(ABC):
         redistribute_file = _REDISTRIBUTE_FILE.format(root_dir=cls._root_dir)
         return redistribute_file
 
+    @classproperty
+    def redistribute_catalog_file(cls) -> str:
+        """Catalog of stored redistribute files, refer to `electoralyze/region/redistribute/catalog.py`."""
+        redistribute_catalog_file = REDISTRIBUTE_CATALOG_FILE.format(root_dir=cls._root_dir)
+        return redistribute_catalog_file
+
     #### PROCESSING #########
 
     @classmethod
@@ -266,7 +473,7 @@ class RegionABC(ABC):
 
         Returns
         -------
-        None, updates `cls.geometry` and `cls.metadata`
+        None, updates `cls.geometry`, `cls.metadata` and `cls.index` and clears cached data.
 
         """
         if download or force_new:
@@ -278,20 +485,29 @@ class RegionABC(ABC):
         metadata_raw = cls.get_raw_metadata()
 
         geometry = (
-            geometry_raw.with_columns(st.geom("geometry").st.simplify(REGION_SIMPLIFY_TOLERANCE))
+            geometry_raw.with_columns(
+                st.geom("geometry").st.area().alias("total_area"),
+                st.geom("geometry").st.simplify(REGION_SIMPLIFY_TOLERANCE),
+            )
             .sort(cls.id)
             .pipe(to_geopandas)
         )
+        # Ordering along a Hilbert curve keeps nearby regions in the same row groups for `geometry_in_bbox`.
+        geometry = geometry.iloc[geometry.hilbert_distance().argsort(kind="stable")].reset_index(drop=True)
         metadata = metadata_raw.sort(cls.id)
 
         print("Saving...")
 
         create_path(cls.geometry_file)
-        geometry.to_parquet(cls.geometry_file)
+        geometry.to_parquet(cls.geometry_file, write_covering_bbox=True, row_group_size=GEOMETRY_ROW_GROUP_SIZE)
 
         create_path(cls.metadata_file)
         metadata.write_parquet(cls.metadata_file)
 
+        create_path(cls.index_file)
+        cls._create_index(metadata[cls.id]).write_parquet(cls.index_file)
+        cls.cache_clear()
+
         print("Done!")
 
     @classmethod
@@ -308,6 +524,47 @@ class RegionABC(ABC):
         geometry: gpd.GeoDataFrame = geometry_with_metadata.select(cls.id, "geometry")
         return geometry
 
+    @classmethod
+    def get_raw_geometry_chunk(
+        cls,
+        *,
+        skip_features: int = 0,
+        max_features: int | None = None,
+        bbox: tuple[float, float, float, float] | None = None,
+        mask: shapely.Geometry | None = None,
+    ) -> st.GeoDataFrame:
+        """Get part of the full raw geometry, read straight from the raw file without caching.
+
+        Used to build mappings from full geometry with bounded memory. If `_transform_geometry_raw` unions several
+        raw rows into one id, e.g. `SA2_2021`, only the rows read are unioned, so an id can be split over chunks and
+        callers must combine the parts, refer to `_create_intersection_area_mapping_streaming`.
+
+        Parameters
+        ----------
+        skip_features: int = 0, number of features to skip at the start of the raw file.
+        max_features: int | None = None, maximum number of features to read, None reads to the end.
+        bbox: tuple[float, float, float, float] | None = None, only read features whose bounding box intersects
+            `(minx, miny, maxx, maxy)`.
+        mask: shapely.Geometry | None = None, only read features which intersect `mask`, can't be used with `bbox`.
+
+        Returns
+        -------
+        st.GeoDataFrame, same as `get_raw_geometry` but only for the selected features.
+        """
+        if not os.path.exists(cls.raw_geometry_file):
+            raise FileNotFoundError(f"File not found: {cls.raw_geometry_file!r}")
+
+        geometry_raw_gpd = pyogrio.read_dataframe(
+            cls.raw_geometry_file, skip_features=skip_features, max_features=max_features, bbox=bbox, mask=mask
+        )
+        if geometry_raw_gpd.empty:
+            # Empty reads can't be converted, so take the schema from the first feature instead.
+            return cls.get_raw_geometry_chunk(max_features=1).head(0)
+
+        geometry_with_metadata = cls._transform_geometry_raw(to_geopolars(geometry_raw_gpd))
+        geometry = geometry_with_metadata.select(cls.id, "geometry")
+        return geometry
+
     @classmethod
     def get_raw_metadata(cls) -> pl.DataFrame:
         """Get raw metadata. Loads from raw file. may take a while."""
@@ -393,18 +650,57 @@ class RegionABC(ABC):
         ids = set(cls.metadata[cls.id].unique().to_list())
         return ids
 
+    @classmethod
+    def encode_ids(cls, column: str | None = None, /) -> pl.Expr:
+        """Expression replacing the region ids in `column` with their `cls.index`, ids not in the region become null.
+
+        Example
+        -------
+        `data.with_columns(region.SA1_2021.encode_ids())`
+        """
+        column = column or cls.id
+        index = cls.index
+        return pl.col(column).replace_strict(index[cls.id], index[REGION_INDEX_COLUMN], default=None)
+
+    @classmethod
+    def decode_ids(cls, column: str | None = None, /) -> pl.Expr:
+        """Expression replacing the `cls.index` in `column` with their region ids, the inverse of `encode_ids`."""
+        column = column or cls.id
+        index = cls.index
+        return pl.col(column).replace_strict(index[REGION_INDEX_COLUMN], index[cls.id], default=None)
+
     @classmethod
     def remove_processed_files(cls):
         """Remove processed files."""
-        if os.path.isfile(cls.geometry_file):
-            os.remove(cls.geometry_file)
-        if os.path.isfile(cls.metadata_file):
-            os.remove(cls.metadata_file)
+        for processed_file in (cls.geometry_file, cls.metadata_file, cls.index_file):
+            if os.path.isfile(processed_file):
+                os.remove(processed_file)
         cls.cache_clear()
 
     @classmethod
     def cache_clear(cls):
-        """Clears the cache of class methods where data is cached."""
+        """Clears the cache of class methods where data is cached.
+
+        Also calls every hook from `register_cache_clear_hook` with this region, or with no region if called on a
+        class without an `id`, e.g. `RegionABC.cache_clear()`.
+        """
         cls._geometry_cached.cache_clear()
         cls._metadata_cached.cache_clear()
+        cls._geometry_hashes_cached.cache_clear()
+        cls._geometry_hash_cached.cache_clear()
+        cls._area_cached.cache_clear()
+        cls._index_cached.cache_clear()
         cls._get_geometry_with_metadata.cache_clear()
+
+        regions = () if cls.id is None else (cls,)
+        for cache_clear_hook in RegionABC._cache_clear_hooks:
+            cache_clear_hook(*regions)
+
+    @staticmethod
+    def register_cache_clear_hook(cache_clear_hook: Callable[..., None]) -> None:
+        """Register a function to clear caches built on top of regions, e.g. cached redistribute mappings.
+
+        The hook is called with the regions to clear, or with no regions to clear everything.
+        """
+        if cache_clear_hook not in RegionABC._cache_clear_hooks:
+            RegionABC._cache_clear_hooks.append(cache_clear_hook)
@@ -30,6 +30,12 @@ class SA1_2021(RegionABC):
         id = "SA1_2021"
         return id
 
+    @classproperty
+    def parent_regions(cls) -> dict[str, pl.Expr]:
+        """SA1 codes are the SA2 code followed by two digits."""
+        parent_regions = {"SA2_2021": pl.col(cls.id).floordiv(100)}
+        return parent_regions
+
     @classproperty
     def raw_geometry_file(cls) -> str:
         """Get the path to the raw data shapefile."""
@@ -14,6 +14,7 @@ from electoralyze.common.testing.region_fixture import (
     RegionMocked,
 )
 from electoralyze.region.region_abc import RegionABC
+from polars import testing  # noqa: F401
 
 ## FIXTURES AND FUNCTIONS
 
@@ -257,7 +258,11 @@ def basic_metric_fixture(region: RegionMocked):
             processed_path=f"{temp_dir}/data/my_metric/{{region_id}}.parquet",
             allowed_regions=[
                 MetricRegion(region=region.rectangle, process_raw=_process_raw_test),
-                MetricRegion(region=region.triangle, redistribute_from=region.rectangle),
+                MetricRegion(
+                    region=region.triangle,
+                    redistribute_from=region.rectangle,
+                    redistribute_kwargs={"redistribute_with_full": True},
+                ),
             ],
         )
         yield region, my_metric, temp_dir
@@ -285,15 +290,57 @@ def test_basic_metric_process_raw(basic_metric_fixture: tuple[RegionMocked, Metr
         my_metric.by(region.rectangle)
 
     my_metric.process_raw()
-    my_metric.by(region.rectangle)
+    metric_data = my_metric.by(region.rectangle)
 
-    with pytest.raises(NotImplementedError):
-        my_metric.by(region.triangle)
+    metric_data_redistributed = my_metric.by(region.triangle)
+    pl.testing.assert_frame_equal(
+        metric_data_redistributed.group_by("category").agg(pl.col("value").sum()),
+        metric_data.group_by("category").agg(pl.col("value").sum()),
+        check_row_order=False,
+    )
+    assert set(metric_data_redistributed["region_id"]) <= {"A", "B", "C"}
 
     with pytest.raises(KeyError):
         my_metric.by(region.quadrant)
 
 
+def test_metric_integer_values(region: RegionMocked):
+    """Test integer values are redistributed to integers which still sum to the totals, not truncated."""
+
+    def _process_raw_counts(
+        parent_metric: Metric, region: RegionABC, force_new: bool, download: bool, **_kwargs: dict
+    ) -> pl.DataFrame:
+        return pl.DataFrame(
+            {"region_id": ["main", "main"], "category": [2020, 2021], "value": [7, 10]},
+            schema=parent_metric.schema,
+        )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        count_metric = Metric(
+            name="count",
+            processed_path=f"{temp_dir}/data/count/{{region_id}}.parquet",
+            schema=pl.Schema({"region_id": pl.String, "category": pl.Int32, "value": pl.Int32}),
+            allowed_regions=[
+                MetricRegion(region=region.square, process_raw=_process_raw_counts),
+                MetricRegion(
+                    region=region.quadrant,
+                    redistribute_from=region.square,
+                    redistribute_kwargs={"redistribute_with_full": True},
+                ),
+            ],
+        )
+        count_metric.process_raw()
+        metric_data = count_metric.by(region.quadrant)
+
+    assert metric_data.schema["value"] == pl.Int32
+    pl.testing.assert_frame_equal(
+        metric_data.group_by("category").agg(pl.col("value").sum()),
+        pl.DataFrame({"category": [2020, 2021], "value": [7, 10]}, schema={"category": pl.Int32, "value": pl.Int32}),
+        check_row_order=False,
+    )
+    assert metric_data.filter(category=2020)["value"].sort().to_list() == [1, 2, 2, 2]
+
+
 def test_basic_metric_basic_processed_path(basic_metric_fixture: tuple[RegionMocked, Metric, str]):
     """Test creating a metric works as intended."""
     (
@@ -458,7 +505,11 @@ def sub_metric_fixture(region: RegionMocked) -> tuple[RegionMocked, Metric, Metr
             value_column=POPULATION_NAME,
             allowed_regions=[
                 MetricRegion(region=region.rectangle, process_raw=_process_raw_test),
-                MetricRegion(region=region.triangle, redistribute_from=region.rectangle),
+                MetricRegion(
+                    region=region.triangle,
+                    redistribute_from=region.rectangle,
+                    redistribute_kwargs={"redistribute_with_full": True},
+                ),
             ],
         )
         age_metric = SubMetric(
@@ -466,7 +517,11 @@ def sub_metric_fixture(region: RegionMocked) -> tuple[RegionMocked, Metric, Metr
             value_column=AGE_NAME,
             allowed_regions=[
                 MetricRegion(region=region.square, process_raw=_process_raw_test),
-                MetricRegion(region=region.l_and_r, redistribute_from=region.square),
+                MetricRegion(
+                    region=region.l_and_r,
+                    redistribute_from=region.square,
+                    redistribute_kwargs={"redistribute_with_full": True},
+                ),
             ],
         )
 
@@ -488,16 +543,16 @@ def test_subclassing_metric_process_raw(sub_metric_fixture: tuple[RegionMocked,
         population_metric.by(region.rectangle)
     population_metric.process_raw()
     population_metric.by(region.rectangle)
+    population_metric.by(region.triangle)
 
-    with pytest.raises(NotImplementedError):
-        population_metric.by(region.triangle)
-    with pytest.raises(NotImplementedError):
+    with pytest.raises(FileNotFoundError):
         age_metric.by(region.l_and_r)
 
     with pytest.raises(FileNotFoundError):
         age_metric.by(region.square)
     age_metric.process_raw()
     age_metric.by(region.square)
+    assert age_metric.by(region.l_and_r)["region_id"].to_list() == ["L", "L", "R", "R"]
 
     with pytest.raises(KeyError):
         population_metric.by(region.square)
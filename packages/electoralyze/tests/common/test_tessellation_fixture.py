@@ -0,0 +1,57 @@
+import tempfile
+
+import polars as pl
+import polars_st as st
+import pytest
+from electoralyze.common.testing.tessellation_fixture import (
+    GRID_COARSE_REGION_ID,
+    GRID_FINE_REGION_ID,
+    TESSELLATION_BOUNDS,
+    create_tessellation,
+    create_tessellation_regions,
+)
+from electoralyze.region.redistribute.mapping import _create_intersection_area_mapping, get_region_mapping_base
+from polars import testing  # noqa: F401
+
+BOUNDS_AREA = (TESSELLATION_BOUNDS[2] - TESSELLATION_BOUNDS[0]) * (TESSELLATION_BOUNDS[3] - TESSELLATION_BOUNDS[1])
+
+
+@pytest.mark.parametrize("n_polygons", [100, 1_000])
+@pytest.mark.parametrize("kind", ["grid", "hex", "voronoi"])
+def test_create_tessellation(kind: str, n_polygons: int):
+    """Test tessellations have about the right number of polygons, which cover the bounds without overlapping."""
+    tessellation = create_tessellation(kind, n_polygons, region_id="cell")
+
+    assert tessellation.columns == ["cell", "geometry"]
+    assert tessellation["cell"].to_list() == list(range(len(tessellation)))
+    assert abs(len(tessellation) - n_polygons) / n_polygons < 0.25, "Clipped hexes at the edges add a few polygons."
+    assert tessellation.select(st.geom("geometry").st.area().sum()).item() == pytest.approx(BOUNDS_AREA)
+    assert tessellation.select(st.geom("geometry").st.union_all().st.area()).item() == pytest.approx(BOUNDS_AREA)
+
+
+def test_create_tessellation_regions():
+    """Test tessellation regions process and the fine grid nests exactly in the coarse grid."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tessellation = create_tessellation_regions(temp_dir, n_polygons=400)
+        assert len(tessellation.grid_fine.geometry) == 400
+        assert len(tessellation.grid_coarse.geometry) == 4
+
+        region_mapping = get_region_mapping_base(
+            tessellation.grid_fine,
+            tessellation.grid_coarse,
+            mapping_method="intersection_area",
+            redistribute_with_full=True,
+            verify_nesting=True,
+        )
+        expected = _create_intersection_area_mapping(
+            tessellation.grid_fine.get_raw_geometry(), tessellation.grid_coarse.get_raw_geometry()
+        )
+        pl.testing.assert_frame_equal(
+            region_mapping.select(GRID_FINE_REGION_ID, GRID_COARSE_REGION_ID, "mapping"),
+            expected.select(GRID_FINE_REGION_ID, GRID_COARSE_REGION_ID, "mapping"),
+            check_row_order=False,
+        )
+
+        # Existing raw files are reused.
+        tessellation_again = create_tessellation_regions(temp_dir, n_polygons=400)
+        pl.testing.assert_frame_equal(tessellation_again.voronoi.geometry, tessellation.voronoi.geometry)
@@ -0,0 +1,66 @@
+import tempfile
+
+import polars as pl
+import pytest
+from electoralyze.common.functools import classproperty
+from electoralyze.common.testing.region_fixture import LEFT_RIGHT_REGION_ID, RegionMocked, create_fake_regions
+from electoralyze.region.redistribute.cache import MAPPING_CACHE, RATIO_CACHE, mapping_cache_key
+from electoralyze.region.redistribute.mapping import get_region_mapping_base
+from electoralyze.region.redistribute.redistribute import _get_region_to_region_ratio
+
+
+def test_region_mapping_cache(region: RegionMocked):
+    """Test mappings are cached once for both directions and cleared with the regions."""
+    mapping_kwargs = dict(mapping_method="intersection_area", redistribute_with_full=False)
+    region.triangle.cache_clear()
+
+    mapping_forward = get_region_mapping_base(region.triangle, region.rectangle, **mapping_kwargs)
+    mapping_backward = get_region_mapping_base(region.rectangle, region.triangle, **mapping_kwargs)
+
+    assert mapping_forward is mapping_backward, "Both directions should share one cached mapping."
+    assert mapping_cache_key(region.rectangle, region.triangle, **mapping_kwargs) in MAPPING_CACHE
+
+    region.rectangle.cache_clear()
+    assert mapping_cache_key(region.rectangle, region.triangle, **mapping_kwargs) not in MAPPING_CACHE
+    assert get_region_mapping_base(region.triangle, region.rectangle, **mapping_kwargs) is not mapping_forward
+
+
+def test_region_ratio_cache(region: RegionMocked):
+    """Test ratios are cached per direction and cleared with the regions."""
+    ratio_kwargs = dict(mapping_method="intersection_area", mapping_weights=None, redistribute_with_full=False)
+    region.triangle.cache_clear()
+
+    ratios_forward = _get_region_to_region_ratio(
+        region_from=region.triangle, region_to=region.rectangle, **ratio_kwargs
+    )
+    ratios_backward = _get_region_to_region_ratio(
+        region_from=region.rectangle, region_to=region.triangle, **ratio_kwargs
+    )
+
+    assert ratios_forward is _get_region_to_region_ratio(
+        region_from=region.triangle, region_to=region.rectangle, **ratio_kwargs
+    )
+    assert ratios_forward is not ratios_backward, "Ratios are normalised per direction."
+    assert len(RATIO_CACHE) >= 2
+
+    region._RegionMockedABC.cache_clear()
+    assert len(RATIO_CACHE) == 0
+    assert len(MAPPING_CACHE) == 0
+
+
+def test_region_mapping_cache_verify_nesting():
+    """Test a mapping cached without verifying nesting isn't used when verifying is asked for."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        region = create_fake_regions(temp_dir)
+
+        class WrongQuadrant(region.quadrant):
+            @classproperty
+            def parent_regions(cls) -> dict[str, pl.Expr]:
+                return {LEFT_RIGHT_REGION_ID: pl.col(cls.id).replace_strict({"M": "R", "N": "R", "O": "L", "P": "L"})}
+
+        mapping_kwargs = dict(mapping_method="intersection_area", redistribute_with_full=False)
+        get_region_mapping_base(WrongQuadrant, region.l_and_r, **mapping_kwargs)
+        assert mapping_cache_key(WrongQuadrant, region.l_and_r, **mapping_kwargs) in MAPPING_CACHE
+
+        with pytest.raises(ValueError, match="2 `quadrant` regions do not lie"):
+            get_region_mapping_base(WrongQuadrant, region.l_and_r, **mapping_kwargs, verify_nesting=True)
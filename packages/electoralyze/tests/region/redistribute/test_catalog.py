@@ -0,0 +1,78 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+import pytest
+from electoralyze.common.testing.region_fixture import RegionMocked
+from electoralyze.region.redistribute.catalog import get_catalog_entry, get_stale_reasons, record_catalog_entry
+from electoralyze.region.redistribute.mapping import _get_region_mapping_file, get_region_mapping_base
+from polars import testing  # noqa: F401
+
+
+def test_region_mapping_catalog(region: RegionMocked):
+    """Test saved mappings are recorded in the catalog and stale mappings are flagged or rebuilt."""
+    region_from, region_to = region.triangle, region.l_and_r
+    mapping_file = _get_region_mapping_file(region_from, region_to, mapping="intersection_area")
+    mapping_kwargs = dict(region_from=region_from, region_to=region_to, mapping_method="intersection_area")
+
+    try:
+        region_mapping = get_region_mapping_base(**mapping_kwargs, redistribute_with_full=True, save_data=True)
+
+        catalog_entry = get_catalog_entry(mapping_file, region=region_from)
+        assert catalog_entry["mapping"] == "intersection_area"
+        assert catalog_entry["geometry_hashes"] == {
+            region_from.id: region_from.geometry_hash,
+            region_to.id: region_to.geometry_hash,
+        }
+        assert catalog_entry["redistribute_with_full"] is True
+        assert catalog_entry["rows"] == len(region_mapping)
+        assert get_stale_reasons(mapping_file, regions=[region_from, region_to]) == []
+
+        # Pretend the `l_and_r` geometry changed after the mapping was built.
+        with open(region_from.redistribute_catalog_file) as file:
+            catalog = json.load(file)
+        catalog["intersection_area/l_and_r/triangle"]["geometry_hashes"][region_to.id] = "outdated"
+        with open(region_from.redistribute_catalog_file, "w") as file:
+            json.dump(catalog, file)
+        pl.DataFrame(schema=region_mapping.schema).write_parquet(mapping_file)
+
+        assert get_stale_reasons(mapping_file, regions=[region_from, region_to]) == [
+            "`l_and_r` geometry has changed since the mapping was built."
+        ]
+        with pytest.warns(UserWarning, match="Using stale mapping file"):
+            stale_mapping = get_region_mapping_base(**mapping_kwargs, redistribute_with_full=None)
+        assert stale_mapping.is_empty()
+
+        rebuilt_mapping = get_region_mapping_base(**mapping_kwargs, redistribute_with_full=True, save_data=True)
+        pl.testing.assert_frame_equal(rebuilt_mapping, region_mapping, check_row_order=False)
+        assert get_stale_reasons(mapping_file, regions=[region_from, region_to]) == []
+
+    finally:
+        if os.path.exists(mapping_file):
+            os.remove(mapping_file)
+
+
+def test_record_catalog_entry_concurrent(region: RegionMocked):
+    """Test entries recorded at once, as by `precompute_mappings` workers, are all kept."""
+    mapping_files = [
+        _get_region_mapping_file(region.triangle, region.l_and_r, mapping=f"concurrent_{i}") for i in range(16)
+    ]
+
+    def record(mapping_file: str) -> None:
+        record_catalog_entry(
+            mapping_file,
+            mapping="concurrent",
+            regions=[region.triangle, region.l_and_r],
+            redistribute_with_full=True,
+            region_mapping=pl.DataFrame(),
+            build_seconds=0.0,
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(record, mapping_files))
+
+    for mapping_file in mapping_files:
+        assert get_catalog_entry(mapping_file, region=region.triangle)["mapping"] == "concurrent"
+    catalog_dir = os.path.dirname(region.triangle.redistribute_catalog_file)
+    assert not [file for file in os.listdir(catalog_dir) if file.endswith(".tmp")]
@@ -0,0 +1,153 @@
+import os
+import tempfile
+
+import polars as pl
+import pytest
+from electoralyze.common.testing.region_fixture import (
+    FOUR_SQUARE_REGION_ID,
+    LEFT_RIGHT_REGION_ID,
+    ONE_SQUARE_REGION_ID,
+    THREE_RECTANGLE_REGION_ID,
+    THREE_TRIANGLES_REGION_ID,
+    RegionMocked,
+    create_fake_regions,
+)
+from electoralyze.region.redistribute.compose import _get_composed_mapping_file, compose_region_mapping
+from polars import testing  # noqa: F401
+
+
+@pytest.mark.parametrize(
+    "_name, region_ids, expected",
+    [
+        (
+            "square -> quadrants -> L and R, ",
+            (ONE_SQUARE_REGION_ID, FOUR_SQUARE_REGION_ID, LEFT_RIGHT_REGION_ID),
+            pl.DataFrame(
+                [
+                    {ONE_SQUARE_REGION_ID: "main", LEFT_RIGHT_REGION_ID: "L", "mapping": 32.0},
+                    {ONE_SQUARE_REGION_ID: "main", LEFT_RIGHT_REGION_ID: "R", "mapping": 32.0},
+                ]
+            ),
+        ),
+        (
+            "L and R -> triangles -> quadrants, ",
+            (LEFT_RIGHT_REGION_ID, THREE_TRIANGLES_REGION_ID, FOUR_SQUARE_REGION_ID),
+            pl.DataFrame(
+                [
+                    {LEFT_RIGHT_REGION_ID: "L", FOUR_SQUARE_REGION_ID: "M", "mapping": 8.0},
+                    {LEFT_RIGHT_REGION_ID: "L", FOUR_SQUARE_REGION_ID: "N", "mapping": 2.0},
+                    {LEFT_RIGHT_REGION_ID: "L", FOUR_SQUARE_REGION_ID: "O", "mapping": 8.0},
+                    {LEFT_RIGHT_REGION_ID: "L", FOUR_SQUARE_REGION_ID: "P", "mapping": 6.0},
+                    {LEFT_RIGHT_REGION_ID: "L", FOUR_SQUARE_REGION_ID: None, "mapping": 8.0},
+                    {LEFT_RIGHT_REGION_ID: "R", FOUR_SQUARE_REGION_ID: "M", "mapping": 2.0},
+                    {LEFT_RIGHT_REGION_ID: "R", FOUR_SQUARE_REGION_ID: "N", "mapping": 8.0},
+                    {LEFT_RIGHT_REGION_ID: "R", FOUR_SQUARE_REGION_ID: "O", "mapping": 6.0},
+                    {LEFT_RIGHT_REGION_ID: "R", FOUR_SQUARE_REGION_ID: "P", "mapping": 8.0},
+                    {LEFT_RIGHT_REGION_ID: "R", FOUR_SQUARE_REGION_ID: None, "mapping": 8.0},
+                ]
+            ),
+        ),
+    ],
+)
+def test_compose_region_mapping(region: RegionMocked, _name: str, region_ids: tuple, expected: pl.DataFrame):
+    """Test composing two mappings gives the expected from -> to mapping."""
+    region_from, region_via, region_to = (region.from_id(region_id) for region_id in region_ids)
+
+    composed_mapping = compose_region_mapping(
+        region_from, region_via, region_to, mapping_method="intersection_area", redistribute_with_full=True
+    )
+
+    pl.testing.assert_frame_equal(composed_mapping, expected, check_row_order=False, check_column_order=False)
+
+
+def test_compose_region_mapping_saved():
+    """Test composed mappings are stored and read back."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        region = create_fake_regions(temp_dir)
+        region_from, region_via, region_to = region.quadrant, region.triangle, region.rectangle
+        composed_file = _get_composed_mapping_file(region_from, region_via, region_to, mapping="intersection_area")
+        assert not os.path.exists(composed_file), "Composed mapping should not exist yet."
+
+        with pytest.raises(FileNotFoundError):
+            compose_region_mapping(region_from, region_via, region_to, mapping_method="intersection_area")
+
+        with pytest.raises(ValueError):
+            compose_region_mapping(
+                region_from,
+                region_via,
+                region_to,
+                mapping_method="intersection_area",
+                redistribute_with_full=False,
+                save_data=True,
+            )
+
+        composed_mapping = compose_region_mapping(
+            region_from,
+            region_via,
+            region_to,
+            mapping_method="intersection_area",
+            redistribute_with_full=True,
+            save_data=True,
+        )
+        assert os.path.exists(composed_file), "Composed mapping should be saved."
+
+        composed_mapping_stored = compose_region_mapping(
+            region_from, region_via, region_to, mapping_method="intersection_area"
+        )
+        pl.testing.assert_frame_equal(composed_mapping, composed_mapping_stored, check_row_order=False)
+
+        # Totals per from region are kept.
+        pl.testing.assert_frame_equal(
+            composed_mapping.group_by(region_from.id).agg(pl.col("mapping").sum()),
+            pl.DataFrame({FOUR_SQUARE_REGION_ID: ["M", "N", "O", "P"], "mapping": [16.0] * 4}),
+            check_row_order=False,
+        )
+        assert THREE_RECTANGLE_REGION_ID in composed_mapping.columns
+
+
+def test_compose_region_mapping_same_regions(region: RegionMocked):
+    """Test composing through one of the end regions raises an error."""
+    with pytest.raises(ValueError):
+        compose_region_mapping(
+            region.quadrant,
+            region.quadrant,
+            region.triangle,
+            mapping_method="intersection_area",
+            redistribute_with_full=True,
+        )
+
+
+def test_compose_region_mapping_chain(region: RegionMocked):
+    """Test composing a chain of via regions, hops through nested regions don't change the mapping."""
+    mapping_kwargs = dict(mapping_method="intersection_area", redistribute_with_full=True)
+    composed_mapping = compose_region_mapping(
+        region.square, [region.l_and_r, region.quadrant], region.triangle, **mapping_kwargs
+    )
+    expected = compose_region_mapping(region.square, region.quadrant, region.triangle, **mapping_kwargs)
+    pl.testing.assert_frame_equal(composed_mapping, expected, check_row_order=False, check_column_order=False)
+
+    pl.testing.assert_frame_equal(
+        compose_region_mapping(region.square, [region.quadrant], region.triangle, **mapping_kwargs),
+        expected,
+        check_row_order=False,
+    )
+    assert _get_composed_mapping_file(
+        region.square, [region.l_and_r, region.quadrant], region.triangle, mapping="intersection_area"
+    ).endswith("intersection_area_via_l_and_r__quadrant/square/triangle.parquet")
+
+    class RegionL(region.l_and_r):
+        id = "l"
+
+    class RegionAndRQuadrant(region.quadrant):
+        id = "and_r_quadrant"
+
+    assert _get_composed_mapping_file(
+        region.square, [region.l_and_r, region.quadrant], region.triangle, mapping="intersection_area"
+    ) != _get_composed_mapping_file(
+        region.square, [RegionL, RegionAndRQuadrant], region.triangle, mapping="intersection_area"
+    ), "Different chains should have different files."
+
+    with pytest.raises(ValueError):
+        compose_region_mapping(region.square, [region.quadrant, region.square], region.triangle, **mapping_kwargs)
+    with pytest.raises(ValueError):
+        compose_region_mapping(region.square, [], region.triangle, **mapping_kwargs)
@@ -1,20 +1,43 @@
+import math
+import tempfile
+from unittest import mock
+
+import numpy as np
 import polars as pl
+import polars_st as st
+import pyarrow.parquet as pq
 import pytest
+from electoralyze.common.functools import classproperty
+from electoralyze.common.geometry import to_geopandas
 from electoralyze.common.testing.region_fixture import (
     FAR_RIGHT_REGION_ID,
     FOUR_SQUARE_REGION_ID,
+    LEFT_RIGHT_REGION_ID,
+    ONE_SQUARE_REGION_ID,
+    REGION_JSONS,
     THREE_RECTANGLE_REGION_ID,
     THREE_TRIANGLES_REGION_ID,
     RegionMocked,
+    create_fake_regions,
     get_true_redistribution,
 )
+from electoralyze.common.testing.tessellation_fixture import create_tessellation_regions
+from electoralyze.region.redistribute import mapping
+from electoralyze.region.redistribute.catalog import get_changed_ids
 from electoralyze.region.redistribute.mapping import (
+    _create_centroid_distance_mapping,
     _create_intersection_area_mapping,
+    _create_intersection_area_mapping_streaming,
+    _create_nested_intersection_area_mapping,
     get_region_mapping_base,
+    scan_region_mapping,
 )
 from polars import testing  # noqa: F401
 
+EQUATOR_2_DEGREES_KM = 2 * mapping.EARTH_RADIUS_KM * math.sin(math.radians(1))
+
 
+@pytest.mark.parametrize("intersection_engine", ["overlay", "strtree"])
 @pytest.mark.parametrize(
     "_name, region_id_from, region_id_to, expected",
     [
@@ -51,12 +74,18 @@ from polars import testing  # noqa: F401
     ],
 )
 def test_create_intersection_area_mapping(
-    _name: str, region_id_from: str, region_id_to: str, expected: pl.DataFrame, region: RegionMocked
+    _name: str,
+    region_id_from: str,
+    region_id_to: str,
+    expected: pl.DataFrame,
+    intersection_engine: str,
+    region: RegionMocked,
 ):
     """Test cross section area is correct."""
     intersection_area_mapping = _create_intersection_area_mapping(
         geometry_from=region.from_id(region_id_from).geometry,
         geometry_to=region.from_id(region_id_to).geometry,
+        intersection_engine=intersection_engine,
     )
     pl.testing.assert_frame_equal(
         intersection_area_mapping,
@@ -115,14 +144,44 @@ def test_create_intersection_area_mapping(
             ),
         ),
         (
-            "triangles to rectangles: trying to use centroid, ",
+            "triangles to rectangles: using simplified with strtree, ",
             dict(
                 region_id_from=THREE_TRIANGLES_REGION_ID,
                 region_id_to=THREE_RECTANGLE_REGION_ID,
-                mapping_method="centroid_distance",
+                mapping_method="intersection_area",
                 redistribute_with_full=False,
+                intersection_engine="strtree",
+                expected=get_true_redistribution(THREE_TRIANGLES_REGION_ID, THREE_RECTANGLE_REGION_ID),
+                error=None,
+            ),
+        ),
+        (
+            "triangles to rectangles: unknown intersection engine, ",
+            dict(
+                region_id_from=THREE_TRIANGLES_REGION_ID,
+                region_id_to=THREE_RECTANGLE_REGION_ID,
+                mapping_method="intersection_area",
+                redistribute_with_full=False,
+                intersection_engine="cross_join",
                 expected=None,
-                error=NotImplementedError,
+                error=ValueError,
+            ),
+        ),
+        (
+            "square to L and R: using centroid, ",
+            dict(
+                region_id_from=ONE_SQUARE_REGION_ID,
+                region_id_to=LEFT_RIGHT_REGION_ID,
+                mapping_method="centroid_distance",
+                redistribute_with_full=False,
+                # Centroids are 2 degrees either side of (0, 0) along the equator.
+                expected=pl.DataFrame(
+                    [
+                        {ONE_SQUARE_REGION_ID: "main", LEFT_RIGHT_REGION_ID: "L", "mapping": 1 / EQUATOR_2_DEGREES_KM},
+                        {ONE_SQUARE_REGION_ID: "main", LEFT_RIGHT_REGION_ID: "R", "mapping": 1 / EQUATOR_2_DEGREES_KM},
+                    ]
+                ),
+                error=None,
             ),
         ),
         (
@@ -200,6 +259,7 @@ def test_get_region_mapping_base(
         redistribute_with_full=test_case["redistribute_with_full"],
         save_data=test_case.get("save_data", False),
         force_new=test_case.get("force_new", False),
+        intersection_engine=test_case.get("intersection_engine", "overlay"),
     )
 
     if test_case["error"] is None:
@@ -214,3 +274,310 @@ def test_get_region_mapping_base(
     else:
         with pytest.raises(test_case["error"]):
             get_region_mapping_base(**region_mapping_kwargs)
+
+
+@pytest.mark.parametrize(
+    "region_id_from, region_id_to, intersection_engine",
+    [
+        (THREE_TRIANGLES_REGION_ID, THREE_RECTANGLE_REGION_ID, "overlay"),
+        (FAR_RIGHT_REGION_ID, FOUR_SQUARE_REGION_ID, "strtree"),
+    ],
+)
+def test_create_intersection_area_mapping_workers(
+    region_id_from: str, region_id_to: str, intersection_engine: str, region: RegionMocked
+):
+    """Test the sharded process pool gives the same mapping as the serial path."""
+    mapping_kwargs = dict(
+        geometry_from=region.from_id(region_id_from).geometry,
+        geometry_to=region.from_id(region_id_to).geometry,
+        intersection_engine=intersection_engine,
+    )
+    mapping_serial = _create_intersection_area_mapping(**mapping_kwargs)
+    mapping_parallel = _create_intersection_area_mapping(**mapping_kwargs, workers=2)
+
+    pl.testing.assert_frame_equal(
+        mapping_parallel,
+        mapping_serial,
+        check_column_order=False,
+        check_row_order=False,
+    )
+
+
+@pytest.mark.parametrize(
+    "_name, region_id_from, region_id_to",
+    [
+        ("quadrants to square, ", FOUR_SQUARE_REGION_ID, ONE_SQUARE_REGION_ID),
+        ("square to quadrants, ", ONE_SQUARE_REGION_ID, FOUR_SQUARE_REGION_ID),
+        ("quadrants to L and R, ", FOUR_SQUARE_REGION_ID, LEFT_RIGHT_REGION_ID),
+        ("L and R to quadrants, ", LEFT_RIGHT_REGION_ID, FOUR_SQUARE_REGION_ID),
+    ],
+)
+def test_get_region_mapping_base_nested(_name: str, region_id_from: str, region_id_to: str, region: RegionMocked):
+    """Test nested regions are mapped with a join and match the overlay."""
+    region_from = region.from_id(region_id_from)
+    region_to = region.from_id(region_id_to)
+
+    region_mapping = get_region_mapping_base(
+        region_from,
+        region_to,
+        mapping_method="intersection_area",
+        redistribute_with_full=False,
+        verify_nesting=True,
+    )
+    expected = _create_intersection_area_mapping(region_from.geometry, region_to.geometry)
+
+    pl.testing.assert_frame_equal(
+        region_mapping,
+        expected,
+        check_column_order=False,
+        check_row_order=False,
+    )
+
+
+def test_create_nested_intersection_area_mapping_not_nested(region: RegionMocked):
+    """Test an incorrect parent declaration is caught when verifying nesting."""
+
+    class WrongQuadrant(region.quadrant):
+        @classproperty
+        def parent_regions(cls) -> dict[str, pl.Expr]:
+            return {LEFT_RIGHT_REGION_ID: pl.col(cls.id).replace_strict({"M": "R", "N": "R", "O": "L", "P": "L"})}
+
+    nested_kwargs = dict(
+        region_child=WrongQuadrant,
+        region_parent=region.l_and_r,
+        geometry_child=region.quadrant.geometry,
+        geometry_parent=region.l_and_r.geometry,
+    )
+
+    _create_nested_intersection_area_mapping(**nested_kwargs, verify_nesting=False)
+    with pytest.raises(ValueError, match="2 `quadrant` regions do not lie"):
+        _create_nested_intersection_area_mapping(**nested_kwargs, verify_nesting=True)
+
+
+def test_get_region_mapping_base_incremental():
+    """Test only changed regions are recomputed when a stored mapping is updated incrementally."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        region = create_fake_regions(temp_dir)
+        region_from, region_to = region.far_right, region.quadrant
+        mapping_kwargs = dict(mapping_method="intersection_area", redistribute_with_full=True)
+        get_region_mapping_base(region_from, region_to, **mapping_kwargs, save_data=True)
+
+        # Stretch `F5` further down, every other region keeps the same geometry.
+        far_right_json = {**REGION_JSONS[FAR_RIGHT_REGION_ID]}
+        far_right_json["geometry"] = [*far_right_json["geometry"][:4], "POLYGON ((3 0, 6 0, 6 -5, 3 -5, 3 0))"]
+        pl.DataFrame(far_right_json).with_columns(geometry=st.from_wkt("geometry")).pipe(to_geopandas).to_file(
+            region_from.raw_geometry_file, driver="ESRI Shapefile"
+        )
+        region_from.cache_clear()
+        region_from.process_raw(download=False)
+
+        mapping_file = mapping._get_region_mapping_file(region_from, region_to, mapping="intersection_area")
+        changed_ids = get_changed_ids(mapping_file, regions=[region_from, region_to])
+        assert changed_ids[FAR_RIGHT_REGION_ID].to_list() == ["F5"]
+        assert changed_ids[FOUR_SQUARE_REGION_ID].to_list() == []
+
+        with mock.patch.object(
+            mapping, "_create_intersection_area_mapping", wraps=mapping._create_intersection_area_mapping
+        ) as create_mapping:
+            region_mapping = get_region_mapping_base(
+                region_from, region_to, **mapping_kwargs, save_data=True, incremental=True
+            )
+        create_mapping.assert_not_called()
+
+        expected = _create_intersection_area_mapping(region_from.get_raw_geometry(), region_to.get_raw_geometry())
+        pl.testing.assert_frame_equal(region_mapping, expected, check_column_order=False, check_row_order=False)
+        assert get_changed_ids(mapping_file, regions=[region_from, region_to])[FAR_RIGHT_REGION_ID].is_empty()
+
+
+@pytest.mark.parametrize("neighbours", [1, 2])
+@pytest.mark.parametrize(
+    "region_id_from, region_id_to",
+    [
+        (FAR_RIGHT_REGION_ID, FOUR_SQUARE_REGION_ID),
+        (FOUR_SQUARE_REGION_ID, FAR_RIGHT_REGION_ID),
+    ],
+)
+def test_create_centroid_distance_mapping(
+    region_id_from: str, region_id_to: str, neighbours: int, region: RegionMocked
+):
+    """Test the KD-tree pairs match a cross join of every centroid, keeping the nearest in both directions."""
+    geometry_from = region.from_id(region_id_from).geometry
+    geometry_to = region.from_id(region_id_to).geometry
+
+    centroid_distance_mapping = _create_centroid_distance_mapping(geometry_from, geometry_to, neighbours=neighbours)
+
+    points_from = mapping._get_centroid_points(geometry_from)
+    points_to = mapping._get_centroid_points(geometry_to)
+    cross_join = geometry_from.select(region_id_from).join(geometry_to.select(region_id_to), how="cross")
+    cross_join = cross_join.with_columns(
+        distance=pl.Series(np.linalg.norm(points_from[:, None, :] - points_to[None, :, :], axis=-1).reshape(-1))
+    )
+    expected = (
+        pl.concat(
+            [
+                cross_join.filter(pl.col("distance").rank("ordinal").over(region_id) <= neighbours)
+                for region_id in (region_id_from, region_id_to)
+            ]
+        )
+        .unique([region_id_from, region_id_to])
+        .select(region_id_from, region_id_to, mapping=1 / pl.col("distance"))
+    )
+
+    pl.testing.assert_frame_equal(centroid_distance_mapping, expected, check_row_order=False)
+
+
+@pytest.mark.parametrize("memory_budget", [1, 10**9])
+@pytest.mark.parametrize(
+    "region_id_from, region_id_to",
+    [
+        (THREE_TRIANGLES_REGION_ID, FOUR_SQUARE_REGION_ID),
+        (FOUR_SQUARE_REGION_ID, FAR_RIGHT_REGION_ID),
+    ],
+)
+def test_create_intersection_area_mapping_streaming(
+    region_id_from: str, region_id_to: str, memory_budget: int, region: RegionMocked
+):
+    """Test streaming the raw geometry in chunks gives the same mapping as loading it all at once."""
+    region_from, region_to = region.from_id(region_id_from), region.from_id(region_id_to)
+
+    region_mapping = _create_intersection_area_mapping_streaming(region_from, region_to, memory_budget=memory_budget)
+    expected = _create_intersection_area_mapping(region_from.get_raw_geometry(), region_to.get_raw_geometry())
+
+    pl.testing.assert_frame_equal(region_mapping, expected, check_column_order=False, check_row_order=False)
+
+
+@pytest.mark.parametrize("region_id_other", [THREE_TRIANGLES_REGION_ID, FAR_RIGHT_REGION_ID])
+def test_create_intersection_area_mapping_streaming_grouped(region_id_other: str, region: RegionMocked):
+    """Test streaming a region whose transform unions several raw rows into one, like `SA2_2021` from SA1 rows.
+
+    Chunks then hold partial geometries of the same id, which must be summed back together.
+    """
+
+    class LeftRightFromQuadrants(region.l_and_r):
+        @classproperty
+        def raw_geometry_file(cls) -> str:
+            return region.quadrant.raw_geometry_file
+
+        @classmethod
+        def _transform_geometry_raw(cls, geometry_raw: st.GeoDataFrame) -> st.GeoDataFrame:
+            geometry_grouped = geometry_raw.group_by(
+                pl.col(FOUR_SQUARE_REGION_ID).replace_strict({"M": "L", "O": "L", "N": "R", "P": "R"}).alias(cls.id)
+            ).agg(st.geom("geometry").st.union_all())
+            return geometry_grouped.select(
+                cls.id, pl.struct(pl.col(cls.id).alias(cls.name)).alias("metadata"), "geometry"
+            )
+
+    region_other = region.from_id(region_id_other)
+    region_mapping = _create_intersection_area_mapping_streaming(LeftRightFromQuadrants, region_other, memory_budget=1)
+    expected = _create_intersection_area_mapping(region.l_and_r.get_raw_geometry(), region_other.get_raw_geometry())
+
+    pl.testing.assert_frame_equal(
+        region_mapping.sort(pl.all()), expected.sort(pl.all()), check_column_order=False, check_exact=False
+    )
+
+
+def test_get_region_mapping_base_memory_budget(region: RegionMocked):
+    """Test a memory budget streams full geometry builds, but not simplified ones."""
+    mapping_kwargs = dict(mapping_method="intersection_area", force_new=True, memory_budget=1)
+
+    with mock.patch.object(
+        mapping, "_create_intersection_area_mapping_streaming", wraps=_create_intersection_area_mapping_streaming
+    ) as create_streaming:
+        get_region_mapping_base(region.triangle, region.rectangle, redistribute_with_full=False, **mapping_kwargs)
+        create_streaming.assert_not_called()
+
+        region_mapping = get_region_mapping_base(
+            region.triangle, region.rectangle, redistribute_with_full=True, **mapping_kwargs
+        )
+        create_streaming.assert_called_once()
+
+    pl.testing.assert_frame_equal(
+        region_mapping,
+        get_true_redistribution(THREE_TRIANGLES_REGION_ID, THREE_RECTANGLE_REGION_ID),
+        check_column_order=False,
+        check_row_order=False,
+    )
+
+
+@pytest.mark.parametrize(
+    "region_id_from, region_id_to",
+    [
+        (THREE_TRIANGLES_REGION_ID, THREE_RECTANGLE_REGION_ID),
+        (FAR_RIGHT_REGION_ID, FOUR_SQUARE_REGION_ID),
+        (ONE_SQUARE_REGION_ID, FAR_RIGHT_REGION_ID),
+    ],
+)
+def test_create_intersection_area_mapping_adaptive(region_id_from: str, region_id_to: str, region: RegionMocked):
+    """Test the adaptive mapping matches the full geometry mapping."""
+    region_from, region_to = region.from_id(region_id_from), region.from_id(region_id_to)
+
+    region_mapping = mapping._create_intersection_area_mapping_adaptive(region_from, region_to)
+    expected = _create_intersection_area_mapping(region_from.get_raw_geometry(), region_to.get_raw_geometry())
+
+    pl.testing.assert_frame_equal(region_mapping, expected, check_column_order=False, check_row_order=False)
+
+
+def test_get_region_mapping_base_adaptive():
+    """Test the adaptive mapping only reads and intersects full geometry of regions near boundaries."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tessellation = create_tessellation_regions(temp_dir, n_polygons=400)
+        region_from, region_to = tessellation.voronoi, tessellation.grid_coarse
+
+        with (
+            mock.patch.object(
+                mapping, "_get_intersection_area_with_engine", wraps=mapping._get_intersection_area_with_engine
+            ) as get_intersection_area,
+            mock.patch.object(region_from, "get_raw_geometry", side_effect=AssertionError("Read all raw geometry.")),
+            mock.patch.object(region_to, "get_raw_geometry", side_effect=AssertionError("Read all raw geometry.")),
+            mock.patch.object(
+                region_from, "get_raw_geometry_chunk", wraps=region_from.get_raw_geometry_chunk
+            ) as get_raw_geometry_chunk,
+        ):
+            region_mapping = get_region_mapping_base(
+                region_from, region_to, mapping_method="intersection_area", redistribute_with_full="adaptive"
+            )
+        geometry_from_boundary = get_intersection_area.call_args.args[0]
+        assert 0 < len(geometry_from_boundary) < len(region_from.geometry) / 2
+        raw_geometry_read = region_from.get_raw_geometry_chunk(**get_raw_geometry_chunk.call_args.kwargs)
+        assert len(raw_geometry_read) < len(region_from.geometry), "Should only read raw features near boundaries."
+
+        expected = _create_intersection_area_mapping(region_from.get_raw_geometry(), region_to.get_raw_geometry())
+        # The full geometry overlay leaves floating point residuals which interior regions don't have.
+        pl.testing.assert_frame_equal(
+            region_mapping.filter(pl.col("mapping") > 1e-12),
+            expected.filter(pl.col("mapping") > 1e-12),
+            check_column_order=False,
+            check_row_order=False,
+        )
+
+
+def test_region_mapping_file_layout():
+    """Test stored mappings are sorted with float32 weights, and scanning them reads back the same mapping."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        region = create_fake_regions(temp_dir)
+        region_from, region_to = region.triangle, region.quadrant
+        region_mapping = get_region_mapping_base(
+            region_from, region_to, mapping_method="intersection_area", redistribute_with_full=True, save_data=True
+        )
+
+        mapping_file = mapping._get_region_mapping_file(region_from, region_to, mapping="intersection_area")
+        stored = pl.read_parquet(mapping_file)
+        assert stored.schema["mapping"] == pl.Float32
+        assert stored[FOUR_SQUARE_REGION_ID].to_list() == sorted(
+            stored[FOUR_SQUARE_REGION_ID].to_list(), key=lambda id_: (id_ is None, id_)
+        )
+        assert pq.ParquetFile(mapping_file).metadata.row_group(0).column(0).statistics.has_min_max
+
+        scanned = scan_region_mapping(region_from, region_to, mapping_method="intersection_area")
+        pl.testing.assert_frame_equal(
+            scanned.collect(), region_mapping, check_column_order=False, check_row_order=False
+        )
+        pl.testing.assert_frame_equal(
+            scanned.filter(pl.col(FOUR_SQUARE_REGION_ID) == "M").collect(),
+            region_mapping.filter(pl.col(FOUR_SQUARE_REGION_ID) == "M"),
+            check_column_order=False,
+            check_row_order=False,
+        )
+
+        with pytest.raises(FileNotFoundError):
+            scan_region_mapping(region_from, region.l_and_r, mapping_method="intersection_area")
@@ -0,0 +1,60 @@
+import tempfile
+
+import polars as pl
+from electoralyze.common.testing.region_fixture import create_fake_regions
+from electoralyze.region.redistribute.mapping import _create_intersection_area_mapping, get_region_mapping_base
+from electoralyze.region.redistribute.precompute import _plan_mappings, precompute_mappings
+from polars import testing  # noqa: F401
+
+
+def test_plan_mappings():
+    """Test parent regions are derived through their children, after the pair they are derived from."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        region = create_fake_regions(temp_dir)
+        regions = [region.square, region.l_and_r, region.quadrant, region.triangle]
+
+        plan = _plan_mappings(regions, mapping_method="intersection_area", derive=True)
+        plan_ids = [(pair[0].id, pair[1].id, None if via is None else via.id) for pair, via in plan.items()]
+        assert sorted(plan_ids, key=str) == sorted(
+            [
+                ("l_and_r", "square", "quadrant"),
+                ("quadrant", "square", None),
+                ("l_and_r", "quadrant", None),
+                ("quadrant", "triangle", None),
+                ("l_and_r", "triangle", "quadrant"),
+                ("square", "triangle", "quadrant"),
+            ],
+            key=str,
+        )
+        pair_order = [(pair[0].id, pair[1].id) for pair in plan]
+        assert pair_order.index(("quadrant", "triangle")) < pair_order.index(("square", "triangle"))
+        assert pair_order.index(("quadrant", "square")) < pair_order.index(("l_and_r", "square"))
+
+        plan = _plan_mappings(regions, mapping_method="intersection_area", derive=False)
+        assert all(via is None for via in plan.values())
+
+
+def test_precompute_mappings():
+    """Test every pair is saved, derived mappings match overlays and up to date pairs are skipped on a rerun."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        region = create_fake_regions(temp_dir)
+        regions = [region.square, region.quadrant, region.triangle]
+
+        timings = precompute_mappings(regions)
+        assert timings.select("region_a", "region_b", "path").rows() == [
+            ("quadrant", "square", "nested"),
+            ("quadrant", "triangle", "overlay"),
+            ("square", "triangle", "derived_quadrant"),
+        ]
+
+        region_mapping = get_region_mapping_base(region.square, region.triangle, mapping_method="intersection_area")
+        expected = _create_intersection_area_mapping(
+            region.square.get_raw_geometry(), region.triangle.get_raw_geometry()
+        )
+        pl.testing.assert_frame_equal(region_mapping, expected, check_column_order=False, check_row_order=False)
+
+        timings_rerun = precompute_mappings(regions)
+        assert timings_rerun["path"].to_list() == ["existing"] * 3
+
+        timings_forced = precompute_mappings(regions, force_new=True, derive=False)
+        assert timings_forced["path"].to_list() == ["nested", "overlay", "overlay"]
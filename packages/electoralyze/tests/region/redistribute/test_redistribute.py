@@ -7,7 +7,14 @@ from electoralyze.common.testing.region_fixture import (
     THREE_TRIANGLES_REGION_ID,
     RegionMocked,
 )
-from electoralyze.region.redistribute.redistribute import _validate, redistribute
+from electoralyze.region.redistribute.redistribute import (
+    _get_validate_columns,
+    _validate,
+    get_redistribute_diagnostics,
+    redistribute,
+    redistribute_long,
+    redistribute_many,
+)
 from polars import testing  # noqa: F401
 from polars.exceptions import ColumnNotFoundError
 
@@ -421,6 +428,25 @@ def test_redistribute_special_mapping(
                 data_by_to=pl.DataFrame([{LEFT_RIGHT_REGION_ID: "M", "data": 100.0}]),
             ),
         ),
+        (
+            "Custom mapping with a via region, ",
+            dict(
+                region_id_from=ONE_SQUARE_REGION_ID,
+                region_id_via=FOUR_SQUARE_REGION_ID,
+                region_id_to=LEFT_RIGHT_REGION_ID,
+            ),
+            dict(
+                data_by_from=pl.DataFrame([{ONE_SQUARE_REGION_ID: "main", "data": 100.0}]),
+                mapping=pl.DataFrame(
+                    [
+                        {ONE_SQUARE_REGION_ID: "main", LEFT_RIGHT_REGION_ID: "L", "mapping": 1.0},
+                    ]
+                ),
+            ),
+            dict(
+                errors=ValueError,
+            ),
+        ),
         (
             "Not implemented aggregation method, ",
             dict(
@@ -437,7 +463,7 @@ def test_redistribute_special_mapping(
             ),
         ),
         (
-            "Not implemented centroid distance, ",
+            "Centroid distance, ",
             dict(
                 region_id_from=ONE_SQUARE_REGION_ID,
                 region_id_to=LEFT_RIGHT_REGION_ID,
@@ -448,7 +474,12 @@ def test_redistribute_special_mapping(
                 mapping="centroid_distance",
             ),
             dict(
-                errors=NotImplementedError,
+                data_by_to=pl.DataFrame(
+                    [
+                        {LEFT_RIGHT_REGION_ID: "L", "data": 50.0},
+                        {LEFT_RIGHT_REGION_ID: "R", "data": 50.0},
+                    ]
+                ),
             ),
         ),
     ],
@@ -583,3 +614,398 @@ def test_redistribute_validate(_name: str, test_case: dict):
                 errors=test_case["errors"],
                 ratio_tolerance=test_case["ratio_tolerance"],
             )
+
+
+@pytest.mark.parametrize(
+    "_name, region_ids, redistribute_kwargs",
+    [
+        (
+            "square to quadrants, ",
+            dict(region_id_from=ONE_SQUARE_REGION_ID, region_id_to=FOUR_SQUARE_REGION_ID),
+            dict(
+                data_by_from=pl.DataFrame([{ONE_SQUARE_REGION_ID: "main", "data": 100, "other": 7.5}]),
+            ),
+        ),
+        (
+            "L and R to triangles with index columns and duplicates, ",
+            dict(region_id_from=LEFT_RIGHT_REGION_ID, region_id_to=THREE_TRIANGLES_REGION_ID),
+            dict(
+                data_by_from=pl.DataFrame(
+                    [
+                        {LEFT_RIGHT_REGION_ID: "L", "year": 2021, "data": 32.0, "other": 1.0},
+                        {LEFT_RIGHT_REGION_ID: "L", "year": 2021, "data": 8.0, "other": None},
+                        {LEFT_RIGHT_REGION_ID: "R", "year": 2021, "data": 64.0, "other": 2.0},
+                        {LEFT_RIGHT_REGION_ID: "R", "year": 2022, "data": 16.0, "other": 3.0},
+                        {LEFT_RIGHT_REGION_ID: "L", "year": None, "data": 4.0, "other": 4.0},
+                    ]
+                ),
+                index_columns=["year"],
+            ),
+        ),
+        (
+            "triangles to quadrants, unassigned output, ",
+            dict(region_id_from=THREE_TRIANGLES_REGION_ID, region_id_to=FOUR_SQUARE_REGION_ID),
+            dict(
+                data_by_from=pl.DataFrame(
+                    [
+                        {THREE_TRIANGLES_REGION_ID: "A", "data": 10},
+                        {THREE_TRIANGLES_REGION_ID: "B", "data": 20},
+                        {THREE_TRIANGLES_REGION_ID: "C", "data": 30},
+                    ]
+                ),
+            ),
+        ),
+    ],
+)
+def test_redistribute_sparse_backend(region: RegionMocked, _name: str, region_ids: dict, redistribute_kwargs: dict):
+    """Test the sparse backend gives the same output as the polars backend."""
+    redistribute_kwargs = dict(
+        region_from=region.from_id(region_ids["region_id_from"]),
+        region_to=region.from_id(region_ids["region_id_to"]),
+        mapping="intersection_area",
+        redistribute_with_full=True,
+        **redistribute_kwargs,
+    )
+    redistributed_polars = redistribute(**redistribute_kwargs, backend="polars")
+    redistributed_sparse = redistribute(**redistribute_kwargs, backend="sparse")
+
+    pl.testing.assert_frame_equal(
+        redistributed_sparse,
+        redistributed_polars,
+        check_row_order=False,
+        check_column_order=False,
+    )
+
+
+def test_redistribute_sparse_backend_aggregation(region: RegionMocked):
+    """Test the sparse backend only supports sums."""
+    with pytest.raises(NotImplementedError):
+        redistribute(
+            pl.DataFrame([{ONE_SQUARE_REGION_ID: "main", "data": 100.0}]),
+            region_from=region.square,
+            region_to=region.quadrant,
+            redistribute_with_full=True,
+            aggregation="mean",
+            backend="sparse",
+        )
+
+
+@pytest.mark.parametrize("backend", ["polars", "sparse"])
+def test_redistribute_lazy(region: RegionMocked, backend: str):
+    """Test LazyFrames are redistributed to a LazyFrame matching the eager output, validated within the plan."""
+    data_by_from = pl.DataFrame(
+        [
+            {THREE_TRIANGLES_REGION_ID: "A", "year": 2021, "data": 10.0},
+            {THREE_TRIANGLES_REGION_ID: "B", "year": 2021, "data": 20.0},
+            {THREE_TRIANGLES_REGION_ID: "C", "year": 2024, "data": 30.0},
+        ]
+    )
+    redistribute_kwargs = dict(
+        region_from=region.triangle,
+        region_to=region.quadrant,
+        index_columns=["year"],
+        redistribute_with_full=True,
+        backend=backend,
+    )
+
+    redistributed_lazy = redistribute(data_by_from.lazy(), **redistribute_kwargs)
+    assert isinstance(redistributed_lazy, pl.LazyFrame)
+    pl.testing.assert_frame_equal(
+        redistributed_lazy.collect(),
+        redistribute(data_by_from, **redistribute_kwargs),
+        check_row_order=False,
+        check_column_order=False,
+    )
+
+    data_by_from_missing = data_by_from.with_columns(pl.col(THREE_TRIANGLES_REGION_ID).replace("A", "missing"))
+    redistributed_missing = redistribute(data_by_from_missing.lazy(), **redistribute_kwargs)
+    with pytest.raises(pl.exceptions.ComputeError, match="Miss match"):
+        redistributed_missing.collect()
+
+    source_reads = []
+    data_by_from_counted = data_by_from.lazy().map_batches(
+        lambda data: source_reads.append(len(data)) or data, streamable=True
+    )
+    for validate in ("full", "off"):
+        source_reads.clear()
+        redistributed_lazy = redistribute(data_by_from_counted, validate=validate, **redistribute_kwargs)
+        assert source_reads == [], "The plan should not run until it is collected."
+        redistributed_lazy.collect()
+        assert sum(source_reads) == len(data_by_from), "The input should only be read once."
+
+
+def test_redistribute_many(region: RegionMocked):
+    """Test redistributing to many regions gives the same results as redistributing to each region separately."""
+    data_by_triangle = pl.DataFrame(
+        [
+            {THREE_TRIANGLES_REGION_ID: "A", "data": 10.0},
+            {THREE_TRIANGLES_REGION_ID: "B", "data": 20.0},
+            {THREE_TRIANGLES_REGION_ID: "C", "data": 30.0},
+        ]
+    )
+    data_by_name = {"data": data_by_triangle, "other": data_by_triangle.select(THREE_TRIANGLES_REGION_ID, other=7.5)}
+    regions_to = [region.square, region.quadrant, region.l_and_r]
+    redistribute_kwargs = dict(region_from=region.triangle, redistribute_with_full=True)
+
+    redistributed = redistribute_many(data_by_triangle, regions_to=regions_to, workers=2, **redistribute_kwargs)
+    redistributed_by_name = redistribute_many(data_by_name, regions_to=regions_to, **redistribute_kwargs)
+
+    assert list(redistributed) == [region_.id for region_ in regions_to]
+    for region_to in regions_to:
+        for name, data in data_by_name.items():
+            expected = redistribute(data, region_to=region_to, **redistribute_kwargs)
+            pl.testing.assert_frame_equal(redistributed_by_name[region_to.id][name], expected, check_row_order=False)
+        pl.testing.assert_frame_equal(
+            redistributed[region_to.id],
+            redistribute(data_by_triangle, region_to=region_to, **redistribute_kwargs),
+            check_row_order=False,
+        )
+
+    with pytest.raises(ValueError, match="should not repeat"):
+        redistribute_many(data_by_triangle, regions_to=[region.square, region.square], **redistribute_kwargs)
+    with pytest.raises(ValueError, match="cannot be the same"):
+        redistribute_many(data_by_triangle, regions_to=[region.triangle], **redistribute_kwargs)
+
+
+@pytest.mark.parametrize("backend", ["polars", "sparse"])
+def test_redistribute_precision(region: RegionMocked, backend: str):
+    """Test float32 precision keeps float input dtypes, matches float64 closely and reports the error."""
+    data_by_from = pl.DataFrame(
+        [
+            {THREE_TRIANGLES_REGION_ID: "A", "year": 2021, "data": 10.1, "count": 7},
+            {THREE_TRIANGLES_REGION_ID: "B", "year": 2021, "data": 20.3, "count": 11},
+            {THREE_TRIANGLES_REGION_ID: "C", "year": 2024, "data": 30.7, "count": 13},
+        ],
+        schema_overrides={"data": pl.Float32},
+    )
+    redistribute_kwargs = dict(
+        region_from=region.triangle,
+        region_to=region.quadrant,
+        index_columns=["year"],
+        redistribute_with_full=True,
+        backend=backend,
+    )
+
+    redistributed_64 = redistribute(data_by_from, **redistribute_kwargs)
+    redistributed_32 = redistribute(data_by_from, precision="float32", **redistribute_kwargs)
+
+    assert redistributed_64.schema["data"] == pl.Float64
+    assert redistributed_32.schema["data"] == pl.Float32
+    assert redistributed_32.schema["count"] == pl.Float32
+    pl.testing.assert_frame_equal(
+        redistributed_32,
+        redistributed_64,
+        check_row_order=False,
+        check_column_order=False,
+        check_dtypes=False,
+        rtol=1e-6,
+    )
+
+    diagnostics = get_redistribute_diagnostics(data_by_from, redistributed_32, data_columns=["data", "count"])
+    assert diagnostics["relative_error"].max() < 1e-6
+    assert diagnostics["is_valid"].all()
+
+    with pytest.raises(ValueError, match="Unknown precision"):
+        redistribute(data_by_from, precision="float16", **redistribute_kwargs)
+
+
+def test_redistribute_sum_integer(region: RegionMocked):
+    """Test `sum_integer` apportions counts to integers which conserve totals and are close to the float sum."""
+    data_by_from = pl.DataFrame(
+        [
+            {THREE_TRIANGLES_REGION_ID: "A", "year": 2021, "votes": 7, "people": 101},
+            {THREE_TRIANGLES_REGION_ID: "B", "year": 2021, "votes": 13, "people": 0},
+            {THREE_TRIANGLES_REGION_ID: "B", "year": 2021, "votes": 5, "people": 33},
+            {THREE_TRIANGLES_REGION_ID: "C", "year": 2024, "votes": 29, "people": None},
+        ],
+        schema_overrides={"people": pl.Int32},
+    )
+    redistribute_kwargs = dict(
+        region_from=region.triangle, region_to=region.quadrant, index_columns=["year"], redistribute_with_full=True
+    )
+
+    redistributed = redistribute(data_by_from, aggregation="sum_integer", **redistribute_kwargs)
+
+    assert redistributed.schema["votes"].is_integer()
+    assert redistributed.schema["people"].is_integer()
+    pl.testing.assert_frame_equal(
+        redistributed.select(pl.col("votes", "people").sum()),
+        data_by_from.select(pl.col("votes", "people").sum()),
+        check_dtypes=False,
+    )
+    apportioned_rows = []
+    for data_by_from_row in data_by_from.iter_slices(n_rows=1):
+        apportioned = redistribute(data_by_from_row, aggregation="sum_integer", **redistribute_kwargs)
+        apportioned_float = redistribute(data_by_from_row, **redistribute_kwargs)
+        pl.testing.assert_frame_equal(
+            apportioned.select(pl.col("votes", "people").sum()),
+            data_by_from_row.select(pl.col("votes", "people").sum()),
+            check_dtypes=False,
+        )
+        differences = apportioned.join(
+            apportioned_float, on=[FOUR_SQUARE_REGION_ID, "year"], how="full", join_nulls=True, coalesce=True
+        ).select(
+            pl.col("votes").sub(pl.col("votes_right")).abs().max(),
+            pl.col("people").sub(pl.col("people_right")).abs().max(),
+        )
+        assert differences.max_horizontal().item() < 1, "Each apportioned row is off its float share by less than 1."
+        apportioned_rows.append(apportioned)
+    pl.testing.assert_frame_equal(
+        redistributed,
+        pl.concat(apportioned_rows)
+        .group_by(FOUR_SQUARE_REGION_ID, "year")
+        .agg(pl.col("votes", "people").sum())
+        .select(redistributed.columns),
+        check_row_order=False,
+    )
+    pl.testing.assert_frame_equal(
+        redistributed,
+        redistribute(
+            data_by_from.sample(fraction=1.0, shuffle=True, seed=0), aggregation="sum_integer", **redistribute_kwargs
+        ),
+        check_row_order=False,
+    )
+
+    with pytest.raises(ValueError, match="needs integer data columns"):
+        redistribute(data_by_from.cast({"votes": pl.Float64}), aggregation="sum_integer", **redistribute_kwargs)
+    with pytest.raises(NotImplementedError):
+        redistribute(data_by_from, aggregation="sum_integer", backend="sparse", **redistribute_kwargs)
+
+
+def test_get_redistribute_diagnostics():
+    """Test diagnostics give the totals, ratio and error of every column, including columns which were zero."""
+    diagnostics = get_redistribute_diagnostics(
+        pl.DataFrame({"value": [100, 200, 300], "other": [1.0, 2.0, 3.0], "zero": [0, 0, 0]}),
+        pl.LazyFrame({"value": [600], "other": [6.5], "zero": [2]}),
+        data_columns=["value", "other", "zero"],
+    )
+    pl.testing.assert_frame_equal(
+        diagnostics,
+        pl.DataFrame(
+            {
+                "column": ["value", "other", "zero"],
+                "from_total": [600.0, 6.0, 0.0],
+                "to_total": [600.0, 6.5, 2.0],
+                "ratio": [1.0, 6.5 / 6.0, 3.0],
+                "relative_error": [0.0, 6.5 / 6.0 - 1, 2.0],
+                "is_valid": [True, False, False],
+            }
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "_name, validate, n_columns, raises",
+    [
+        ("full checks every column, ", "full", 40, True),
+        ("sample checks some columns, ", "sample", 40, True),
+        ("off never checks, ", "off", 40, False),
+    ],
+)
+def test_redistribute_validate_policy(region: RegionMocked, _name: str, validate: str, n_columns: int, raises: bool):
+    """Test the `validate` policy of `redistribute`, data from a region missing in the mapping isn't conserved."""
+    data_by_from = pl.DataFrame(
+        {THREE_TRIANGLES_REGION_ID: ["A", "missing"], **{f"data_{i}": [1.0, 1.0] for i in range(n_columns)}}
+    )
+    redistribute_kwargs = dict(
+        region_from=region.triangle, region_to=region.quadrant, redistribute_with_full=True, validate=validate
+    )
+
+    if raises:
+        with pytest.raises(ValueError, match="Miss match"):
+            redistribute(data_by_from, **redistribute_kwargs)
+        with pytest.raises(pl.exceptions.ComputeError, match="Miss match"):
+            redistribute(data_by_from.lazy(), **redistribute_kwargs).collect()
+    else:
+        for data in (data_by_from, data_by_from.lazy()):
+            redistributed = redistribute(data, **redistribute_kwargs)
+            assert redistributed.lazy().collect().width == n_columns + 1
+
+    with pytest.raises(ValueError, match="Unknown validate"):
+        redistribute(data_by_from, **(redistribute_kwargs | {"validate": "some"}))
+
+
+def test_get_validate_columns():
+    """Test sampling columns to validate spreads them over the sorted columns."""
+    data_columns = [f"data_{i:03}" for i in range(100)]
+    validate_columns = _get_validate_columns(data_columns, validate="sample")
+    assert len(validate_columns) <= 16
+    assert validate_columns[:2] == ["data_000", "data_007"]
+    assert _get_validate_columns(data_columns[:3], validate="sample") == data_columns[:3]
+    assert _get_validate_columns(data_columns, validate="off") == []
+
+
+def test_redistribute_via_chain(region: RegionMocked):
+    """Test redistributing through a chain of via regions matches redistributing hop by hop."""
+    data_by_from = pl.DataFrame({FOUR_SQUARE_REGION_ID: ["M", "N", "O", "P"], "data": [10.0, 20.0, 30.0, 40.0]})
+    redistribute_kwargs = dict(redistribute_with_full=True, errors="warning")
+
+    redistributed_chain = redistribute(
+        data_by_from,
+        region_from=region.quadrant,
+        region_via=[region.triangle, region.rectangle],
+        region_to=region.l_and_r,
+        **redistribute_kwargs,
+    )
+
+    redistributed_hops = data_by_from
+    for region_from, region_to in [
+        (region.quadrant, region.triangle),
+        (region.triangle, region.rectangle),
+        (region.rectangle, region.l_and_r),
+    ]:
+        redistributed_hops = redistribute(
+            redistributed_hops.drop_nulls(region_from.id),
+            region_from=region_from,
+            region_to=region_to,
+            **redistribute_kwargs,
+        )
+    pl.testing.assert_frame_equal(
+        redistributed_chain.drop_nulls(LEFT_RIGHT_REGION_ID),
+        redistributed_hops.drop_nulls(LEFT_RIGHT_REGION_ID),
+        check_row_order=False,
+    )
+
+
+def test_redistribute_long(region: RegionMocked):
+    """Test long format data gives the same result as pivoting each category into a data column."""
+    data_by_from = pl.DataFrame(
+        {
+            "region_id": ["M", "M", "N", "O", "P", "P"],
+            "year": [2020, 2021, 2021, 2020, 2020, 2021],
+            "age": ["0-9", "0-9", "10-19", "0-9", "10-19", "10-19"],
+            "value": [10.0, 20.0, 30.0, 40.0, 50.0, 60.0],
+        }
+    )
+    redistribute_kwargs = dict(region_from=region.quadrant, region_to=region.triangle, redistribute_with_full=True)
+
+    redistributed_long = redistribute_long(
+        data_by_from.lazy(), category_columns=["year", "age"], region_column="region_id", **redistribute_kwargs
+    )
+    assert isinstance(redistributed_long, pl.LazyFrame)
+
+    redistributed_pivot = (
+        redistribute(
+            data_by_from.pivot(on=["year", "age"], index="region_id", values="value", separator="|")
+            .rename({"region_id": FOUR_SQUARE_REGION_ID})
+            .fill_null(0.0),
+            **redistribute_kwargs,
+        )
+        .unpivot(index=THREE_TRIANGLES_REGION_ID, variable_name="category")
+        .filter(pl.col("value") != 0)
+        .select(
+            pl.col(THREE_TRIANGLES_REGION_ID).alias("region_id"),
+            pl.col("category").str.extract(r"(\d+)").cast(pl.Int64).alias("year"),
+            pl.col("category").str.extract(r"\|?\"?(\d+-\d+)").alias("age"),
+            "value",
+        )
+    )
+    pl.testing.assert_frame_equal(
+        redistributed_long.collect().filter(pl.col("value") != 0),
+        redistributed_pivot,
+        check_row_order=False,
+    )
+    assert redistributed_long.collect()["region_id"].is_sorted(nulls_last=True)
+
+    with pytest.raises(ValueError, match="Long format"):
+        redistribute_long(data_by_from, category_columns=["year"], region_column="region_id", **redistribute_kwargs)
@@ -0,0 +1,128 @@
+import tempfile
+
+import polars as pl
+import pytest
+from electoralyze.common.metric import Metric, MetricRegion
+from electoralyze.common.testing.region_fixture import (
+    FOUR_SQUARE_REGION_ID,
+    LEFT_RIGHT_REGION_ID,
+    ONE_SQUARE_REGION_ID,
+    THREE_RECTANGLE_REGION_ID,
+    THREE_TRIANGLES_REGION_ID,
+    RegionMocked,
+)
+from electoralyze.region.redistribute import redistribute
+from electoralyze.region.redistribute.weights import get_weights
+from electoralyze.region.region_abc import RegionABC
+from polars import testing  # noqa: F401
+
+
+def _process_raw_quadrant_population(
+    parent_metric: Metric, region: RegionABC, force_new: bool, download: bool, **_kwargs: dict
+) -> pl.DataFrame:
+    """Population by quadrant, only living in the top two quadrants."""
+    data = pl.DataFrame(
+        {
+            "region_id": ["M", "N", "O", "P"],
+            parent_metric.category_column: [2021] * 4,
+            parent_metric.value_column: [10.0, 30.0, 0.0, 0.0],
+        },
+        schema=parent_metric.schema,
+    )
+    return data
+
+
+@pytest.mark.parametrize(
+    "_name, region_id_from, region_id_to, data, expected",
+    [
+        (
+            "neither is the weight region, ",
+            ONE_SQUARE_REGION_ID,
+            LEFT_RIGHT_REGION_ID,
+            {"main": 100.0},
+            {"L": 25.0, "R": 75.0},
+        ),
+        (
+            "to the weight region, ",
+            THREE_TRIANGLES_REGION_ID,
+            FOUR_SQUARE_REGION_ID,
+            {"A": 100.0, "B": 20.0, "C": 30.0},
+            {"M": 45.0, "N": 105.0},
+        ),
+        (
+            "unpopulated region falls back to area, ",
+            THREE_RECTANGLE_REGION_ID,
+            FOUR_SQUARE_REGION_ID,
+            {"X": 100.0, "Y": 100.0, "Z": 100.0},
+            {"M": 50.0, "N": 150.0, "O": 50.0, "P": 50.0},
+        ),
+    ],
+)
+def test_redistribute_metric_weights(
+    region: RegionMocked, _name: str, region_id_from: str, region_id_to: str, data: dict, expected: dict
+):
+    """Test redistributing weighted by a metric splits data by the weight in each intersection."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        population = Metric(
+            name="population",
+            processed_path=f"{temp_dir}/population/{{region_id}}.parquet",
+            allowed_regions=[MetricRegion(region=region.quadrant, process_raw=_process_raw_quadrant_population)],
+        )
+        population.process_raw()
+
+        weight_region, weights = get_weights(population)
+        assert weight_region is region.quadrant
+        assert weights.columns == [FOUR_SQUARE_REGION_ID, "weight"]
+
+        redistributed = redistribute(
+            pl.DataFrame({region_id_from: list(data), "data": list(data.values())}),
+            region_from=region.from_id(region_id_from),
+            region_to=region.from_id(region_id_to),
+            weights=population,
+            redistribute_with_full=True,
+        )
+
+    pl.testing.assert_frame_equal(
+        redistributed.filter(pl.col("data") != 0),
+        pl.DataFrame({region_id_to: list(expected), "data": list(expected.values())}),
+        check_row_order=False,
+    )
+
+
+def test_get_weights_reprocessed(region: RegionMocked):
+    """Test reprocessing a metric gives new weights and new ratios weighted by it, not cached ones."""
+
+    def _process_raw_bottom_population(
+        parent_metric: Metric, region: RegionABC, force_new: bool, download: bool, **_kwargs: dict
+    ) -> pl.DataFrame:
+        """Population by quadrant, only living in the bottom two quadrants."""
+        return _process_raw_quadrant_population(parent_metric, region, force_new, download).with_columns(
+            pl.col(parent_metric.value_column).reverse()
+        )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        population = Metric(
+            name="population",
+            processed_path=f"{temp_dir}/population/{{region_id}}.parquet",
+            allowed_regions=[MetricRegion(region=region.quadrant, process_raw=_process_raw_quadrant_population)],
+        )
+        population.process_raw()
+        redistribute_kwargs = dict(
+            region_from=region.square, region_to=region.l_and_r, weights=population, redistribute_with_full=True
+        )
+        data = pl.DataFrame({ONE_SQUARE_REGION_ID: ["main"], "data": [100.0]})
+        _, weights = get_weights(population)
+        assert weights["weight"].to_list() == [10.0, 30.0, 0.0, 0.0]
+        assert dict(redistribute(data, **redistribute_kwargs).iter_rows()) == {"L": 25.0, "R": 75.0}
+
+        population.allowed_regions[0].process_raw = _process_raw_bottom_population
+        population.process_raw(force_new=True)
+        _, weights = get_weights(population)
+        assert weights["weight"].to_list() == [0.0, 0.0, 30.0, 10.0]
+        assert dict(redistribute(data, **redistribute_kwargs).iter_rows()) == {"L": 75.0, "R": 25.0}
+
+
+def test_get_weights_unknown():
+    """Test unknown weights raise."""
+    with pytest.raises(ValueError, match="Unknown weight"):
+        get_weights("unknown")
@@ -1,10 +1,12 @@
 import os
 import tempfile
 import timeit
+from unittest import mock
 
 import geopandas as gpd
 import polars as pl
 import polars_st as st
+import pyarrow.parquet as pq
 import pytest
 from electoralyze import region
 from electoralyze.common.functools import classproperty
@@ -126,6 +128,105 @@ def test_region_fixture_still_processed(region: RegionMocked):
         pl.testing.assert_frame_equal(region.from_id(region_id).metadata, read_true_metadata(region_id))
 
 
+def test_region_fixture_geometry_hashes(region: RegionMocked):
+    """Test geometry hashes are stable and change with the geometry."""
+    geometry_hashes = region.quadrant.geometry_hashes
+
+    assert geometry_hashes.columns == [FOUR_SQUARE_REGION_ID, "geometry_hash"]
+    assert geometry_hashes[FOUR_SQUARE_REGION_ID].to_list() == ["M", "N", "O", "P"]
+    assert geometry_hashes["geometry_hash"].n_unique() == 4, "Different geometries should have different hashes."
+
+    region.quadrant.cache_clear()
+    assert region.quadrant.geometry_hash == region.quadrant.geometry_hash, "Hash should be stable."
+    assert region.quadrant.geometry_hash != region.l_and_r.geometry_hash
+
+    geometry_hash = region.quadrant.geometry_hash
+    with mock.patch.object(
+        region.quadrant, "_geometry_hashes_cached", wraps=region.quadrant._geometry_hashes_cached
+    ) as geometry_hashes_cached:
+        assert region.quadrant.geometry_hash == geometry_hash
+        assert not geometry_hashes_cached.called, "Hash should be cached while the geometry file is unchanged."
+
+        geometry_file_stat = os.stat(region.quadrant.geometry_file)
+        os.utime(
+            region.quadrant.geometry_file, ns=(geometry_file_stat.st_atime_ns, geometry_file_stat.st_mtime_ns + 1)
+        )
+        assert region.quadrant.geometry_hash == geometry_hash
+        assert geometry_hashes_cached.called, "Hash should be recomputed once the geometry file changes."
+
+
+def test_region_fixture_get_area(region: RegionMocked):
+    """Test region areas are cached until the cache is cleared."""
+    area = region.quadrant.get_area()
+    assert area.columns == [FOUR_SQUARE_REGION_ID, "total_area"]
+    assert area["total_area"].to_list() == [16.0] * 4
+    assert region.quadrant.get_area() is area, "Area should be cached."
+    with mock.patch.object(region.quadrant, "get_raw_geometry", side_effect=AssertionError("Read raw geometry.")):
+        pl.testing.assert_frame_equal(region.quadrant.get_area(full=True), area)
+
+    region.quadrant.cache_clear()
+    assert region.quadrant.get_area() is not area
+
+
+def test_region_fixture_index(region: RegionMocked):
+    """Test the region index numbers the sorted ids densely, is persisted, and encodes and decodes ids."""
+    index = region.quadrant.index
+    assert index.columns == [FOUR_SQUARE_REGION_ID, "index"]
+    assert index[FOUR_SQUARE_REGION_ID].to_list() == ["M", "N", "O", "P"]
+    assert index["index"].to_list() == [0, 1, 2, 3]
+    assert index.schema["index"] == pl.UInt32
+    assert os.path.isfile(region.quadrant.index_file)
+    pl.testing.assert_frame_equal(pl.read_parquet(region.quadrant.index_file), index)
+
+    data = pl.DataFrame({FOUR_SQUARE_REGION_ID: ["P", "M", "missing", None], "value": [1, 2, 3, 4]})
+    encoded = data.with_columns(region.quadrant.encode_ids())
+    assert encoded[FOUR_SQUARE_REGION_ID].to_list() == [3, 0, None, None]
+    assert encoded.with_columns(region.quadrant.decode_ids())[FOUR_SQUARE_REGION_ID].to_list() == [
+        "P",
+        "M",
+        None,
+        None,
+    ]
+
+    region.quadrant.cache_clear()
+    assert region.quadrant.index is not index
+
+
+@pytest.mark.parametrize(
+    "bbox, ids_expected",
+    [
+        pytest.param((1, 1, 3, 3), ["N"], id="Inside one region"),
+        pytest.param((-1, -3, 1, -1), ["O", "P"], id="Across two regions"),
+        pytest.param((-5, -5, 5, 5), ["M", "N", "O", "P"], id="Covers everything"),
+        pytest.param((10, 10, 12, 12), [], id="Outside every region"),
+    ],
+)
+def test_region_fixture_geometry_in_bbox(region: RegionMocked, bbox: tuple, ids_expected: list[str]):
+    """Test reading regions in a bounding box, with and without the bbox covering column."""
+    region.quadrant.remove_processed_files()
+    region.quadrant.process_raw()
+    assert pq.read_schema(region.quadrant.geometry_file).names == [
+        FOUR_SQUARE_REGION_ID,
+        "geometry",
+        "total_area",
+        "bbox",
+    ]
+
+    geometry_in_bbox = region.quadrant.geometry_in_bbox(bbox)
+    assert geometry_in_bbox.columns == [FOUR_SQUARE_REGION_ID, "geometry"]
+    assert geometry_in_bbox[FOUR_SQUARE_REGION_ID].to_list() == ids_expected
+
+    # Geometry processed before the bbox column existed.
+    region.quadrant.geometry.pipe(to_geopandas).to_parquet(region.quadrant.geometry_file)
+    region.quadrant.cache_clear()
+    assert "bbox" not in pq.read_schema(region.quadrant.geometry_file).names
+    assert region.quadrant.geometry_in_bbox(bbox)[FOUR_SQUARE_REGION_ID].to_list() == ids_expected
+    assert region.quadrant.get_area(full=True)["total_area"].to_list() == [16.0] * 4
+
+    region.quadrant.remove_processed_files()
+    region.quadrant.process_raw()
+
+
 def test_region_downloads_raw(region: RegionMocked):
     """Test region downloads raw data when needed."""
     with tempfile.TemporaryDirectory() as temp_dir: